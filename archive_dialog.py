@@ -0,0 +1,105 @@
+from PyQt6.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit,
+                             QPushButton, QTableWidget, QTableWidgetItem, QHeaderView,
+                             QAbstractItemView, QMessageBox)
+from PyQt6.QtCore import Qt
+
+
+class ArchiveDialog(QDialog):
+    """归档视图：浏览、搜索归档的条目，复制密码或把条目移回密码库
+
+    归档的条目由主窗口在打开本对话框时才解密。
+    """
+
+    def __init__(self, parent, search_text=""):
+        super().__init__(parent)
+        self.setWindowTitle("归档")
+        self.resize(700, 450)
+        self.setModal(True)
+
+        self.main_window = parent
+        self.visible_ids = []
+
+        self.init_ui()
+        self.search_edit.setText(search_text)
+        self.refresh_table()
+
+    def init_ui(self):
+        layout = QVBoxLayout(self)
+
+        # 搜索栏
+        search_layout = QHBoxLayout()
+        self.search_edit = QLineEdit()
+        self.search_edit.setPlaceholderText("搜索归档中的网站名或账号...")
+        self.search_edit.textChanged.connect(self.refresh_table)
+        search_layout.addWidget(QLabel("搜索："))
+        search_layout.addWidget(self.search_edit)
+        layout.addLayout(search_layout)
+
+        # 表格（可多选）
+        self.table_widget = QTableWidget()
+        self.table_widget.setColumnCount(4)
+        self.table_widget.setHorizontalHeaderLabels(["网站名", "网址", "账号", "归档时间"])
+        self.table_widget.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        self.table_widget.verticalHeader().setVisible(False)
+        self.table_widget.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.table_widget.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.table_widget.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
+        layout.addWidget(self.table_widget)
+
+        # 按钮栏
+        button_layout = QHBoxLayout()
+        self.copy_btn = QPushButton("复制密码")
+        self.copy_btn.clicked.connect(self.copy_password)
+        self.restore_btn = QPushButton("移回密码库")
+        self.restore_btn.clicked.connect(self.restore_selected)
+        close_btn = QPushButton("关闭")
+        close_btn.clicked.connect(self.accept)
+
+        self.status_label = QLabel()
+        button_layout.addWidget(self.status_label)
+        button_layout.addStretch()
+        button_layout.addWidget(self.copy_btn)
+        button_layout.addWidget(self.restore_btn)
+        button_layout.addWidget(close_btn)
+        layout.addLayout(button_layout)
+
+    def refresh_table(self):
+        """按搜索文本刷新归档条目"""
+        archive, archive_order = self.main_window.load_archive()
+        text = self.search_edit.text().lower()
+        self.visible_ids = [entry_id for entry_id in archive_order
+                            if not text or text in archive[entry_id]['website_name'].lower()
+                            or text in archive[entry_id]['username'].lower()]
+
+        self.table_widget.setRowCount(len(self.visible_ids))
+        for row, entry_id in enumerate(self.visible_ids):
+            entry = archive[entry_id]
+            archived_at = entry.get('archived_at', '')[:10]
+            for column, value in enumerate((entry['website_name'], entry['url'], entry['username'], archived_at)):
+                item = QTableWidgetItem(value)
+                item.setToolTip(value)
+                self.table_widget.setItem(row, column, item)
+
+        self.status_label.setText(f"归档中共 {len(archive_order)} 个条目，显示 {len(self.visible_ids)} 个")
+
+    def selected_ids(self):
+        """选中行对应的条目 id"""
+        rows = sorted({index.row() for index in self.table_widget.selectionModel().selectedRows()})
+        return [self.visible_ids[row] for row in rows]
+
+    def copy_password(self):
+        """复制选中条目的密码"""
+        entry_ids = self.selected_ids()
+        if len(entry_ids) != 1:
+            QMessageBox.warning(self, "警告", "请选择一个条目")
+            return
+        self.main_window.copy_archived_password(entry_ids[0])
+
+    def restore_selected(self):
+        """把选中的条目移回密码库"""
+        entry_ids = self.selected_ids()
+        if not entry_ids:
+            QMessageBox.warning(self, "警告", "请选择要移回密码库的条目")
+            return
+        if self.main_window.restore_from_archive(entry_ids):
+            self.refresh_table()
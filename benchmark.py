@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据库加密存储性能测试
+
+用法：
+    python benchmark.py verify [--sizes 1000 10000 100000]
+    python benchmark.py format [--sizes 10000 100000]
+    python benchmark.py compression [--sizes 1000 10000 100000]
+    python benchmark.py journal [--sizes 10000 50000]
+    python benchmark.py sqlite [--sizes 10000 50000]
+"""
+
+import argparse
+import base64
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+import uuid
+from datetime import datetime
+
+from crypto import CryptoManager, LEGACY_KDF_PARAMS, JOURNAL_MAGIC
+from sqlite_store import SQLiteCryptoManager
+
+
+def make_entries(count: int) -> tuple[dict, list]:
+    """生成测试用的密码条目"""
+    entries = {}
+    entries_order = []
+    now = datetime.now().isoformat()
+    for i in range(count):
+        entry_id = str(uuid.uuid4())
+        entries[entry_id] = {
+            'id': entry_id,
+            'website_name': f'网站{i}',
+            'url': f'https://www.example{i}.com/login',
+            'username': f'user{i}@example.com',
+            'password': f'P@ssw0rd-{i}-{uuid.uuid4().hex[:12]}',
+            'note': '测试账号' if i % 3 == 0 else '',
+            'created_at': now,
+            'updated_at': now
+        }
+        entries_order.append(entry_id)
+    return entries, entries_order
+
+
+def measure(func, repeat: int = 3) -> float:
+    """返回多次运行中最快的一次耗时（毫秒）"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def write_legacy_db(cm: CryptoManager, file_path: str, master_password: str, entries: dict, entries_order: list) -> None:
+    """写入旧格式（版本 1）数据库，用于对比"""
+    salt = cm.generate_salt()
+    nonce, ciphertext = cm.encrypt_data(cm.derive_key(master_password, salt, LEGACY_KDF_PARAMS), entries)
+    with open(file_path, 'w', encoding='utf-8') as f:
+        json.dump({
+            "salt": base64.b64encode(salt).decode('utf-8'),
+            "nonce": base64.b64encode(nonce).decode('utf-8'),
+            "ciphertext": base64.b64encode(ciphertext).decode('utf-8'),
+            "entries_order": entries_order
+        }, f, ensure_ascii=False, indent=2)
+
+
+def write_json_db(cm: CryptoManager, file_path: str, session, entries: dict, entries_order: list) -> None:
+    """写入版本 2 的 JSON 格式数据库（base64 密文），用于对比"""
+    nonce = cm.generate_nonce()
+    ciphertext = session.aead.encrypt(nonce, json.dumps(entries, ensure_ascii=False).encode('utf-8'), None)
+    with open(file_path, 'w', encoding='utf-8') as f:
+        json.dump({
+            "version": 2,
+            **cm._header_fields(session),
+            "nonce": base64.b64encode(nonce).decode('utf-8'),
+            "ciphertext": base64.b64encode(ciphertext).decode('utf-8'),
+            "entries_order": entries_order
+        }, f, ensure_ascii=False, indent=2)
+
+
+def measure_peak(func) -> float:
+    """返回运行期间 Python 分配的内存峰值（MiB）"""
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1] / 1024 / 1024
+    finally:
+        tracemalloc.stop()
+
+
+def bench_format(sizes: list) -> None:
+    """文件大小、保存/加载的峰值内存和耗时：JSON 格式 vs 二进制容器
+    
+    峰值内存只统计保存/加载期间新分配的内存，不包括已在内存中的条目。
+    """
+    cm = CryptoManager()
+    session = cm.create_session('benchmark')
+    print(f"{'条目数':>10} {'格式':>8} {'文件(KiB)':>12} {'保存峰值(MiB)':>14} {'保存(ms)':>10} "
+          f"{'加载峰值(MiB)':>14} {'加载(ms)':>10}")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for size in sizes:
+            entries, entries_order = make_entries(size)
+            json_file = os.path.join(temp_dir, f'json_{size}.json.aes')
+            binary_file = os.path.join(temp_dir, f'binary_{size}.json.aes')
+            writers = (
+                ("JSON", json_file, lambda: write_json_db(cm, json_file, session, entries, entries_order)),
+                ("二进制", binary_file,
+                 lambda: cm.save_encrypted_db_with_session(binary_file, session, entries, entries_order))
+            )
+
+            for label, file_path, save in writers:
+                save_peak_mib = measure_peak(save)
+                save_ms = measure(save)
+                load = lambda: cm.load_encrypted_db_with_session(file_path, session)
+                load_peak_mib = measure_peak(load)
+                load_ms = measure(load)
+                print(f"{size:>10} {label:>8} {os.path.getsize(file_path) / 1024:>12.1f} "
+                      f"{save_peak_mib:>14.1f} {save_ms:>10.1f} {load_peak_mib:>14.1f} {load_ms:>10.1f}")
+    session.wipe()
+
+
+def bench_compression(sizes: list) -> None:
+    """不同压缩算法/级别下的文件大小与保存、加载耗时"""
+    settings = [
+        {"name": "none", "level": 0},
+        {"name": "zlib", "level": 1},
+        {"name": "zlib", "level": 6},
+        {"name": "lzma", "level": 0},
+        {"name": "lzma", "level": 6}
+    ]
+    cm = CryptoManager()
+    session = cm.create_session('benchmark')
+    print(f"{'条目数':>10} {'压缩':>8} {'文件(KiB)':>12} {'保存(ms)':>10} {'加载(ms)':>10}")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for size in sizes:
+            entries, entries_order = make_entries(size)
+            file_path = os.path.join(temp_dir, f'vault_{size}.json.aes')
+            for compression in settings:
+                cm.set_compression(compression)
+                save_ms = measure(lambda: cm.save_encrypted_db_with_session(file_path, session, entries, entries_order))
+                load_ms = measure(lambda: cm.load_encrypted_db_with_session(file_path, session))
+                label = f"{compression['name']}-{compression['level']}"
+                print(f"{size:>10} {label:>8} {os.path.getsize(file_path) / 1024:>12.1f} "
+                      f"{save_ms:>10.1f} {load_ms:>10.1f}")
+    session.wipe()
+
+
+def bench_journal(sizes: list) -> None:
+    """编辑单个条目的写入耗时与写入量：重写完整快照 vs 追加变更日志"""
+    cm = CryptoManager()
+    session = cm.create_session('benchmark')
+    print(f"{'条目数':>10} {'快照(ms)':>10} {'快照(KiB)':>12} {'日志(ms)':>10} {'日志(B)':>10} {'重放100条(ms)':>14}")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for size in sizes:
+            entries, entries_order = make_entries(size)
+            file_path = os.path.join(temp_dir, f'vault_{size}.json.aes')
+            cm.save_encrypted_db_with_session(file_path, session, entries, entries_order)
+            entry_id = entries_order[size // 2]
+            entries[entry_id] = {**entries[entry_id], 'password': 'changed'}
+            record = {"op": "put", "id": entry_id, "entry": entries[entry_id]}
+
+            snapshot_ms = measure(lambda: cm.save_encrypted_db_with_session(file_path, session, entries, entries_order))
+            snapshot_kib = os.path.getsize(file_path) / 1024
+            journal_file = cm.journal_path(file_path)
+            journal_ms = measure(lambda: cm.append_journal(file_path, session, [record]))
+            record_bytes = (os.path.getsize(journal_file) - len(JOURNAL_MAGIC) - 8) // 3
+            for _ in range(97):
+                cm.append_journal(file_path, session, [record])
+            replay_ms = measure(lambda: cm.load_encrypted_db_with_session(file_path, session))
+            cm.compact_journal(file_path, session)
+            base_ms = measure(lambda: cm.load_encrypted_db_with_session(file_path, session))
+            print(f"{size:>10} {snapshot_ms:>10.1f} {snapshot_kib:>12.1f} {journal_ms:>10.2f} {record_bytes:>10} "
+                  f"{replay_ms - base_ms:>14.1f}")
+    session.wipe()
+
+
+def bench_sqlite(sizes: list) -> None:
+    """SQLite 存储引擎：完整保存/加载、编辑单个条目、只加载一页（100 条）的耗时"""
+    cm = SQLiteCryptoManager()
+    session = cm.create_session('benchmark')
+    print(f"{'条目数':>10} {'文件(KiB)':>10} {'保存(ms)':>10} {'加载(ms)':>10} {'编辑(ms)':>10} {'一页(ms)':>10}")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for size in sizes:
+            entries, entries_order = make_entries(size)
+            file_path = os.path.join(temp_dir, f'vault_{size}.db')
+            save_ms = measure(lambda: cm.save_encrypted_db_with_session(file_path, session, entries, entries_order))
+            cm.compact_journal(file_path, session)
+            file_kib = os.path.getsize(file_path) / 1024
+            load_ms = measure(lambda: cm.load_encrypted_db_with_session(file_path, session))
+            entry_id = entries_order[size // 2]
+            record = {"op": "put", "id": entry_id, "entry": {**entries[entry_id], 'password': 'changed'}}
+            edit_ms = measure(lambda: cm.append_journal(file_path, session, [record]))
+            page_ms = measure(lambda: cm.load_page(file_path, session, size // 2, 100))
+            print(f"{size:>10} {file_kib:>10.1f} {save_ms:>10.1f} {load_ms:>10.1f} {edit_ms:>10.2f} {page_ms:>10.1f}")
+    session.wipe()
+
+
+def bench_prefetch(sizes: list) -> None:
+    """登录时的解锁耗时：直接读取文件 vs 登录框显示期间已预读（两者都包含一次 Argon2）"""
+    print(f"{'条目数':>10} {'引擎':>8} {'预读(ms)':>10} {'解锁(ms)':>10} {'预读后解锁(ms)':>16}")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for size in sizes:
+            entries, entries_order = make_entries(size)
+            for name, cm, suffix in (("file", CryptoManager(), ".json.aes"), ("sqlite", SQLiteCryptoManager(), ".db")):
+                file_path = os.path.join(temp_dir, f'vault_{size}{suffix}')
+                cm.save_encrypted_db(file_path, 'benchmark', entries, entries_order)
+                prefetched = cm.prefetch(file_path)
+                unlock_ms = measure(lambda: cm.unlock_db(file_path, 'benchmark')[2].wipe())
+                prefetched_ms = measure(lambda: cm.unlock_db(file_path, 'benchmark', prefetched)[2].wipe())
+                print(f"{size:>10} {name:>8} {prefetched['elapsed_ms']:>10.1f} {unlock_ms:>10.1f} {prefetched_ms:>16.1f}")
+
+
+def bench_verify(sizes: list) -> None:
+    """错误主密码的拒绝耗时：密钥校验值 vs 解密整个数据库"""
+    cm = CryptoManager()
+    print(f"{'条目数':>10} {'旧格式(ms)':>14} {'密钥校验(ms)':>14}")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for size in sizes:
+            entries, entries_order = make_entries(size)
+            legacy_file = os.path.join(temp_dir, f'legacy_{size}.json.aes')
+            vault_file = os.path.join(temp_dir, f'vault_{size}.json.aes')
+            write_legacy_db(cm, legacy_file, 'benchmark', entries, entries_order)
+            cm.save_encrypted_db(vault_file, 'benchmark', entries, entries_order)
+
+            legacy_ms = measure(lambda: cm.verify_master_password(legacy_file, 'wrong_password'))
+            check_ms = measure(lambda: cm.verify_master_password(vault_file, 'wrong_password'))
+            print(f"{size:>10} {legacy_ms:>14.1f} {check_ms:>14.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="数据库加密存储性能测试")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    verify_parser = subparsers.add_parser("verify", help="错误主密码的拒绝耗时")
+    verify_parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+
+    format_parser = subparsers.add_parser("format", help="文件大小、保存/加载的峰值内存和耗时")
+    format_parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+
+    compression_parser = subparsers.add_parser("compression", help="压缩算法对文件大小和保存/加载耗时的影响")
+    compression_parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+
+    journal_parser = subparsers.add_parser("journal", help="编辑单个条目：重写快照 vs 追加变更日志")
+    journal_parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 50000])
+
+    sqlite_parser = subparsers.add_parser("sqlite", help="SQLite 存储：完整保存/加载、编辑单个条目、加载一页")
+    sqlite_parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 50000])
+
+    prefetch_parser = subparsers.add_parser("prefetch", help="登录解锁：直接读取文件 vs 登录框显示期间预读")
+    prefetch_parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+
+    args = parser.parse_args()
+    if args.command == "verify":
+        bench_verify(args.sizes)
+    elif args.command == "format":
+        bench_format(args.sizes)
+    elif args.command == "compression":
+        bench_compression(args.sizes)
+    elif args.command == "journal":
+        bench_journal(args.sizes)
+    elif args.command == "sqlite":
+        bench_sqlite(args.sizes)
+    elif args.command == "prefetch":
+        bench_prefetch(args.sizes)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据加密算法测速
+
+在当前机器上测量各个 AEAD 算法加密、解密一个数据库分块的吞吐量，
+为新数据库选择更快的算法（没有 AES 硬件指令的机器上通常是 ChaCha20-Poly1305）。
+
+命令行用法：
+    python cipher_benchmark.py
+    python cipher_benchmark.py --save   # 把选中的算法写入 settings.json
+"""
+
+import argparse
+import json
+import os
+import secrets
+import time
+
+from crypto import CHUNK_SIZE, CHUNK_AAD, CIPHER_SUITES, DEFAULT_CIPHER
+
+# 每个算法测量的轮数（取最快的一轮）
+BENCHMARK_ROUNDS = 5
+# 吞吐量相差不超过此比例时保留默认算法
+SELECTION_MARGIN = 0.1
+
+
+def measure_cipher(name: str, size: int = CHUNK_SIZE, rounds: int = BENCHMARK_ROUNDS) -> dict:
+    """测量一个算法加密并解密 size 字节的吞吐量（MiB/s）"""
+    aead = CIPHER_SUITES[name](secrets.token_bytes(32))
+    nonce = secrets.token_bytes(12)
+    aad = CHUNK_AAD.pack(0, True)
+    data = secrets.token_bytes(size)
+    encrypt_ms = decrypt_ms = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        ciphertext = aead.encrypt(nonce, data, aad)
+        middle = time.perf_counter()
+        aead.decrypt(nonce, ciphertext, aad)
+        end = time.perf_counter()
+        encrypt_ms = min(encrypt_ms, (middle - start) * 1000)
+        decrypt_ms = min(decrypt_ms, (end - middle) * 1000)
+    mib = size / 1024 / 1024
+    return {
+        "cipher": name,
+        "encrypt_mib_s": round(mib / max(encrypt_ms / 1000, 1e-9), 1),
+        "decrypt_mib_s": round(mib / max(decrypt_ms / 1000, 1e-9), 1)
+    }
+
+
+def benchmark_ciphers(size: int = CHUNK_SIZE, rounds: int = BENCHMARK_ROUNDS) -> list:
+    """测量所有可用的算法"""
+    return [measure_cipher(name, size, rounds) for name in CIPHER_SUITES]
+
+
+def select_cipher(results: list = None) -> str:
+    """选择加密、解密总耗时最短的算法；与默认算法相差不大时保留默认算法"""
+    results = results or benchmark_ciphers()
+
+    def cost(result):
+        return 1 / result["encrypt_mib_s"] + 1 / result["decrypt_mib_s"]
+
+    best = min(results, key=cost)
+    default = next((r for r in results if r["cipher"] == DEFAULT_CIPHER), None)
+    if default is not None and cost(default) <= cost(best) * (1 + SELECTION_MARGIN):
+        return DEFAULT_CIPHER
+    return best["cipher"]
+
+
+def format_results(results: list, selected: str) -> str:
+    """格式化测速结果"""
+    lines = [f"{'算法':<20} {'加密(MiB/s)':>12} {'解密(MiB/s)':>12}"]
+    for r in results:
+        mark = "  ← 选中" if r["cipher"] == selected else ""
+        lines.append(f"{r['cipher']:<20} {r['encrypt_mib_s']:>12.1f} {r['decrypt_mib_s']:>12.1f}{mark}")
+    return "\n".join(lines)
+
+
+def save_to_settings(cipher: str, settings_file: str = "settings.json") -> None:
+    """把选中的算法写入设置文件（保留其他设置项原样）"""
+    settings = {}
+    if os.path.exists(settings_file):
+        with open(settings_file, 'r', encoding='utf-8') as f:
+            settings = json.load(f)
+    settings["cipher"] = cipher
+    with open(settings_file, 'w', encoding='utf-8') as f:
+        json.dump(settings, f, ensure_ascii=False, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="数据加密算法测速")
+    parser.add_argument("--size-kib", type=int, default=CHUNK_SIZE // 1024, help="每轮加密的数据大小（KiB）")
+    parser.add_argument("--save", action="store_true", help="把选中的算法写入 settings.json")
+    args = parser.parse_args()
+
+    results = benchmark_ciphers(args.size_kib * 1024)
+    selected = select_cipher(results)
+    print(format_results(results, selected))
+    if args.save:
+        save_to_settings(selected)
+        print(f"\n已写入 settings.json，新建的数据库将使用 {selected}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,31 +1,270 @@
+import io
+import os
 import json
+import time
 import base64
 import secrets
+import shutil
 import hashlib
+import struct
+import tempfile
+import zlib
+import lzma
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 from argon2 import PasswordHasher, Type
 from argon2.low_level import hash_secret_raw
 from argon2.exceptions import VerifyMismatchError
-from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from typing import Union
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM, ChaCha20Poly1305
 from cryptography.hazmat.primitives import hashes
 import hmac
 
+from vault_merkle import DigestCache, MerkleTree
+
+
+# 数据库文件格式版本：
+#   1 - salt/nonce/ciphertext，条目直接用 Argon2 派生的密钥加密
+#   2 - 条目用随机数据密钥加密，数据密钥由 Argon2 派生的密钥包裹后存放在文件头
+#   3 - 二进制容器：魔数 + 版本 + 文件头 JSON + 原始密文，条目顺序放入密文
+VAULT_FORMAT_VERSION = 3
+# 二进制容器的魔数与固定前缀（魔数、格式版本、文件头长度）
+VAULT_MAGIC = b"LPMVAULT"
+CONTAINER_PREFIX = struct.Struct("<8sHI")
+# 文件头按块大小补齐，更改主密码时可以原地覆盖文件头
+HEADER_BLOCK_SIZE = 512
+# 原地覆盖文件头之前，旧文件头先备份到此后缀的文件；覆盖中途崩溃时读取使用备份，以可写模式打开时写回
+HEADER_BACKUP_SUFFIX = ".header"
+# 包裹数据密钥时使用的关联数据
+KEY_WRAP_AAD = b"local-password-manager/key-wrap/v2"
+# 密钥校验值的标签：HMAC-SHA256(派生密钥, 标签) 的前 16 字节存放在文件头，
+# 主密码错误时派生完成即可拒绝，无需触碰数据库密文
+KEY_CHECK_LABEL = b"local-password-manager/key-check/v2"
+KEY_CHECK_LENGTH = 16
+# 流式加密的分块大小（明文字节数）：每块独立的 nonce（随机前缀 + 分块序号），
+# 关联数据包含分块序号和是否为最后一块，分块被调换、删除或截断都无法通过认证
+CHUNK_SIZE = 1024 * 1024
+CHUNK_NONCE_PREFIX_LENGTH = 8
+CHUNK_INDEX = struct.Struct(">I")
+CHUNK_AAD = struct.Struct(">I?")
+AEAD_TAG_LENGTH = 16
+# 序列化明文时每批编码的条目数
+ENCODE_BATCH_SIZE = 1000
+# 变更日志：每次修改只把变更的条目加密后追加到日志文件（数据库文件名 + 后缀），
+# 解锁时在快照之上重放；日志超过大小或占快照的比例后在后台合并为新的快照
+JOURNAL_SUFFIX = ".journal"
+JOURNAL_MAGIC = b"LPMJRNL1"
+JOURNAL_RECORD_LENGTH = struct.Struct(">I")
+# 日志记录的关联数据：标签 + 所属快照的 nonce 前缀 + 记录序号，记录无法被调换或挪到其他快照
+JOURNAL_AAD = b"local-password-manager/journal/v3"
+JOURNAL_COMPACT_BYTES = 4 * 1024 * 1024
+JOURNAL_COMPACT_RATIO = 0.5
+# 归档段：很少使用的条目单独存放在一个加密容器中（数据库文件名 + 后缀），
+# 使用同一个数据密钥，解锁时不读取，只在打开归档或搜索未命中时才解密
+ARCHIVE_SUFFIX = ".archive"
+# 同步记录：上次与每个文件夹同步后两边共有的条目 id（同样是单独加密的容器），用于区分删除和新增
+SYNC_SUFFIX = ".sync"
+# 文件头中加密的 Merkle 树（vault_merkle）的关联数据前缀（后接快照标识）
+MERKLE_AAD = b"local-password-manager/merkle/v1:"
+# 先压缩后加密：支持的压缩算法，算法和级别记录在文件头中
+COMPRESSION_ALGORITHMS = ("none", "zlib", "lzma")
+DEFAULT_COMPRESSION = {"name": "none", "level": 0}
+# 条目分为两层：索引层（网站名、网址、账号、备注摘要）解锁时即可使用；
+# 密文层（密码和长备注）用数据密钥单独加密后存入条目的 secret 字段，复制、填充或编辑时才解密
+SECRET_AAD = b"local-password-manager/secret/v1:"
+SECRET_FIELD = "secret"
+# 超过此长度的备注放入密文层，索引层只保留摘要
+NOTE_INDEX_LENGTH = 64
+# 数据加密算法（AEAD）：名称 → 实现类，名称记录在文件头中。实现类以 32 字节密钥构造，
+# 提供 encrypt/decrypt(nonce, data, associated_data)，使用 12 字节 nonce 和 16 字节认证标签。
+# 没有 AES 硬件指令的机器上 ChaCha20-Poly1305 明显更快；包裹数据密钥始终使用 AES-256-GCM
+CIPHER_SUITES = {
+    "aes-256-gcm": AESGCM,
+    "chacha20-poly1305": ChaCha20Poly1305
+}
+DEFAULT_CIPHER = "aes-256-gcm"
+AEAD = Union[AESGCM, ChaCha20Poly1305]
+# 读取 JSON 格式（版本 1/2）文件头时只读取文件开头的字符数
+HEADER_PREFIX_SIZE = 4096
+
+# 旧文件（版本 1 以及未记录参数的文件）使用的密钥派生参数
+LEGACY_KDF_PARAMS = {
+    "name": "argon2id",
+    "version": 0x13,
+    "time_cost": 3,
+    "memory_cost": 65536,
+    "parallelism": 1,
+    "hash_len": 32
+}
+
+
+# 新数据库默认的密钥派生参数：内存和迭代次数不变，启用 4 通道并行。
+# 取固定值而不按本机核心数计算，否则同一个数据库在核心数不同的机器上解锁时都会被重新包裹
+DEFAULT_KDF_PARAMS = {**LEGACY_KDF_PARAMS, "parallelism": 4}
+
+
+def default_kdf_params() -> dict:
+    """新数据库默认的密钥派生参数"""
+    return dict(DEFAULT_KDF_PARAMS)
+
+
+def normalize_kdf_params(params: dict) -> dict:
+    """校验并补全密钥派生参数"""
+    params = {**LEGACY_KDF_PARAMS, **(params or {})}
+    if params["name"] != "argon2id":
+        raise Exception(f"不支持的密钥派生算法：{params['name']}")
+    for field in ("time_cost", "memory_cost", "parallelism", "hash_len"):
+        params[field] = int(params[field])
+    if params["parallelism"] < 1 or params["time_cost"] < 1:
+        raise Exception("密钥派生参数无效")
+    # Argon2 要求每个通道至少 8 KiB 内存
+    if params["memory_cost"] < 8 * params["parallelism"]:
+        raise Exception("密钥派生参数无效：内存不足以支撑并行通道数")
+    return params
+
+
+@contextmanager
+def atomic_write(file_path: str, mode: str = 'wb', **kwargs):
+    """原子写入文件：先写入同目录的临时文件并 fsync，再替换目标文件
+    
+    写入中途崩溃或出错时目标文件保持原样，不会留下被截断的数据库。
+    """
+    directory = os.path.dirname(os.path.abspath(file_path))
+    fd, temp_path = tempfile.mkstemp(prefix=os.path.basename(file_path) + '.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, mode, **kwargs) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, file_path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+    # 同步目录项，确保替换本身也已落盘（Windows 不支持打开目录）
+    if hasattr(os, 'O_DIRECTORY'):
+        dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+def normalize_cipher(name: str) -> str:
+    """校验数据加密算法名称（未指定时使用默认算法）"""
+    name = name or DEFAULT_CIPHER
+    if name not in CIPHER_SUITES:
+        raise Exception(f"不支持的加密算法：{name}")
+    return name
+
+
+def normalize_compression(params: dict) -> dict:
+    """校验并补全压缩参数"""
+    params = {**DEFAULT_COMPRESSION, **(params or {})}
+    if params["name"] not in COMPRESSION_ALGORITHMS:
+        raise Exception(f"不支持的压缩算法：{params['name']}")
+    params["level"] = int(params["level"])
+    if not 0 <= params["level"] <= 9:
+        raise Exception("压缩级别必须在 0 到 9 之间")
+    return params
+
+
+class VaultSession:
+    """会话密钥：解锁时派生一次，之后的保存只生成新的 nonce，不再运行 Argon2
+    
+    会话中保存的是随机数据密钥以及文件头（salt、包裹后的数据密钥、加密算法），
+    主密码派生出的包裹密钥用完即丢弃。
+    """
+
+    def __init__(self, key: bytes, salt: bytes, wrap_nonce: bytes, wrapped_key: bytes,
+                 key_check: bytes = b"", legacy: bool = False, kdf_params: dict = None,
+                 cipher: str = DEFAULT_CIPHER):
+        self._key = bytearray(key)
+        self.cipher = normalize_cipher(cipher)
+        self._aead = CIPHER_SUITES[self.cipher](bytes(self._key))
+        self.salt = salt
+        self.kdf_params = kdf_params or dict(LEGACY_KDF_PARAMS)
+        self.wrap_nonce = wrap_nonce
+        self.wrapped_key = wrapped_key
+        self.key_check = key_check
+        # 是否从旧格式（版本 1）解锁，需要在下次保存时迁移
+        self.legacy = legacy
+
+    @property
+    def active(self) -> bool:
+        """会话密钥是否仍然有效（未被清除）"""
+        return self._aead is not None
+
+    @property
+    def aead(self) -> AEAD:
+        """返回复用的 AEAD 实例（按文件头记录的加密算法）"""
+        if self._aead is None:
+            raise Exception("会话密钥已清除，请重新登录")
+        return self._aead
+
+    def matches(self, key: bytes) -> bool:
+        """常量时间比较数据密钥是否与会话密钥一致"""
+        return self.active and hmac.compare_digest(bytes(self._key), key)
+    
+    def wipe(self) -> None:
+        """清除内存中的会话密钥"""
+        for i in range(len(self._key)):
+            self._key[i] = 0
+        self._key = bytearray()
+        self._aead = None
+
+
 class CryptoManager:
-    def __init__(self):
-        self.ph = PasswordHasher(time_cost=3, memory_cost=65536, parallelism=1, hash_len=32, type=Type.ID)
+    def __init__(self, kdf_params: dict = None, compression: dict = None, cipher: str = None):
         self.salt_length = 16
         self.nonce_length = 12
+        self.data_key_length = 32
+        self.set_kdf_params(kdf_params)
+        self.set_compression(compression)
+        self.set_cipher(cipher)
+        # 变更日志的位置缓存：{日志路径: (快照标识, 记录条数, 文件长度)}，追加时无需重新扫描
+        self._journal_state = {}
+        # 条目摘要缓存（Merkle 树的叶子），保存快照时只为修改过的条目重新计算
+        self.digest_cache = DigestCache()
+    
+    def set_kdf_params(self, kdf_params: dict = None) -> None:
+        """设置新数据库和更改主密码时使用的密钥派生参数（None 表示使用默认参数）"""
+        # 只有用户设置或校准过参数时，才把已有数据库重新包裹为这些参数
+        self.kdf_configured = bool(kdf_params)
+        self.kdf_params = normalize_kdf_params(kdf_params or default_kdf_params())
+        self.ph = PasswordHasher(time_cost=self.kdf_params["time_cost"],
+                                 memory_cost=self.kdf_params["memory_cost"],
+                                 parallelism=self.kdf_params["parallelism"],
+                                 hash_len=self.kdf_params["hash_len"], type=Type.ID)
+    
+    def set_compression(self, compression: dict = None) -> None:
+        """设置保存数据库时使用的压缩算法和级别"""
+        self.compression = normalize_compression(compression)
     
-    def derive_key(self, master_password: str, salt: bytes) -> bytes:
-        """使用 Argon2id 从主密码和 salt 派生加密密钥（32字节）"""
+    def set_cipher(self, cipher: str = None) -> None:
+        """设置新数据库使用的数据加密算法（已有数据库按文件头记录的算法解密和保存）"""
+        self.cipher = normalize_cipher(cipher)
+    
+    def derive_key(self, master_password: str, salt: bytes, kdf_params: dict = None) -> bytes:
+        """使用 Argon2id 从主密码和 salt 派生加密密钥（32字节）
+        
+        kdf_params 为文件头中记录的参数，未指定时使用当前配置的参数。
+        parallelism 大于 1 时 Argon2 会在多个线程中并行填充各个通道。
+        """
+        params = normalize_kdf_params(kdf_params) if kdf_params else self.kdf_params
         # 使用 argon2.low_level.hash_secret_raw 直接生成原始密钥
         raw_hash = hash_secret_raw(
             secret=master_password.encode('utf-8'),
             salt=salt,
-            time_cost=3,
-            memory_cost=65536,
-            parallelism=1,
-            hash_len=32,
-            type=Type.ID
+            time_cost=params["time_cost"],
+            memory_cost=params["memory_cost"],
+            parallelism=params["parallelism"],
+            hash_len=params["hash_len"],
+            type=Type.ID,
+            version=params["version"]
         )
         return raw_hash
     
@@ -40,75 +279,833 @@ class CryptoManager:
     def encrypt_data(self, key: bytes, plaintext: dict) -> tuple[bytes, bytes]:
         """使用 AES-256-GCM 加密数据"""
         nonce = self.generate_nonce()
-        aesgcm = AESGCM(key)
+        aead = AESGCM(key)
         plaintext_json = json.dumps(plaintext, ensure_ascii=False).encode('utf-8')
-        ciphertext = aesgcm.encrypt(nonce, plaintext_json, None)
+        ciphertext = aead.encrypt(nonce, plaintext_json, None)
         return nonce, ciphertext
     
     def decrypt_data(self, key: bytes, nonce: bytes, ciphertext: bytes) -> dict:
         """使用 AES-256-GCM 解密数据"""
-        aesgcm = AESGCM(key)
-        plaintext_json = aesgcm.decrypt(nonce, ciphertext, None)
+        aead = AESGCM(key)
+        plaintext_json = aead.decrypt(nonce, ciphertext, None)
         return json.loads(plaintext_json.decode('utf-8'))
     
-    def save_encrypted_db(self, file_path: str, master_password: str, data: dict, entries_order: list) -> None:
-        """保存加密数据库"""
-        # 生成 salt
+    def seal_entry(self, session: VaultSession, entry: dict) -> dict:
+        """把完整条目拆为索引层：密码和长备注用数据密钥加密后存入 secret 字段（条目 id 作为关联数据）"""
+        index = {key: value for key, value in entry.items() if key != "password"}
+        secret = {"password": entry.get("password", "")}
+        note = entry.get("note", "")
+        if len(note) > NOTE_INDEX_LENGTH:
+            secret["note"] = note
+            index["note"] = note[:NOTE_INDEX_LENGTH] + "…"
+        nonce = self.generate_nonce()
+        ciphertext = session.aead.encrypt(nonce, json.dumps(secret, ensure_ascii=False).encode('utf-8'),
+                                            SECRET_AAD + entry["id"].encode('utf-8'))
+        index[SECRET_FIELD] = base64.b64encode(nonce + ciphertext).decode('ascii')
+        return index
+    
+    def reveal_entry(self, session: VaultSession, entry: dict) -> dict:
+        """解密 secret 字段，返回包含密码和完整备注的条目副本（用完即丢弃，不放回条目字典）"""
+        if SECRET_FIELD not in entry:
+            return dict(entry)
+        aead = session.aead
+        raw = base64.b64decode(entry[SECRET_FIELD])
+        try:
+            secret = json.loads(aead.decrypt(raw[:self.nonce_length], raw[self.nonce_length:],
+                                                       SECRET_AAD + entry["id"].encode('utf-8')))
+        except Exception:
+            raise Exception("条目密文解密失败，会话密钥与条目不匹配")
+        revealed = {key: value for key, value in entry.items() if key != SECRET_FIELD}
+        revealed.update(secret)
+        return revealed
+    
+    def wrap_key(self, wrapping_key: bytes, data_key: bytes) -> tuple[bytes, bytes]:
+        """用主密码派生的密钥包裹数据密钥"""
+        wrap_nonce = self.generate_nonce()
+        return wrap_nonce, AESGCM(wrapping_key).encrypt(wrap_nonce, data_key, KEY_WRAP_AAD)
+    
+    def unwrap_key(self, wrapping_key: bytes, wrap_nonce: bytes, wrapped_key: bytes) -> bytes:
+        """解开被包裹的数据密钥，密钥错误时抛出异常"""
+        try:
+            return AESGCM(wrapping_key).decrypt(wrap_nonce, wrapped_key, KEY_WRAP_AAD)
+        except Exception:
+            raise Exception("解密失败，主密码可能不正确")
+    
+    def compute_key_check(self, wrapping_key: bytes) -> bytes:
+        """计算派生密钥的校验值"""
+        return hmac.new(wrapping_key, KEY_CHECK_LABEL, hashlib.sha256).digest()[:KEY_CHECK_LENGTH]
+    
+    def check_key(self, wrapping_key: bytes, key_check: bytes) -> None:
+        """校验派生密钥，主密码错误时立即抛出异常（旧文件没有校验值时跳过）"""
+        if key_check and not hmac.compare_digest(self.compute_key_check(wrapping_key), key_check):
+            raise Exception("解密失败，主密码可能不正确")
+    
+    def _new_session(self, wrapping_key: bytes, salt: bytes, data_key: bytes, kdf_params: dict,
+                     legacy: bool = False, cipher: str = None) -> VaultSession:
+        """包裹数据密钥并生成文件头所需的字段"""
+        wrap_nonce, wrapped_key = self.wrap_key(wrapping_key, data_key)
+        return VaultSession(data_key, salt, wrap_nonce, wrapped_key,
+                            key_check=self.compute_key_check(wrapping_key), legacy=legacy,
+                            kdf_params=kdf_params, cipher=cipher or self.cipher)
+    
+    def create_session(self, master_password: str) -> VaultSession:
+        """为新数据库生成随机数据密钥，并用主密码派生的密钥包裹"""
+        salt = self.generate_salt()
+        data_key = secrets.token_bytes(self.data_key_length)
+        return self._new_session(self.derive_key(master_password, salt), salt, data_key, dict(self.kdf_params))
+    
+    def rekey_session(self, session: VaultSession, new_password: str) -> VaultSession:
+        """用新主密码（或新的密钥派生参数）重新包裹数据密钥，只处理 32 字节的数据密钥，与数据库大小无关"""
         salt = self.generate_salt()
-        # 派生密钥
-        key = self.derive_key(master_password, salt)
-        # 加密数据
-        nonce, ciphertext = self.encrypt_data(key, data)
-        
-        # 构建数据库结构
-        db = {
-            "salt": base64.b64encode(salt).decode('utf-8'),
-            "nonce": base64.b64encode(nonce).decode('utf-8'),
-            "ciphertext": base64.b64encode(ciphertext).decode('utf-8'),
-            "entries_order": entries_order
+        return self._new_session(self.derive_key(new_password, salt), salt, bytes(session._key),
+                                 dict(self.kdf_params), cipher=session.cipher)
+    
+    def needs_rehash(self, session: VaultSession) -> bool:
+        """文件头中的密钥派生参数与用户配置的参数不一致时需要重新包裹（使用默认参数时不重新包裹）"""
+        return self.kdf_configured and session.kdf_params != self.kdf_params
+    
+    def _header_fields(self, session: VaultSession) -> dict:
+        """文件头中与主密码和会话密钥相关的字段"""
+        return {
+            "kdf": session.kdf_params,
+            "cipher": session.cipher,
+            "salt": base64.b64encode(session.salt).decode('utf-8'),
+            "wrap_nonce": base64.b64encode(session.wrap_nonce).decode('utf-8'),
+            "wrapped_key": base64.b64encode(session.wrapped_key).decode('utf-8'),
+            "key_check": base64.b64encode(session.key_check).decode('utf-8')
         }
+    
+    def _pack_header(self, header: dict, padded_length: int = 0) -> bytes:
+        """打包二进制容器的固定前缀和文件头（文件头补齐到块大小）"""
+        header_json = json.dumps(header, separators=(',', ':')).encode('utf-8')
+        length = max(padded_length, -(-len(header_json) // HEADER_BLOCK_SIZE) * HEADER_BLOCK_SIZE)
+        return CONTAINER_PREFIX.pack(VAULT_MAGIC, VAULT_FORMAT_VERSION, length) + header_json.ljust(length, b' ')
+    
+    def _iter_payload(self, data: dict, entries_order: list):
+        """分批序列化明文（条目 + 条目顺序），不在内存中拼出完整的 JSON"""
+        yield b'{"entries":{'
+        items = list(data.items())
+        for i in range(0, len(items), ENCODE_BATCH_SIZE):
+            batch = json.dumps(dict(items[i:i + ENCODE_BATCH_SIZE]), ensure_ascii=False)[1:-1]
+            yield ((',' if i else '') + batch).encode('utf-8')
+        yield b'},"entries_order":['
+        order = list(entries_order)
+        for i in range(0, len(order), ENCODE_BATCH_SIZE):
+            batch = json.dumps(order[i:i + ENCODE_BATCH_SIZE], ensure_ascii=False)[1:-1]
+            yield ((',' if i else '') + batch).encode('utf-8')
+        yield b']}'
+    
+    def _compress_pieces(self, pieces, compression: dict):
+        """流式压缩明文片段（未启用压缩时原样返回）"""
+        if compression["name"] == "none":
+            yield from pieces
+            return
+        if compression["name"] == "zlib":
+            compressor = zlib.compressobj(compression["level"])
+        else:
+            compressor = lzma.LZMACompressor(preset=compression["level"])
+        for piece in pieces:
+            compressed = compressor.compress(piece)
+            if compressed:
+                yield compressed
+        yield compressor.flush()
+    
+    def _decompress(self, plaintext, compression: dict):
+        """解压缩解密后的明文"""
+        if compression["name"] == "zlib":
+            return zlib.decompress(plaintext)
+        if compression["name"] == "lzma":
+            return lzma.decompress(plaintext)
+        return plaintext
+    
+    def _seal_chunk(self, aead: AEAD, nonce_prefix: bytes, index: int, chunk, final: bool) -> bytes:
+        """加密一个分块：nonce 由前缀和分块序号组成，关联数据认证分块序号和是否为最后一块"""
+        return aead.encrypt(nonce_prefix + CHUNK_INDEX.pack(index), chunk, CHUNK_AAD.pack(index, final))
+    
+    def _write_container(self, file_path: str, session: VaultSession, pieces, extra: dict = None,
+                         tree: MerkleTree = None) -> None:
+        """以流的方式写入二进制容器：明文攒满一个分块就加密写出，内存占用与数据库大小无关
         
-        # 写入文件
-        with open(file_path, 'w', encoding='utf-8') as f:
+        传入 tree 时把加密后的 Merkle 树写入文件头（关联数据绑定本次的快照标识）。
+        """
+        nonce_prefix = secrets.token_bytes(CHUNK_NONCE_PREFIX_LENGTH)
+        aead = session.aead
+        header = {
+            **self._header_fields(session),
+            **(extra or {}),
+            "compression": self.compression,
+            "nonce_prefix": base64.b64encode(nonce_prefix).decode('utf-8'),
+            "chunk_size": CHUNK_SIZE
+        }
+        if tree is not None:
+            header["merkle"] = self._seal_merkle(aead, tree, MERKLE_AAD + nonce_prefix)
+        pieces = self._compress_pieces(pieces, self.compression)
+        with atomic_write(file_path) as f:
+            f.write(self._pack_header(header))
+            buffer = bytearray()
+            index = 0
+            for piece in pieces:
+                buffer += piece
+                # 保留至少一个字节给最后一块，最后一块由 final 标记认证，截断文件会被发现
+                while len(buffer) > CHUNK_SIZE:
+                    with memoryview(buffer) as view:
+                        f.write(self._seal_chunk(aead, nonce_prefix, index, view[:CHUNK_SIZE], False))
+                    del buffer[:CHUNK_SIZE]
+                    index += 1
+            f.write(self._seal_chunk(aead, nonce_prefix, index, bytes(buffer), True))
+        # 整个容器已重写，残留的旧文件头备份不再适用
+        self._discard_header_backup(file_path)
+    
+    def _read_db_header(self, f, file_path: str = None) -> dict:
+        """从文件开头读取数据库结构
+        
+        二进制容器只读取文件头，文件位置停在密文开始处；JSON 格式读取整个文件。
+        传入 file_path 且上次原地覆盖文件头中途中断（留有旧文件头备份）时，
+        在内存中使用备份的文件头，不写回文件（写回见 restore_header，需要持有写入锁）。
+        """
+        backup = self._read_header_backup(file_path) if file_path else None
+        if backup is not None:
+            db = self._read_db_header(io.BytesIO(backup))
+            f.seek(CONTAINER_PREFIX.size + db["header_length"])
+            return db
+        prefix = f.read(CONTAINER_PREFIX.size)
+        if not prefix.startswith(VAULT_MAGIC):
+            return json.loads(prefix + f.read())
+        magic, version, length = CONTAINER_PREFIX.unpack(prefix)
+        if version > VAULT_FORMAT_VERSION:
+            raise Exception(f"数据库格式版本 {version} 过新，请升级密码管理器")
+        db = json.loads(f.read(length))
+        db["version"] = version
+        db["header_length"] = length
+        return db
+    
+    def _write_db(self, file_path: str, db: dict) -> None:
+        """写入 JSON 格式（版本 1/2）的数据库文件"""
+        with atomic_write(file_path, 'w', encoding='utf-8') as f:
             json.dump(db, f, ensure_ascii=False, indent=2)
     
-    def load_encrypted_db(self, file_path: str, master_password: str) -> tuple[dict, list]:
-        """加载加密数据库"""
-        # 读取文件
-        with open(file_path, 'r', encoding='utf-8') as f:
-            db = json.load(f)
+    def _read_db(self, file_path: str) -> dict:
+        """读取整个数据库文件，兼容二进制容器和旧的 JSON 格式（二进制容器的密文放在 ciphertext 中）"""
+        with open(file_path, 'rb') as f:
+            db = self._read_db_header(f, file_path)
+            if db.get("version", 1) >= 3:
+                db["ciphertext"] = f.read()
+        return db
+    
+    def _decrypt_chunks(self, aead: AEAD, db: dict, f) -> bytearray:
+        """按分块流式读取并解密密文
+        
+        每个分块直接解密到预先分配的明文缓冲区中；AEAD 解密时释放 GIL，
+        多核机器上用线程池并行解密，同时在途的分块数有上限，内存占用与分块大小相关。
+        """
+        nonce_prefix = base64.b64decode(db["nonce_prefix"])
+        chunk_size = int(db["chunk_size"])
+        sealed_size = chunk_size + AEAD_TAG_LENGTH
+        body_length = self._remaining_length(f)
+        count = max(1, -(-body_length // sealed_size))
+        plaintext = bytearray(max(0, body_length - count * AEAD_TAG_LENGTH))
+        view = memoryview(plaintext)
+        
+        def decrypt_chunk(index, chunk):
+            nonce = nonce_prefix + CHUNK_INDEX.pack(index)
+            aad = CHUNK_AAD.pack(index, index == count - 1)
+            target = view[index * chunk_size:index * chunk_size + len(chunk) - AEAD_TAG_LENGTH]
+            if hasattr(aead, "decrypt_into"):
+                aead.decrypt_into(nonce, chunk, aad, target)
+            else:
+                target[:] = aead.decrypt(nonce, chunk, aad)
         
-        # 解码 base64 数据
-        salt = base64.b64decode(db["salt"])
+        workers = min(count, os.cpu_count() or 1)
+        if workers == 1:
+            for index in range(count):
+                decrypt_chunk(index, f.read(sealed_size))
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                pending = deque()
+                for index in range(count):
+                    pending.append(pool.submit(decrypt_chunk, index, f.read(sealed_size)))
+                    if len(pending) >= workers * 2:
+                        pending.popleft().result()
+                for future in pending:
+                    future.result()
+        view.release()
+        return plaintext
+    
+    @staticmethod
+    def _remaining_length(f) -> int:
+        """文件（或预读到内存中的密文）从当前位置到结尾的字节数"""
+        if isinstance(f, io.BytesIO):
+            with f.getbuffer() as buffer:
+                return buffer.nbytes - f.tell()
+        return os.fstat(f.fileno()).st_size - f.tell()
+    
+    def _decrypt_payload(self, aead: AEAD, db: dict, f, file_path: str = None,
+                         journal: bytes = None) -> tuple[dict, list]:
+        """解密数据库内容，返回条目和条目顺序（f 为停在密文开始处的文件）
+        
+        传入 file_path 时在快照之上重放变更日志（journal 为预读的日志内容）。
+        """
+        if db.get("version", 1) >= 3:
+            if "chunk_size" in db:
+                plaintext = self._decrypt_chunks(aead, db, f)
+                payload = json.loads(self._decompress(plaintext, normalize_compression(db.get("compression"))))
+            else:
+                payload = json.loads(aead.decrypt(base64.b64decode(db["nonce"]), f.read(), None))
+            data, entries_order = payload["entries"], payload["entries_order"]
+            if file_path and "nonce_prefix" in db:
+                records = self._read_journal(file_path, aead, base64.b64decode(db["nonce_prefix"]), journal)
+                self.apply_journal_records(data, entries_order, records)
+            return data, entries_order
         nonce = base64.b64decode(db["nonce"])
         ciphertext = base64.b64decode(db["ciphertext"])
-        entries_order = db["entries_order"]
+        return json.loads(aead.decrypt(nonce, ciphertext, None)), db["entries_order"]
+    
+    def _parse_header(self, db: dict) -> dict:
+        """解码文件头字段（不解码密文）"""
+        header = {
+            "version": db.get("version", 1),
+            "kdf": normalize_kdf_params(db.get("kdf")),
+            "cipher": normalize_cipher(db.get("cipher")),
+            "salt": base64.b64decode(db["salt"])
+        }
+        if header["version"] >= 2:
+            header["wrap_nonce"] = base64.b64decode(db["wrap_nonce"])
+            header["wrapped_key"] = base64.b64decode(db["wrapped_key"])
+            header["key_check"] = base64.b64decode(db.get("key_check", ""))
+        return header
+    
+    def read_header(self, file_path: str) -> dict:
+        """读取数据库文件头
+        
+        文件头字段写在密文之前，只读取文件开头的一小段即可，
+        验证主密码的耗时不随数据库大小增长；JSON 格式无法截取时回退为读取整个文件。
+        """
+        with open(file_path, 'rb') as f:
+            if f.read(len(VAULT_MAGIC)) == VAULT_MAGIC:
+                f.seek(0)
+                return self._parse_header(self._read_db_header(f, file_path))
+        
+        with open(file_path, 'r', encoding='utf-8') as f:
+            prefix = f.read(HEADER_PREFIX_SIZE)
+        end = prefix.find(',\n  "nonce"')
+        if end != -1:
+            try:
+                return self._parse_header(json.loads(prefix[:end] + '}'))
+            except (ValueError, KeyError):
+                pass
+        return self._parse_header(self._read_db(file_path))
+    
+    def save_encrypted_db(self, file_path: str, master_password: str, data: dict, entries_order: list) -> None:
+        """保存加密数据库"""
+        session = self.create_session(master_password)
+        try:
+            self.save_encrypted_db_with_session(file_path, session, data, entries_order)
+        finally:
+            session.wipe()
+    
+    def save_encrypted_db_with_session(self, file_path: str, session: VaultSession, data: dict, entries_order: list) -> None:
+        """使用会话密钥保存加密数据库（复用数据密钥和文件头，只生成新的 nonce 前缀）"""
+        self._write_container(file_path, session, self._iter_payload(data, entries_order),
+                              tree=self.merkle_tree(data))
+        session.legacy = False
+        # 新快照已包含日志中的全部变更
+        self._discard_journal(file_path)
+    
+    def merkle_tree(self, data: dict, depth: int = None) -> MerkleTree:
+        """条目的 Merkle 树（只为摘要缓存中没有的条目计算摘要）"""
+        return self.digest_cache.tree(data, depth)
+    
+    def _seal_merkle(self, aead: AEAD, tree: MerkleTree, aad: bytes) -> str:
+        nonce = self.generate_nonce()
+        return base64.b64encode(nonce + aead.encrypt(nonce, tree.to_bytes(), aad)).decode('ascii')
+    
+    def _open_merkle(self, aead: AEAD, sealed: str, aad: bytes) -> MerkleTree:
+        raw = base64.b64decode(sealed)
+        try:
+            return MerkleTree.from_bytes(aead.decrypt(raw[:self.nonce_length], raw[self.nonce_length:], aad))
+        except Exception:
+            raise Exception("数据密钥与数据库不一致，不是当前数据库的副本")
+    
+    def read_merkle(self, file_path: str, session: VaultSession) -> tuple:
+        """读取保存快照时写入文件头的 Merkle 树，以及之后变更日志中变更的条目 id
+        
+        只解密文件头中的树和变更日志，不解密条目。
         
-        # 派生密钥
-        key = self.derive_key(master_password, salt)
+        Returns:
+            tuple: (MerkleTree，旧版本保存的数据库没有树时为 None；快照之后变更的条目 id 集合)
+        """
+        with open(file_path, 'rb') as f:
+            db = self._read_db_header(f, file_path)
+        if db.get("version", 1) < 3 or "merkle" not in db:
+            return None, set()
+        base_id = base64.b64decode(db["nonce_prefix"])
+        tree = self._open_merkle(session.aead, db["merkle"], MERKLE_AAD + base_id)
+        records = self._read_journal(file_path, session.aead, base_id)
+        return tree, {record["id"] for record in records if "id" in record}
+    
+    def session_for_copy(self, file_path: str, session: VaultSession) -> VaultSession:
+        """用当前会话的数据密钥打开同一数据库的副本
         
-        # 解密数据
+        副本可能在别处更改过主密码或密钥派生参数，文件头中的包裹密钥不同，但数据密钥相同；
+        返回的会话使用副本的文件头，写入副本时不会改变副本的主密码。
+        数据密钥不同（不是副本）时，之后读取 Merkle 树或解密条目会失败。
+        """
+        header = self.read_header(file_path)
+        if header["version"] < 2:
+            raise Exception("旧格式的数据库不能同步，请先在该数据库所在的设备上登录一次完成迁移")
+        return VaultSession(bytes(session._key), header["salt"], header["wrap_nonce"], header["wrapped_key"],
+                            key_check=header["key_check"], kdf_params=header["kdf"], cipher=header["cipher"])
+    
+    def journal_path(self, file_path: str) -> str:
+        """数据库对应的变更日志文件"""
+        return file_path + JOURNAL_SUFFIX
+    
+    def _discard_journal(self, file_path: str) -> None:
+        """删除变更日志"""
+        journal_path = self.journal_path(file_path)
+        self._journal_state.pop(journal_path, None)
         try:
-            data = self.decrypt_data(key, nonce, ciphertext)
-            return data, entries_order
-        except Exception as e:
-            raise Exception("解密失败，主密码可能不正确")
+            os.remove(journal_path)
+        except FileNotFoundError:
+            pass
+    
+    def _scan_journal(self, journal_path: str, base_id: bytes):
+        """统计日志中完整记录的条数，返回 (条数, 有效长度)
+        
+        日志不存在或属于其他快照时返回 None；末尾写了一半的记录（写入时崩溃）会被截掉。
+        """
+        try:
+            f = open(journal_path, 'r+b')
+        except FileNotFoundError:
+            return None
+        with f:
+            if f.read(len(JOURNAL_MAGIC) + len(base_id)) != JOURNAL_MAGIC + base_id:
+                return None
+            count = 0
+            size = f.tell()
+            total = os.fstat(f.fileno()).st_size
+            while size + JOURNAL_RECORD_LENGTH.size <= total:
+                f.seek(size)
+                length, = JOURNAL_RECORD_LENGTH.unpack(f.read(JOURNAL_RECORD_LENGTH.size))
+                if size + JOURNAL_RECORD_LENGTH.size + length > total:
+                    break
+                size += JOURNAL_RECORD_LENGTH.size + length
+                count += 1
+            if size != total:
+                f.truncate(size)
+        return count, size
+    
+    def _read_journal(self, file_path: str, aead: AEAD, base_id: bytes, content: bytes = None) -> list:
+        """读取并解密属于当前快照的日志记录（其他快照遗留的日志直接忽略）"""
+        if content is None:
+            try:
+                with open(self.journal_path(file_path), 'rb') as f:
+                    content = f.read()
+            except FileNotFoundError:
+                return []
+        prefix = JOURNAL_MAGIC + base_id
+        if not content.startswith(prefix):
+            return []
+        records = []
+        view = memoryview(content)
+        offset = len(prefix)
+        while offset + JOURNAL_RECORD_LENGTH.size <= len(content):
+            length, = JOURNAL_RECORD_LENGTH.unpack_from(content, offset)
+            start = offset + JOURNAL_RECORD_LENGTH.size
+            if start + length > len(content):
+                # 写入时崩溃留下的半条记录
+                break
+            nonce = view[start:start + self.nonce_length]
+            aad = JOURNAL_AAD + base_id + CHUNK_INDEX.pack(len(records))
+            try:
+                plaintext = aead.decrypt(bytes(nonce), view[start + self.nonce_length:start + length], aad)
+            except Exception:
+                raise Exception("变更日志已损坏")
+            records.append(json.loads(plaintext))
+            offset = start + length
+        return records
+    
+    @staticmethod
+    def apply_journal_records(data: dict, entries_order: list, records: list) -> None:
+        """把日志记录应用到条目字典和顺序列表上
+        
+        put 新增或替换条目（新条目追加到末尾），delete 删除条目，order 替换整个顺序。
+        """
+        removed = set()
+        for record in records:
+            op = record["op"]
+            if op == "put":
+                entry_id = record["id"]
+                if entry_id not in data:
+                    if entry_id in removed:
+                        entries_order[:] = [i for i in entries_order if i not in removed]
+                        removed.clear()
+                    entries_order.append(entry_id)
+                data[entry_id] = record["entry"]
+            elif op == "delete":
+                if data.pop(record["id"], None) is not None:
+                    removed.add(record["id"])
+            elif op == "order":
+                entries_order[:] = record["entries_order"]
+                removed.clear()
+        if removed:
+            entries_order[:] = [i for i in entries_order if i not in removed]
+    
+    def append_journal(self, file_path: str, session: VaultSession, records: list) -> None:
+        """把变更记录加密后追加到日志，写入量只与变更的条目有关
+        
+        数据库还不是分块格式（没有快照标识）时，直接合并为新的快照。
+        """
+        with open(file_path, 'rb') as f:
+            db = self._read_db_header(f, file_path)
+        if db.get("version", 1) < 2 or base64.b64decode(db["wrapped_key"]) != session.wrapped_key:
+            raise Exception("数据库已被替换，请重新登录")
+        if "nonce_prefix" not in db:
+            data, entries_order = self.load_encrypted_db_with_session(file_path, session)
+            self.apply_journal_records(data, entries_order, records)
+            self.save_encrypted_db_with_session(file_path, session, data, entries_order)
+            return
+        
+        base_id = base64.b64decode(db["nonce_prefix"])
+        journal_path = self.journal_path(file_path)
+        state = self._journal_state.get(journal_path)
+        if (state is None or state[0] != base_id or not os.path.exists(journal_path)
+                or os.path.getsize(journal_path) != state[2]):
+            scanned = self._scan_journal(journal_path, base_id)
+            if scanned is None:
+                # 没有日志或是其他快照遗留的日志，重新创建
+                with open(journal_path, 'wb') as f:
+                    f.write(JOURNAL_MAGIC + base_id)
+                scanned = (0, len(JOURNAL_MAGIC) + len(base_id))
+            state = (base_id, *scanned)
+        
+        base_id, count, size = state
+        aead = session.aead
+        with open(journal_path, 'ab') as f:
+            for record in records:
+                nonce = self.generate_nonce()
+                aad = JOURNAL_AAD + base_id + CHUNK_INDEX.pack(count)
+                sealed = nonce + aead.encrypt(nonce, json.dumps(record, ensure_ascii=False).encode('utf-8'), aad)
+                f.write(JOURNAL_RECORD_LENGTH.pack(len(sealed)) + sealed)
+                size += JOURNAL_RECORD_LENGTH.size + len(sealed)
+                count += 1
+            f.flush()
+            os.fsync(f.fileno())
+        self._journal_state[journal_path] = (base_id, count, size)
+    
+    def journal_needs_compaction(self, file_path: str) -> bool:
+        """日志超过大小上限或占快照的比例过高时需要合并"""
+        try:
+            journal_size = os.path.getsize(self.journal_path(file_path))
+            base_size = os.path.getsize(file_path)
+        except FileNotFoundError:
+            return False
+        return journal_size >= JOURNAL_COMPACT_BYTES or journal_size >= base_size * JOURNAL_COMPACT_RATIO
+    
+    def compact_journal(self, file_path: str, session: VaultSession) -> None:
+        """把日志合并到新的快照中并删除日志（没有日志时不做任何事）"""
+        if not os.path.exists(self.journal_path(file_path)):
+            return
+        data, entries_order = self.load_encrypted_db_with_session(file_path, session)
+        self.save_encrypted_db_with_session(file_path, session, data, entries_order)
+    
+    def archive_path(self, file_path: str) -> str:
+        """数据库对应的归档段文件"""
+        return file_path + ARCHIVE_SUFFIX
+    
+    def load_archive(self, file_path: str, session: VaultSession) -> tuple[dict, list]:
+        """解密归档段，返回归档的条目和顺序（没有归档段时返回空）"""
+        try:
+            f = open(self.archive_path(file_path), 'rb')
+        except FileNotFoundError:
+            return {}, []
+        with f:
+            db = self._read_db_header(f, self.archive_path(file_path))
+            if db.get("segment") != "archive":
+                raise Exception("归档文件无效")
+            try:
+                return self._decrypt_payload(session.aead, db, f)
+            except Exception:
+                raise Exception("解密归档失败，会话密钥与归档不匹配")
+    
+    def save_archive(self, file_path: str, session: VaultSession, data: dict, entries_order: list) -> None:
+        """重写归档段（只写归档，不触碰数据库文件）；归档为空时删除归档文件"""
+        archive_path = self.archive_path(file_path)
+        if not entries_order:
+            if os.path.exists(archive_path):
+                os.remove(archive_path)
+            self._discard_header_backup(archive_path)
+            return
+        self._write_container(archive_path, session, self._iter_payload(data, entries_order), {"segment": "archive"})
+    
+    def sync_state_path(self, file_path: str) -> str:
+        """数据库对应的同步记录文件"""
+        return file_path + SYNC_SUFFIX
+    
+    def load_sync_state(self, file_path: str, session: VaultSession) -> dict:
+        """解密同步记录，返回 {文件夹中数据库的路径: 上次同步后两边共有的条目 id 列表}（没有时返回空）"""
+        try:
+            f = open(self.sync_state_path(file_path), 'rb')
+        except FileNotFoundError:
+            return {}
+        with f:
+            db = self._read_db_header(f, self.sync_state_path(file_path))
+            if db.get("segment") != "sync":
+                raise Exception("同步记录文件无效")
+            try:
+                return self._decrypt_payload(session.aead, db, f)[0]
+            except Exception:
+                raise Exception("解密同步记录失败，会话密钥与同步记录不匹配")
+    
+    def save_sync_state(self, file_path: str, session: VaultSession, state: dict) -> None:
+        """重写同步记录"""
+        self._write_container(self.sync_state_path(file_path), session, self._iter_payload(state, list(state)),
+                              {"segment": "sync"})
+    
+    def load_encrypted_db(self, file_path: str, master_password: str) -> tuple[dict, list]:
+        """加载加密数据库"""
+        data, entries_order, session = self.unlock_db(file_path, master_password)
+        session.wipe()
+        return data, entries_order
+    
+    def load_encrypted_db_with_session(self, file_path: str, session: VaultSession) -> tuple[dict, list]:
+        """使用会话密钥加载加密数据库（不再运行 Argon2）"""
+        with open(file_path, 'rb') as f:
+            db = self._read_db_header(f, file_path)
+            if db.get("version", 1) < 2 or base64.b64decode(db["wrapped_key"]) != session.wrapped_key:
+                raise Exception("数据库已被替换，请重新登录")
+            
+            try:
+                return self._decrypt_payload(session.aead, db, f, file_path)
+            except Exception:
+                raise Exception("解密失败，会话密钥与数据库不匹配")
+    
+    def _file_stamp(self, file_path: str) -> tuple:
+        """文件的大小和修改时间（不存在时为 None），用于判断预读的内容是否仍然有效"""
+        try:
+            stat = os.stat(file_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+    
+    def _vault_stamp(self, file_path: str) -> tuple:
+        """数据库文件及其附属文件（变更日志）的标记"""
+        return self._file_stamp(file_path), self._file_stamp(self.journal_path(file_path))
+    
+    def vault_stamp(self, file_path: str) -> tuple:
+        """数据库当前的标记（大小和修改时间），标记变化说明数据库被修改过"""
+        return self._vault_stamp(file_path)
+    
+    def vault_files(self, file_path: str) -> list:
+        """数据库的数据文件（检测外部修改时监视这些文件）"""
+        return [file_path, self.journal_path(file_path)]
+    
+    def prefetch(self, file_path: str) -> dict:
+        """预读数据库：读取文件和变更日志、解析文件头，不需要主密码
+        
+        登录对话框显示时在后台线程中调用，提交主密码后 unlock_db 只需派生密钥和解密。
+        
+        Returns:
+            dict: 预读的内容，elapsed_ms 为预读耗时
+        """
+        start = time.perf_counter()
+        stamp = self._vault_stamp(file_path)
+        with open(file_path, 'rb') as f:
+            db = self._read_db_header(f, file_path)
+            body = f.read() if db.get("version", 1) >= 3 else b""
+        try:
+            with open(self.journal_path(file_path), 'rb') as f:
+                journal = f.read()
+        except FileNotFoundError:
+            journal = None
+        return {
+            "file_path": file_path, "stamp": stamp, "db": db, "body": body, "journal": journal,
+            "elapsed_ms": (time.perf_counter() - start) * 1000
+        }
+    
+    def prefetch_is_fresh(self, file_path: str, prefetched: dict) -> bool:
+        """预读之后数据库文件没有被修改"""
+        return (prefetched is not None and prefetched["file_path"] == file_path
+                and prefetched["stamp"] == self._vault_stamp(file_path))
+    
+    @contextmanager
+    def _open_vault(self, file_path: str, prefetched: dict = None):
+        """打开数据库，返回 (文件头结构, 停在密文开始处的文件, 预读的日志)
+        
+        预读内容仍然有效时直接使用内存中的数据，否则读取文件。
+        """
+        if self.prefetch_is_fresh(file_path, prefetched):
+            yield prefetched["db"], io.BytesIO(prefetched["body"]), prefetched["journal"]
+            return
+        with open(file_path, 'rb') as f:
+            yield self._read_db_header(f, file_path), f, None
+    
+    def unlock_db(self, file_path: str, master_password: str, prefetched: dict = None) -> tuple[dict, list, VaultSession]:
+        """一次派生完成解锁：返回解密后的数据、条目顺序和会话密钥
+        
+        旧格式（版本 1）的数据库会生成新的随机数据密钥，并用同一个派生密钥包裹，
+        返回的会话标记为 legacy，下次保存时即迁移为版本 2。
+        传入 prefetch() 的结果且文件未被修改时，不再读取文件。
+        """
+        with self._open_vault(file_path, prefetched) as (db, f, journal):
+            header = self._parse_header(db)
+            
+            # 按文件头记录的参数派生密钥（整个解锁过程只运行一次 Argon2）
+            wrapping_key = self.derive_key(master_password, header["salt"], header["kdf"])
+            
+            if header["version"] >= 2:
+                # 先用密钥校验值拒绝错误的主密码，不触碰数据库密文
+                self.check_key(wrapping_key, header["key_check"])
+                data_key = self.unwrap_key(wrapping_key, header["wrap_nonce"], header["wrapped_key"])
+                session = VaultSession(data_key, header["salt"], header["wrap_nonce"], header["wrapped_key"],
+                                       key_check=header["key_check"] or self.compute_key_check(wrapping_key),
+                                       kdf_params=header["kdf"], cipher=header["cipher"])
+                aead = session.aead
+            else:
+                data_key = secrets.token_bytes(self.data_key_length)
+                session = self._new_session(wrapping_key, header["salt"], data_key, header["kdf"], legacy=True)
+                aead = AESGCM(wrapping_key)
+            
+            # 解密数据
+            try:
+                data, entries_order = self._decrypt_payload(aead, db, f, file_path, journal)
+            except Exception as e:
+                session.wipe()
+                raise Exception("解密失败，主密码可能不正确")
+            return data, entries_order, session
+    
+    def verify_session_password(self, session: VaultSession, master_password: str) -> bool:
+        """验证主密码是否与当前会话一致（只派生密钥并解开文件头中的数据密钥，不读取数据库）"""
+        if session is None or not session.active:
+            return False
+        try:
+            wrapping_key = self.derive_key(master_password, session.salt, session.kdf_params)
+            self.check_key(wrapping_key, session.key_check)
+            data_key = self.unwrap_key(wrapping_key, session.wrap_nonce, session.wrapped_key)
+        except Exception:
+            return False
+        return session.matches(data_key)
     
     def verify_master_password(self, file_path: str, master_password: str) -> bool:
-        """验证主密码是否正确（通过尝试解密来验证）"""
+        """验证主密码是否正确（有密钥校验值时只校验文件头，否则通过尝试解密来验证）"""
         try:
-            self.load_encrypted_db(file_path, master_password)
+            header = self.read_header(file_path)
+            if header["version"] >= 2:
+                wrapping_key = self.derive_key(master_password, header["salt"], header["kdf"])
+                self.check_key(wrapping_key, header["key_check"])
+                self.unwrap_key(wrapping_key, header["wrap_nonce"], header["wrapped_key"])
+            else:
+                self.load_encrypted_db(file_path, master_password)
             return True
         except Exception:
             return False
     
+    def header_backup_path(self, file_path: str) -> str:
+        """原地覆盖文件头时旧文件头的备份文件"""
+        return file_path + HEADER_BACKUP_SUFFIX
+    
+    def _discard_header_backup(self, file_path: str) -> None:
+        try:
+            os.remove(self.header_backup_path(file_path))
+        except FileNotFoundError:
+            pass
+    
+    def _read_header_backup(self, file_path: str):
+        """读取旧文件头的备份（没有时返回 None）"""
+        try:
+            with open(self.header_backup_path(file_path), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+    
+    def restore_header(self, file_path: str) -> bool:
+        """上次原地覆盖文件头时中途崩溃：写回备份的旧文件头，返回是否做了恢复
+        
+        密文没有变化，旧文件头仍然有效（恢复后旧主密码继续可用）。会写入数据库文件，
+        调用方需要持有写入锁；读取时不调用，只读模式下在内存中使用备份的文件头。
+        """
+        backup = self._read_header_backup(file_path)
+        if backup is None:
+            return False
+        with open(file_path, 'r+b') as f:
+            f.write(backup)
+            f.flush()
+            os.fsync(f.fileno())
+        self._discard_header_backup(file_path)
+        return True
+    
+    def restore_headers(self, file_path: str) -> bool:
+        """写回数据库、归档段和同步记录中断覆盖前备份的文件头（需要持有写入锁），返回是否做了恢复"""
+        restored = False
+        for path in (file_path, self.archive_path(file_path), self.sync_state_path(file_path)):
+            if os.path.exists(path):
+                restored = self.restore_header(path) or restored
+        return restored
+    
+    def rewrite_header(self, file_path: str, session: VaultSession) -> None:
+        """只替换文件头中的包裹密钥，密文原样保留，不重新加密
+        
+        新文件头放得下补齐后的长度时原地覆盖（只写文件开头的几个块，与数据库大小无关），
+        覆盖前旧文件头先原子写入备份文件，中途崩溃时读取使用备份，以可写模式打开时写回；
+        放不下时写入临时文件，密文按块原样复制后原子替换。
+        """
+        self.restore_header(file_path)
+        with open(file_path, 'rb') as f:
+            db = self._read_db_header(f, file_path)
+        if db.get("version", 1) >= 3:
+            length = db.pop("header_length")
+            db.pop("version")
+            packed = self._pack_header({**db, **self._header_fields(session)}, length)
+            if len(packed) == CONTAINER_PREFIX.size + length:
+                with open(file_path, 'rb') as f:
+                    old_header = f.read(len(packed))
+                with atomic_write(self.header_backup_path(file_path)) as f:
+                    f.write(old_header)
+                with open(file_path, 'r+b') as f:
+                    f.write(packed)
+                    f.flush()
+                    os.fsync(f.fileno())
+                self._discard_header_backup(file_path)
+                return
+            with atomic_write(file_path) as f, open(file_path, 'rb') as source:
+                f.write(packed)
+                source.seek(CONTAINER_PREFIX.size + length)
+                shutil.copyfileobj(source, f, CHUNK_SIZE)
+            return
+        
+        if db.get("version", 1) < 2:
+            raise Exception("旧格式数据库需要先迁移才能更新文件头")
+        db.update(self._header_fields(session))
+        self._write_db(file_path, db)
+    
+    def change_session_password(self, file_path: str, session: VaultSession, new_password: str) -> VaultSession:
+        """已登录时更改主密码：重新包裹数据密钥并重写文件头，返回新的会话"""
+        new_session = self.rekey_session(session, new_password)
+        try:
+            self.rewrite_header(file_path, new_session)
+            # 归档段和同步记录的文件头同样包含包裹后的数据密钥，一并替换，旧主密码不能再解开
+            for path in (self.archive_path(file_path), self.sync_state_path(file_path)):
+                if os.path.exists(path):
+                    self.rewrite_header(path, new_session)
+        except Exception:
+            new_session.wipe()
+            raise
+        return new_session
+    
     def change_master_password(self, file_path: str, old_password: str, new_password: str) -> bool:
         """更改主密码"""
         try:
-            # 加载现有数据
-            data, entries_order = self.load_encrypted_db(file_path, old_password)
-            # 用新密码重新加密保存
-            self.save_encrypted_db(file_path, new_password, data, entries_order)
+            data, entries_order, session = self.unlock_db(file_path, old_password)
+            try:
+                if session.legacy:
+                    # 旧格式数据库直接以新主密码迁移保存
+                    new_session = self.rekey_session(session, new_password)
+                    self.save_encrypted_db_with_session(file_path, new_session, data, entries_order)
+                else:
+                    new_session = self.change_session_password(file_path, session, new_password)
+                new_session.wipe()
+            finally:
+                session.wipe()
             return True
         except Exception as e:
             return False
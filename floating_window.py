@@ -141,6 +141,32 @@ class FloatingWindow(QWidget):
         self.entries_order = entries_order
         self.filter_entries(self.search_edit.text())
     
+    def apply_changes(self, entries, entries_order, changed_ids, rebuild):
+        """应用数据库的外部修改：只更新内容变化的条目所在的列表项；有增删、重新排序或正在搜索时重新过滤
+        
+        窗口隐藏时只替换数据，显示时会重新刷新。
+        """
+        self.entries = entries
+        self.entries_order = entries_order
+        if not self.isVisible():
+            return
+        if rebuild or self.search_edit.text():
+            self.filter_entries(self.search_edit.text())
+            return
+        for row in range(self.list_widget.count()):
+            item = self.list_widget.item(row)
+            entry_id = item.data(Qt.ItemDataRole.UserRole)['id']
+            if entry_id not in changed_ids:
+                continue
+            entry = entries[entry_id]
+            website_label, username_label = self.list_widget.itemWidget(item).findChildren(QLabel)
+            website_label.setText(f"<b>{entry['website_name']}</b>")
+            username_label.setText(f"账号: {entry['username']}")
+            item.setData(Qt.ItemDataRole.UserRole, entry)
+            self.filtered_entries[row] = entry
+            if self.current_entry and self.current_entry['id'] == entry_id:
+                self.current_entry = entry
+    
     def filter_entries(self, text):
         """根据搜索文本过滤条目"""
         self.list_widget.clear()
@@ -244,7 +270,11 @@ class FloatingWindow(QWidget):
     def fill_password(self):
         """填充密码（复制到剪贴板）"""
         if self.current_entry:
-            password = self.current_entry['password']
+            try:
+                password = self.main_window.reveal_entry(self.current_entry)['password']
+            except Exception as e:
+                QMessageBox.warning(self, "警告", f"读取密码失败：{str(e)}")
+                return
             self.copy_to_clipboard(password)
         else:
             msg_box = QMessageBox()
@@ -283,8 +313,10 @@ class FloatingWindow(QWidget):
         """刷新条目数据"""
         # 从主窗口获取最新数据
         if self.main_window:
-            self.entries = self.main_window.entries
-            self.entries_order = self.main_window.entries_order
+            # 使用主窗口当前版本的快照：不拷贝，之后主窗口的修改也不会影响正在进行的搜索
+            snapshot = self.main_window.vault.snapshot()
+            self.entries = snapshot.entries
+            self.entries_order = snapshot.order
             self.filter_entries(self.search_edit.text())
             self.status_label.setText("数据已刷新")
     
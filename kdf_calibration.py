@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Argon2 参数自动校准
+
+在当前机器上测量 hash_secret_raw 的耗时，在解锁耗时预算内选出强度最高的
+time_cost / memory_cost / parallelism 组合。
+
+命令行用法：
+    python kdf_calibration.py --target-ms 500
+    python kdf_calibration.py --target-ms 500 --save   # 写入 settings.json
+"""
+
+import argparse
+import ctypes
+import json
+import os
+import secrets
+import time
+
+from argon2 import Type
+from argon2.low_level import hash_secret_raw
+
+from crypto import LEGACY_KDF_PARAMS, normalize_kdf_params
+
+# 候选内存大小（KiB），最低不低于原有的 64 MiB
+MEMORY_CANDIDATES = [65536, 131072, 262144, 524288, 1048576]
+# 候选并行通道数
+PARALLELISM_CANDIDATES = [1, 2, 4, 8]
+# time_cost 上限
+MAX_TIME_COST = 10
+# 候选内存最多占当前可用物理内存的比例（解锁时其他程序同样占用内存，留出余量避免换页）
+AVAILABLE_MEMORY_FRACTION = 0.5
+
+
+class CalibrationCancelled(Exception):
+    """progress 回调抛出此异常可在测量下一个候选之前中止校准"""
+
+
+def available_memory_kib():
+    """当前可用的物理内存（KiB），无法获取时返回 None"""
+    if hasattr(os, "sysconf"):
+        try:
+            pages = os.sysconf("SC_AVPHYS_PAGES")
+            page_size = os.sysconf("SC_PAGE_SIZE")
+        except (ValueError, OSError):
+            return None
+        return pages * page_size // 1024 if pages > 0 and page_size > 0 else None
+    try:  # Windows
+        class MemoryStatus(ctypes.Structure):
+            _fields_ = [("dwLength", ctypes.c_ulong), ("dwMemoryLoad", ctypes.c_ulong),
+                        ("ullTotalPhys", ctypes.c_ulonglong), ("ullAvailPhys", ctypes.c_ulonglong),
+                        ("ullTotalPageFile", ctypes.c_ulonglong), ("ullAvailPageFile", ctypes.c_ulonglong),
+                        ("ullTotalVirtual", ctypes.c_ulonglong), ("ullAvailVirtual", ctypes.c_ulonglong),
+                        ("ullAvailExtendedVirtual", ctypes.c_ulonglong)]
+
+        status = MemoryStatus()
+        status.dwLength = ctypes.sizeof(MemoryStatus)
+        if not ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+            return None
+        return status.ullAvailPhys // 1024
+    except (AttributeError, OSError):
+        return None
+
+
+def memory_limit_kib(max_memory_kib: int) -> int:
+    """按当前可用内存收紧候选内存上限（无法获取可用内存时保持原上限）"""
+    available = available_memory_kib()
+    if available is None:
+        return max_memory_kib
+    return min(max_memory_kib, int(available * AVAILABLE_MEMORY_FRACTION))
+
+
+def measure_kdf(time_cost: int, memory_cost: int, parallelism: int) -> float:
+    """测量一次密钥派生的耗时（毫秒）"""
+    start = time.perf_counter()
+    hash_secret_raw(
+        secret=b"calibration",
+        salt=secrets.token_bytes(16),
+        time_cost=time_cost,
+        memory_cost=memory_cost,
+        parallelism=parallelism,
+        hash_len=32,
+        type=Type.ID
+    )
+    return (time.perf_counter() - start) * 1000
+
+
+def calibrate_kdf(target_ms: int = 500, max_memory_kib: int = 1048576, max_parallelism: int = None,
+                  progress=None) -> tuple[dict, list]:
+    """在解锁耗时预算内选择强度最高的 Argon2 参数
+
+    强度按 memory_cost × time_cost（需要填充的内存总量）计算，
+    强度相同时选择耗时更短的组合。候选内存不超过当前可用物理内存的
+    AVAILABLE_MEMORY_FRACTION，最小的候选（64 MiB）始终会测量。
+
+    Args:
+        target_ms: 解锁耗时预算（毫秒）
+        max_memory_kib: 允许使用的最大内存（KiB）
+        max_parallelism: 最大并行通道数（None 表示按 CPU 核心数）
+        progress: 每测量一个候选后调用 progress(result)，可用于刷新界面；
+            抛出 CalibrationCancelled 可中止校准（异常原样抛给调用方）
+
+    Returns:
+        tuple: (选中的参数, 每个候选的测量结果列表)
+    """
+    cpu_count = os.cpu_count() or 1
+    if max_parallelism is None:
+        max_parallelism = cpu_count
+    parallelisms = [p for p in PARALLELISM_CANDIDATES if p <= max(1, max_parallelism)]
+    max_memory_kib = memory_limit_kib(max_memory_kib)
+    memories = [m for m in MEMORY_CANDIDATES if m <= max_memory_kib] or [MEMORY_CANDIDATES[0]]
+
+    results = []
+
+    def record(time_cost, memory_cost, parallelism):
+        elapsed = min(measure_kdf(time_cost, memory_cost, parallelism) for _ in range(2))
+        result = {
+            "time_cost": time_cost,
+            "memory_cost": memory_cost,
+            "parallelism": parallelism,
+            "elapsed_ms": round(elapsed, 1),
+            "within_budget": elapsed <= target_ms
+        }
+        results.append(result)
+        if progress:
+            progress(result)
+        return result
+
+    for memory_cost in memories:
+        memory_fits = False
+        for parallelism in parallelisms:
+            # 先测 time_cost=1，再按线性外推估算预算内的最大 time_cost
+            base = record(1, memory_cost, parallelism)
+            if not base["within_budget"]:
+                continue
+            memory_fits = True
+            time_cost = min(MAX_TIME_COST, max(1, int(target_ms // max(base["elapsed_ms"], 1))))
+            while time_cost > 1:
+                if record(time_cost, memory_cost, parallelism)["within_budget"]:
+                    break
+                time_cost -= 1
+            # 外推包含了内存分配的固定开销，偏保守，继续尝试更大的 time_cost
+            while 1 < time_cost < MAX_TIME_COST:
+                if not record(time_cost + 1, memory_cost, parallelism)["within_budget"]:
+                    break
+                time_cost += 1
+        if not memory_fits:
+            # 更大的内存只会更慢，停止尝试
+            break
+
+    within = [r for r in results if r["within_budget"]]
+    if within:
+        best = max(within, key=lambda r: (r["memory_cost"] * r["time_cost"], -r["elapsed_ms"]))
+    else:
+        # 预算过小时选择最快的候选
+        best = min(results, key=lambda r: r["elapsed_ms"])
+
+    params = normalize_kdf_params({
+        **LEGACY_KDF_PARAMS,
+        "time_cost": best["time_cost"],
+        "memory_cost": best["memory_cost"],
+        "parallelism": best["parallelism"]
+    })
+    return params, results
+
+
+def format_results(results: list, selected: dict) -> str:
+    """格式化校准结果"""
+    lines = [f"{'time_cost':>9} {'内存(MiB)':>9} {'并行':>4} {'耗时(ms)':>9}  "]
+    for r in results:
+        chosen = (r["time_cost"] == selected["time_cost"] and r["memory_cost"] == selected["memory_cost"]
+                  and r["parallelism"] == selected["parallelism"])
+        mark = "← 选中" if chosen else ("" if r["within_budget"] else "超出预算")
+        lines.append(f"{r['time_cost']:>9} {r['memory_cost'] // 1024:>9} {r['parallelism']:>4} "
+                     f"{r['elapsed_ms']:>9.1f}  {mark}")
+    return "\n".join(lines)
+
+
+def save_to_settings(params: dict, target_ms: int, settings_file: str = "settings.json") -> None:
+    """把校准结果写入设置文件（保留其他设置项原样）"""
+    settings = {}
+    if os.path.exists(settings_file):
+        with open(settings_file, 'r', encoding='utf-8') as f:
+            settings = json.load(f)
+    settings["kdf_params"] = params
+    settings["unlock_budget_ms"] = target_ms
+    with open(settings_file, 'w', encoding='utf-8') as f:
+        json.dump(settings, f, ensure_ascii=False, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Argon2 参数自动校准")
+    parser.add_argument("--target-ms", type=int, default=500, help="解锁耗时预算（毫秒）")
+    parser.add_argument("--max-memory-mib", type=int, default=1024, help="允许使用的最大内存（MiB）")
+    parser.add_argument("--max-parallelism", type=int, default=None, help="最大并行通道数")
+    parser.add_argument("--save", action="store_true", help="把结果写入 settings.json")
+    args = parser.parse_args()
+
+    params, results = calibrate_kdf(args.target_ms, args.max_memory_mib * 1024, args.max_parallelism,
+                                    progress=lambda r: print(f"  测量 t={r['time_cost']} m={r['memory_cost'] // 1024}MiB "
+                                                             f"p={r['parallelism']}: {r['elapsed_ms']:.1f} ms"))
+    print()
+    print(format_results(results, params))
+    print(f"\n选中参数：time_cost={params['time_cost']}, memory_cost={params['memory_cost'] // 1024} MiB, "
+          f"parallelism={params['parallelism']}")
+    if args.save:
+        save_to_settings(params, args.target_ms)
+        print("已写入 settings.json，下次登录时自动用新参数重新包裹数据密钥")
+
+
+if __name__ == "__main__":
+    main()
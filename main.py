@@ -21,8 +21,8 @@ def main():
     # 设置全局样式
     app.setStyle("Fusion")
     
-    # 创建主窗口
-    main_window = MainWindow()
+    # 创建主窗口（--read-only：以只读模式打开数据库，不保存修改，可与另一个窗口同时运行）
+    main_window = MainWindow(read_only="--read-only" in sys.argv)
     
     # 创建悬浮窗口
     floating_window = FloatingWindow(main_window)
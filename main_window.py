@@ -3,18 +3,34 @@ from PyQt6.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QTa
                              QCheckBox, QMenuBar, QMenu, QSystemTrayIcon, QMessageBox,
                              QFileDialog, QInputDialog, QHeaderView, QTextEdit, QApplication,
                              QSizePolicy)
-from PyQt6.QtCore import Qt, QTimer, QUrl, QMimeData, QPoint, QEvent
+from PyQt6.QtCore import Qt, QTimer, QUrl, QMimeData, QPoint, QEvent, QFileSystemWatcher, pyqtSignal
 from PyQt6.QtGui import QDesktopServices, QDrag, QPixmap, QColor, QKeySequence, QIcon, QAction, QPainter
 import uuid
-from datetime import datetime
+import hashlib
+import secrets
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 import os
+import sys
 import json
 from pathlib import Path
 
 from crypto import CryptoManager
+from sqlite_store import SQLiteCryptoManager
+from cipher_benchmark import select_cipher
+from quick_unlock import QuickUnlock, MIN_PIN_LENGTH, MAX_PIN_LENGTH, is_pin
 from password_generator import PasswordGenerator
 from batch_importer import BatchImporter
-from settings_dialog import SettingsDialog
+from settings_dialog import SettingsDialog, default_settings, save_to_settings
+from archive_dialog import ArchiveDialog
+from vault_writer import VaultWriter
+from vault_lock import VaultLock
+from vault_backup import BackupStore, DEFAULT_BACKUP_DIR, DEFAULT_RETENTION, read_vault_files
+from vault_export import export_entries
+from vault_merge import plan_merge, resolve_conflicts
+from vault_sync import sync_with_copy
+from vault_snapshot import VaultState, diff_entries
 
 class PasswordEntryDialog(QDialog):
     """密码条目添加/编辑对话框"""
@@ -146,15 +162,17 @@ class PasswordEntryDialog(QDialog):
                 msg_box.exec()
                 return
 
-        # 更新条目
-        self.entry.update({
+        # 更新条目（内容没有变化时保留原来的修改时间，保存时识别为未修改）
+        updated = {
             'website_name': website_name,
             'url': url,
             'username': username,
             'password': password,
-            'note': self.note_edit.text().strip(),
-            'updated_at': datetime.now().isoformat()
-        })
+            'note': self.note_edit.text().strip()
+        }
+        if any(self.entry.get(key) != value for key, value in updated.items()):
+            updated['updated_at'] = datetime.now().isoformat()
+        self.entry.update(updated)
 
         self.accept()
     
@@ -163,7 +181,21 @@ class PasswordEntryDialog(QDialog):
         return self.entry
 
 class MainWindow(QMainWindow):
-    def __init__(self):
+    # 各存储引擎的数据库文件和加载/保存实现
+    STORAGE_BACKENDS = {
+        "file": ("passwords.json.aes", CryptoManager),
+        "sqlite": ("passwords.db", SQLiteCryptoManager)
+    }
+    # 数据库文件变化后等待的时间（毫秒），合并同一次写入触发的多个通知
+    RELOAD_DELAY_MS = 300
+    
+    # 后台重新读取数据库完成时发出（在界面线程中应用）
+    vault_reloaded = pyqtSignal(object)
+    # 后台备份完成时发出
+    backup_finished = pyqtSignal(object)
+    export_finished = pyqtSignal(object)
+
+    def __init__(self, read_only=False):
         super().__init__()
         self.setWindowTitle("密码管理器")
         self.setMinimumSize(800, 600)
@@ -173,9 +205,56 @@ class MainWindow(QMainWindow):
         # 初始化数据
         self.db_file = "passwords.json.aes"
         self.crypto_manager = CryptoManager()
-        self.entries = {}
-        self.entries_order = []
+        # 条目和条目顺序保存为写时复制的版本（entries / entries_order 是可变视图），
+        # 后台写入、搜索和导出使用 self.vault.snapshot()，不拷贝也不加锁
+        self.vault = VaultState()
         self.master_password = ""
+        self.session = None  # 会话密钥，解锁时派生一次，锁定时清除
+        # 修改跟踪：尚未提交保存的条目，以及最近一次保存时条目明文的摘要和对应的密文
+        self.dirty_ids = set()
+        # 完整快照写入失败后，下一次保存改为写入完整快照
+        self.snapshot_unsaved = False
+        self.entry_digests = {}  # 条目 id → (明文摘要, 拆分后的条目)
+        # 最近一次提交保存（或加载）时的 (会话, 数据库路径, 快照)，完整保存时据此统计变更的条目
+        self.saved_state = None
+        self.digest_key = secrets.token_bytes(32)  # 摘要使用进程内随机密钥，不会成为密码的离线校验值
+        # 后台写入线程：合并连续修改，原子替换数据库文件
+        self.vault_writer = VaultWriter(self.crypto_manager, self)
+        self.vault_writer.save_failed.connect(self.on_save_failed)
+        self.vault_writer.save_finished.connect(self.on_save_finished)
+        # 多进程文件锁：可写模式持有写入者锁，只读模式只在读取时加共享锁，不保存也不启动写入线程
+        self.vault_lock = None
+        self.read_only = read_only
+        # PIN 快速解锁：锁定期间只在内存中保存用 PIN 包裹的会话密钥
+        self.quick_unlock = QuickUnlock(self.crypto_manager)
+        # 登录对话框显示期间在后台预读数据库；startup_metrics 记录最近一次解锁的耗时（预读失败时包含错误信息）
+        self.prefetch_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="VaultPrefetch")
+        self.prefetch_future = None
+        self.prefetch_error = None
+        self.startup_metrics = {}
+        # 归档段：解锁时不解密，第一次打开归档或搜索未命中时才加载（None 表示尚未加载）
+        self.archive_entries = None
+        self.archive_order = []
+        # 监视数据库文件：被外部替换或修改（备份恢复、同步文件夹、另一个窗口）时在后台重新读取，
+        # 只更新变化的条目；known_vault_stamp 为内存中的条目对应的文件标记
+        self.vault_watcher = QFileSystemWatcher(self)
+        self.vault_watcher.fileChanged.connect(self.on_vault_file_changed)
+        self.vault_watcher.directoryChanged.connect(self.on_vault_file_changed)
+        self.reload_timer = QTimer(self)
+        self.reload_timer.setSingleShot(True)
+        self.reload_timer.setInterval(self.RELOAD_DELAY_MS)
+        self.reload_timer.timeout.connect(self.check_vault_changed)
+        self.vault_reloaded.connect(self.apply_reloaded_vault)
+        self.known_vault_stamp = None
+        self.reload_future = None
+        # 定时备份：在单独的线程中把加密文件增量备份到备份目录（间隔由设置决定）；导出选中的条目也在这个线程中进行
+        self.backup_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="VaultBackup")
+        self.backup_future = None
+        self.export_future = None
+        self.export_finished.connect(self.on_export_finished)
+        self.backup_timer = QTimer(self)
+        self.backup_timer.timeout.connect(self.start_backup)
+        self.backup_finished.connect(self.on_backup_finished)
         self.settings = {"auto_lock_time": 5, "lock_on_minimize": True, "theme": "light", "enable_auto_lock": True}
         self.login_dialog_visible = False
         self.last_selected_row = -1  # 用于Shift多选
@@ -200,12 +279,33 @@ class MainWindow(QMainWindow):
         # 加载设置
         self.load_settings()
         
+        # 取得数据库的写入者锁（已被其他进程打开时询问是否以只读模式打开）
+        self.open_vault_lock()
+        
         # 检查数据库文件
         if not os.path.exists(self.db_file):
             self.setup_first_run()
         else:
             self.show_login_dialog()
     
+    @property
+    def entries(self):
+        """当前条目字典（可变视图，修改时生成新版本）"""
+        return self.vault.entries
+    
+    @entries.setter
+    def entries(self, data):
+        self.vault.replace(entries=data)
+    
+    @property
+    def entries_order(self):
+        """当前条目顺序（可变视图，修改时生成新版本）"""
+        return self.vault.order
+    
+    @entries_order.setter
+    def entries_order(self, order):
+        self.vault.replace(order=order)
+    
     def init_ui(self):
         """初始化界面"""
         central_widget = QWidget()
@@ -280,6 +380,9 @@ class MainWindow(QMainWindow):
         self.delete_btn = QPushButton("删除")
         self.delete_btn.clicked.connect(self.delete_entries)
         
+        self.archive_btn = QPushButton("归档")
+        self.archive_btn.clicked.connect(self.archive_selected_entries)
+        
         self.batch_add_btn = QPushButton("批量添加")
         self.batch_add_btn.clicked.connect(self.batch_add_entries)
         
@@ -297,6 +400,7 @@ class MainWindow(QMainWindow):
         button_layout.addWidget(self.add_btn)
         button_layout.addWidget(self.edit_btn)
         button_layout.addWidget(self.delete_btn)
+        button_layout.addWidget(self.archive_btn)
         button_layout.addWidget(self.batch_add_btn)
         button_layout.addWidget(self.floating_btn)
         button_layout.addStretch()
@@ -308,6 +412,9 @@ class MainWindow(QMainWindow):
         # 状态栏
         self.status_bar = self.statusBar()
         self.status_bar.showMessage("已加载 0 个密码条目")
+        # 状态栏右侧显示最近一次后台写入的变更条目数
+        self.save_status_label = QLabel()
+        self.status_bar.addPermanentWidget(self.save_status_label)
         
         # 键盘快捷键
         self.init_shortcuts()
@@ -322,6 +429,28 @@ class MainWindow(QMainWindow):
         settings_action.triggered.connect(self.open_settings)
         settings_menu.addAction(settings_action)
         
+        # 备份菜单
+        backup_menu = menu_bar.addMenu("备份")
+        backup_now_action = QAction("立即备份", self)
+        backup_now_action.triggered.connect(lambda: self.start_backup(manual=True))
+        backup_menu.addAction(backup_now_action)
+        self.restore_backup_action = QAction("从备份恢复...", self)
+        self.restore_backup_action.triggered.connect(self.restore_backup)
+        backup_menu.addAction(self.restore_backup_action)
+        backup_menu.addSeparator()
+        self.sync_folder_action = QAction("与文件夹同步...", self)
+        self.sync_folder_action.triggered.connect(self.sync_with_folder)
+        backup_menu.addAction(self.sync_folder_action)
+        
+        # 归档菜单
+        archive_menu = menu_bar.addMenu("归档")
+        view_archive_action = QAction("查看归档", self)
+        view_archive_action.triggered.connect(self.open_archive)
+        archive_menu.addAction(view_archive_action)
+        self.archive_old_action = QAction("归档长期未修改的条目...", self)
+        self.archive_old_action.triggered.connect(self.archive_old_entries)
+        archive_menu.addAction(self.archive_old_action)
+        
         # 帮助菜单
         help_menu = menu_bar.addMenu("帮助")
         # 添加操作说明动作
@@ -401,7 +530,7 @@ class MainWindow(QMainWindow):
     def show_main_window(self):
         """显示主窗口"""
         # 强制显示主窗口，不检查锁定状态
-        if not self.master_password:
+        if self.session is None:
             # 已锁定，显示登录对话框
             if self.login_dialog_visible:
                 return
@@ -416,7 +545,7 @@ class MainWindow(QMainWindow):
             layout = QVBoxLayout(login_dialog)
             
             form_layout = QFormLayout()
-            password_label = QLabel("主密码：")
+            password_label = QLabel(self.login_prompt_text())
             password_edit = QLineEdit()
             password_edit.setEchoMode(QLineEdit.EchoMode.Password)
             form_layout.addRow(password_label, password_edit)
@@ -446,6 +575,7 @@ class MainWindow(QMainWindow):
             # 回车键登录
             password_edit.returnPressed.connect(lambda: self.login(password_edit.text(), login_dialog))
             
+            self.start_prefetch()
             try:
                 result = login_dialog.exec()
                 if result != QDialog.DialogCode.Accepted:
@@ -472,7 +602,7 @@ class MainWindow(QMainWindow):
         layout = QVBoxLayout(login_dialog)
         
         form_layout = QFormLayout()
-        password_label = QLabel("主密码：")
+        password_label = QLabel(self.login_prompt_text())
         password_edit = QLineEdit()
         password_edit.setEchoMode(QLineEdit.EchoMode.Password)
         form_layout.addRow(password_label, password_edit)
@@ -502,6 +632,7 @@ class MainWindow(QMainWindow):
         # 回车键登录
         password_edit.returnPressed.connect(lambda: self.login(password_edit.text(), login_dialog))
         
+        self.start_prefetch()
         if login_dialog.exec() == QDialog.DialogCode.Rejected:
             # 登录对话框被拒绝时，直接退出应用
             self.close_app()
@@ -579,6 +710,7 @@ class MainWindow(QMainWindow):
         
         # 保存主密码（仅用于本次会话，不存储到磁盘）
         self.master_password = password
+        self.set_session(self.create_vault_session(password))
         
         # 创建初始数据库
         self.entries = {}
@@ -597,10 +729,36 @@ class MainWindow(QMainWindow):
         self.setFocus()
     
     def login(self, password, dialog):
-        """登录验证"""
-        if self.crypto_manager.verify_master_password(self.db_file, password):
-            self.master_password = password
-            self.load_entries()
+        """登录验证（自动锁定后可以先用 PIN 快速解锁）"""
+        session = None
+        error = "主密码不正确"
+        # 只有看起来像 PIN 的输入才按 PIN 验证，输错的主密码不消耗 PIN 的尝试次数
+        quick = self.quick_unlock.available and is_pin(password)
+        if quick:
+            try:
+                data, entries_order, session = self.quick_unlock.unlock(password)
+            except Exception as e:
+                error = str(e)
+        if session is None:
+            try:
+                # 一次派生同时完成验证和加载，不再先验证再重新加载；
+                # 登录框显示期间已预读的文件内容仍然有效时不再读取文件
+                prefetched = self.take_prefetch()
+                fresh = self.crypto_manager.prefetch_is_fresh(self.db_file, prefetched)
+                start = time.perf_counter()
+                with self.vault_lock.reading():
+                    data, entries_order, session = self.crypto_manager.unlock_db(self.db_file, password, prefetched)
+                self.record_unlock_metrics(prefetched, fresh, (time.perf_counter() - start) * 1000)
+                self.prefetch_future = None
+                quick = False
+                # 用主密码登录后，锁定期间保存的快速解锁状态作废
+                self.quick_unlock.clear()
+            except Exception:
+                session = None
+        
+        if session is not None:
+            # PIN 解锁时不知道主密码，不做需要主密码的重新包裹
+            self.apply_unlocked_vault(None if quick else password, data, entries_order, session)
             # 窗口显示后再启动定时器
             self.start_lock_timer()
             dialog.accept()
@@ -611,16 +769,223 @@ class MainWindow(QMainWindow):
             # 确保窗口状态正确
             self.setWindowState(Qt.WindowState.WindowActive)
             self.setFocus()
+            if not quick and self.settings.get("quick_unlock", False):
+                self.setup_quick_unlock_pin()
         else:
             msg_box = QMessageBox(dialog)
             msg_box.setWindowTitle("警告")
-            msg_box.setText("主密码不正确")
+            msg_box.setText(error)
             msg_box.setIcon(QMessageBox.Icon.Warning)
             msg_box.addButton("确定", QMessageBox.ButtonRole.AcceptRole)
             msg_box.exec()
     
+    def start_prefetch(self):
+        """登录对话框显示时在后台预读数据库（读取文件、解析文件头），提交主密码后只需派生密钥和解密"""
+        if self.prefetch_future is None and os.path.exists(self.db_file):
+            self.prefetch_future = self.prefetch_executor.submit(self.read_locked, self.crypto_manager.prefetch, self.db_file)
+    
+    def read_locked(self, read, *args):
+        """在数据区间的共享锁内读取数据库（只读模式下不会读到其他进程写了一半的日志）"""
+        with self.vault_lock.reading():
+            return read(*args)
+    
+    def take_prefetch(self):
+        """取得预读结果（还在读取时等待读完）；预读失败时返回 None，解锁时直接读取文件"""
+        if self.prefetch_future is None:
+            return None
+        try:
+            return self.prefetch_future.result()
+        except Exception as e:
+            self.prefetch_error = f"预读数据库失败：{e}"
+            self.prefetch_future = None
+            return None
+    
+    def record_unlock_metrics(self, prefetched, fresh, unlock_ms):
+        """记录解锁耗时，以及预读为提交主密码后的解锁节省的时间（预读后文件被修改时不计）"""
+        prefetch_ms = prefetched["elapsed_ms"] if prefetched else 0.0
+        saved_ms = prefetch_ms if fresh else 0.0
+        self.startup_metrics = {"unlock_ms": round(unlock_ms, 1), "prefetch_ms": round(prefetch_ms, 1),
+                                "saved_ms": round(saved_ms, 1)}
+        if self.prefetch_error:
+            self.startup_metrics["prefetch_error"] = self.prefetch_error
+            self.prefetch_error = None
+    
+    def login_prompt_text(self):
+        """登录框的提示文字"""
+        return "主密码或 PIN：" if self.quick_unlock.available else "主密码："
+    
+    def open_vault_lock(self):
+        """取得数据库的写入者锁；已被其他进程以可写模式打开时询问是否以只读模式打开，避免互相覆盖保存"""
+        self.vault_lock = VaultLock(self.db_file)
+        self.vault_lock.stamp = self.current_vault_stamp
+        self.vault_writer.vault_lock = self.vault_lock
+        if self.read_only and os.path.exists(self.db_file):
+            self.set_read_only(True)
+            return
+        if self.vault_lock.acquire_owner():
+            self.set_read_only(False)
+            return
+        
+        msg_box = QMessageBox(self)
+        msg_box.setWindowTitle("数据库已被打开")
+        msg_box.setIcon(QMessageBox.Icon.Warning)
+        if not os.path.exists(self.db_file):
+            msg_box.setText(f"数据库正在由{self.vault_lock.describe_owner()}创建，请稍后再打开")
+            msg_box.addButton("退出", QMessageBox.ButtonRole.RejectRole)
+            msg_box.exec()
+            sys.exit(0)
+        msg_box.setText(f"数据库已被{self.vault_lock.describe_owner()}以可写模式打开。\n\n"
+                        "以只读模式打开可以查看和复制密码，但不能修改；需要修改时请先关闭另一个窗口。")
+        read_only_button = msg_box.addButton("以只读模式打开", QMessageBox.ButtonRole.AcceptRole)
+        msg_box.addButton("退出", QMessageBox.ButtonRole.RejectRole)
+        msg_box.exec()
+        if msg_box.clickedButton() != read_only_button:
+            sys.exit(0)
+        self.set_read_only(True)
+    
+    def set_read_only(self, read_only):
+        """切换只读模式：禁用所有修改数据库的操作"""
+        self.read_only = read_only
+        for widget in (self.add_btn, self.edit_btn, self.delete_btn, self.archive_btn, self.batch_add_btn,
+                       self.import_btn, self.archive_old_action, self.restore_backup_action,
+                       self.sync_folder_action):
+            widget.setEnabled(not read_only)
+        self.setWindowTitle("密码管理器（只读）" if read_only else "密码管理器")
+        if read_only:
+            self.status_bar.showMessage("数据库已被其他进程以可写模式打开，当前为只读模式")
+    
+    def ensure_writable(self):
+        """只读模式下提示不能修改，返回是否可以修改数据库"""
+        if not self.read_only:
+            return True
+        QMessageBox.warning(self, "警告", "数据库以只读模式打开，不能修改")
+        return False
+    
+    def current_vault_stamp(self):
+        """数据库当前的文件标记"""
+        return self.crypto_manager.vault_stamp(self.db_file)
+    
+    def remember_vault_stamp(self):
+        """内存中的条目与磁盘上的数据库一致（刚解锁或刚重新读取）时记录文件标记"""
+        self.known_vault_stamp = self.current_vault_stamp()
+        self.vault_lock.take_own_writes()
+    
+    def watch_vault(self):
+        """监视数据库的数据文件和所在目录
+        
+        数据库被原子替换后原来的文件会从监视列表中消失，目录的变化用于发现替换并重新加入监视。
+        """
+        watched = self.vault_watcher.files() + self.vault_watcher.directories()
+        if watched:
+            self.vault_watcher.removePaths(watched)
+        paths = [os.path.dirname(os.path.abspath(self.db_file))]
+        paths += [path for path in self.crypto_manager.vault_files(self.db_file) if os.path.exists(path)]
+        self.vault_watcher.addPaths(paths)
+    
+    def on_vault_file_changed(self, path):
+        """数据库文件或所在目录变化：稍等片刻再检查，合并同一次写入触发的多个通知"""
+        if self.session is not None:
+            self.reload_timer.start()
+    
+    def check_vault_changed(self):
+        """检查数据库是否被外部修改，是则在后台用会话密钥重新读取"""
+        if self.session is None or self.known_vault_stamp is None:
+            return
+        self.watch_vault()
+        # 本进程的写入按写入前后的标记依次接上，不需要重新读取；接不上说明中间有外部修改
+        for before, after in self.vault_lock.take_own_writes():
+            if before == self.known_vault_stamp:
+                self.known_vault_stamp = after
+        stamp = self.current_vault_stamp()
+        if stamp == self.known_vault_stamp:
+            return
+        if self.reload_future is not None or self.dirty_ids or not self.vault_writer.idle:
+            # 正在重新读取，或本进程还有未写完的保存，稍后再检查
+            self.reload_timer.start()
+            return
+        # 先取标记再读取：读取期间文件再次变化时，下一次检查会再读取一次
+        context = {"stamp": stamp, "session": self.session, "version": self.vault.version}
+        self.reload_future = self.prefetch_executor.submit(
+            self.read_locked, self.crypto_manager.load_encrypted_db_with_session, self.db_file, self.session)
+        self.reload_future.add_done_callback(lambda future: self.vault_reloaded.emit((future, context)))
+    
+    def apply_reloaded_vault(self, result):
+        """把重新读取的数据库与内存中的条目按 id 比较，只应用变化的条目"""
+        future, context = result
+        self.reload_future = None
+        if context["session"] is not self.session:
+            # 读取期间已锁定或切换了会话
+            return
+        try:
+            data, entries_order = future.result()
+        except Exception as e:
+            if self.crypto_manager.vault_stamp(self.db_file) != context["stamp"]:
+                # 读取时文件正在被替换，稍后重新读取
+                self.reload_timer.start()
+                return
+            if "已被替换" in str(e):
+                # 数据库换成了由其他数据密钥加密的文件（例如在另一个窗口更改了主密码），当前会话无法再写入
+                self.quick_unlock.clear()
+                self.lock_app()
+                self.status_bar.showMessage("数据库已被外部替换，请重新登录")
+                return
+            self.status_bar.showMessage(f"重新读取数据库失败：{e}")
+            return
+        if self.vault.version != context["version"] or self.dirty_ids or not self.vault_writer.idle:
+            # 读取期间本地又有修改，稍后重新比较
+            self.reload_timer.start()
+            return
+        
+        snapshot = self.vault.snapshot()
+        diff = diff_entries(snapshot.entries, snapshot.order, data, entries_order)
+        self.known_vault_stamp = context["stamp"]
+        updated = diff["added"] + diff["changed"]
+        if not updated and not diff["removed"] and not diff["reordered"]:
+            return
+        
+        self.entries.update({entry_id: data[entry_id] for entry_id in updated})
+        self.entries.remove_many(diff["removed"])
+        structural = bool(diff["added"] or diff["removed"] or diff["reordered"])
+        if structural:
+            self.entries_order = entries_order
+        for entry_id in diff["changed"] + diff["removed"]:
+            self.entry_digests.pop(entry_id, None)
+        self.remember_saved_snapshot()
+        # 外部修改也可能移动了归档中的条目，下次需要时重新解密
+        self.archive_entries = None
+        self.archive_order = []
+        
+        self.update_table_rows(diff, structural)
+        if hasattr(self, 'floating_window'):
+            snapshot = self.vault.snapshot()
+            self.floating_window.apply_changes(snapshot.entries, snapshot.order, set(diff["changed"]), structural)
+        self.status_bar.showMessage(f"数据库已被外部修改：新增 {len(diff['added'])} 个、修改 {len(diff['changed'])} 个、"
+                                    f"删除 {len(diff['removed'])} 个条目")
+    
+    def update_table_rows(self, diff, structural):
+        """只重新填充变化的行；只在末尾新增时追加行，其余的增删和重新排序时整体刷新"""
+        text = self.search_edit.text()
+        if text:
+            self.filter_entries(text)
+            return
+        added = diff["added"]
+        appended_only = (not diff["removed"] and not diff["reordered"]
+                         and list(self.entries_order[len(self.entries_order) - len(added):]) == added)
+        if structural and not appended_only:
+            self.refresh_table()
+            return
+        if diff["changed"]:
+            changed = set(diff["changed"])
+            for row, entry_id in enumerate(self.entries_order):
+                if entry_id in changed and row < self.table_widget.rowCount():
+                    self.fill_table_row(row, self.entries[entry_id])
+        for entry_id in added:
+            self.add_entry_to_table(self.entries[entry_id])
+    
     def change_master_password(self):
         """更改主密码"""
+        if not self.ensure_writable():
+            return
         # 加载设置
         settings = SettingsDialog(self)
         
@@ -717,8 +1082,8 @@ class MainWindow(QMainWindow):
         else:
             return
         
-        # 验证旧密码是否正确
-        if not self.crypto_manager.verify_master_password(self.db_file, old_password):
+        # 验证旧密码是否正确（与会话密钥比较，不读取数据库）
+        if not self.verify_master_password(old_password):
             msg_box = QMessageBox(self)
             msg_box.setWindowTitle("警告")
             msg_box.setText("当前主密码不正确")
@@ -737,27 +1102,24 @@ class MainWindow(QMainWindow):
             return
         
         try:
-            # 更改主密码（重新加密数据库）
-            if self.crypto_manager.change_master_password(self.db_file, old_password, new_password):
-                # 更新当前会话的主密码
-                self.master_password = new_password
-                
-                # 向绑定的邮箱发送新主密码
-                self.send_new_password_email(new_password, settings.settings["email"], settings.settings["email_password"])
-                
-                msg_box = QMessageBox(self)
-                msg_box.setWindowTitle("成功")
-                msg_box.setText("主密码已更改，新密码已发送到您的绑定邮箱")
-                msg_box.setIcon(QMessageBox.Icon.Information)
-                msg_box.addButton("确定", QMessageBox.ButtonRole.AcceptRole)
-                msg_box.exec()
-            else:
-                msg_box = QMessageBox(self)
-                msg_box.setWindowTitle("警告")
-                msg_box.setText("更改主密码失败")
-                msg_box.setIcon(QMessageBox.Icon.Warning)
-                msg_box.addButton("确定", QMessageBox.ButtonRole.AcceptRole)
-                msg_box.exec()
+            # 更改主密码（只重新包裹数据密钥并重写文件头，不重新加密条目）
+            self.vault_writer.flush()
+            with self.vault_lock.writing():
+                new_session = self.crypto_manager.change_session_password(self.db_file, self.session, new_password)
+            
+            # 更新当前会话的主密码和会话密钥
+            self.master_password = new_password
+            self.set_session(new_session)
+            
+            # 向绑定的邮箱发送新主密码
+            self.send_new_password_email(new_password, settings.settings["email"], settings.settings["email_password"])
+            
+            msg_box = QMessageBox(self)
+            msg_box.setWindowTitle("成功")
+            msg_box.setText("主密码已更改，新密码已发送到您的绑定邮箱")
+            msg_box.setIcon(QMessageBox.Icon.Information)
+            msg_box.addButton("确定", QMessageBox.ButtonRole.AcceptRole)
+            msg_box.exec()
         except Exception as e:
             msg_box = QMessageBox(self)
             msg_box.setWindowTitle("错误")
@@ -808,6 +1170,10 @@ class MainWindow(QMainWindow):
             
             # 添加加密文件作为附件
             if hasattr(self, 'db_file') and os.path.exists(self.db_file):
+                self.vault_writer.flush()
+                if self.session is not None and not self.read_only:
+                    with self.vault_lock.writing():
+                        self.crypto_manager.compact_journal(self.db_file, self.session)
                 attachment = MIMEBase('application', 'octet-stream')
                 with open(self.db_file, 'rb') as f:
                     attachment.set_payload(f.read())
@@ -1004,9 +1370,6 @@ class MainWindow(QMainWindow):
                 # 尝试读取原有数据库（不验证密码，因为我们通过邮箱验证了身份）
                 # 直接读取文件内容，然后用新密码重新加密
                 if os.path.exists(self.db_file):
-                    with open(self.db_file, 'r', encoding='utf-8') as f:
-                        db_content = json.load(f)
-                    
                     # 提取原有数据（如果存在）
                     # 注意：这里不能直接解密，因为我们不知道旧密码
                     # 所以我们需要创建一个新的数据库，保留原有结构
@@ -1014,6 +1377,7 @@ class MainWindow(QMainWindow):
                     
                     # 创建新的空数据库，但使用新密码
                     self.master_password = new_password
+                    self.set_session(self.create_vault_session(new_password))
                     self.entries = {}
                     self.entries_order = []
                     self.save_db()
@@ -1027,6 +1391,7 @@ class MainWindow(QMainWindow):
                 else:
                     # 数据库文件不存在，创建新的
                     self.master_password = new_password
+                    self.set_session(self.create_vault_session(new_password))
                     self.entries = {}
                     self.entries_order = []
                     self.save_db()
@@ -1041,6 +1406,7 @@ class MainWindow(QMainWindow):
             except Exception as e:
                 # 重置失败，创建新数据库
                 self.master_password = new_password
+                self.set_session(self.create_vault_session(new_password))
                 self.entries = {}
                 self.entries_order = []
                 self.save_db()
@@ -1065,8 +1431,13 @@ class MainWindow(QMainWindow):
     def load_entries(self):
         """加载密码条目"""
         try:
-            data, self.entries_order = self.crypto_manager.load_encrypted_db(self.db_file, self.master_password)
+            self.vault_writer.flush()
+            data, self.entries_order = self.read_locked(self.crypto_manager.load_encrypted_db_with_session,
+                                                        self.db_file, self.session)
             self.entries = data
+            self.reset_dirty_tracking()
+            self.remember_vault_stamp()
+            self.watch_vault()
             self.refresh_table()
         except Exception as e:
             msg_box = QMessageBox(self)
@@ -1076,28 +1447,204 @@ class MainWindow(QMainWindow):
             msg_box.addButton("确定", QMessageBox.ButtonRole.AcceptRole)
             msg_box.exec()
     
-    def save_db(self):
-        """保存数据库"""
+    def apply_unlocked_vault(self, password, data, entries_order, session):
+        """使用解锁得到的数据和会话密钥（password 为 None 表示用 PIN 快速解锁）"""
+        self.master_password = password or ""
+        self.set_session(session)
+        if not self.read_only:
+            # 上次更改主密码时原地覆盖文件头中途中断：在写入锁内写回备份的旧文件头
+            # （只读模式不写入，读取时在内存中使用备份的文件头）
+            try:
+                with self.vault_lock.writing():
+                    self.crypto_manager.restore_headers(self.db_file)
+            except Exception as e:
+                self.status_bar.showMessage(f"恢复数据库文件头失败：{e}")
+        self.entries = data
+        self.entries_order = entries_order
+        self.archive_entries = None
+        self.archive_order = []
+        self.reset_dirty_tracking()
+        if password is None and self.known_vault_stamp is not None:
+            # PIN 解锁恢复的是锁定时的条目，锁定期间数据库可能被外部修改，稍后检查
+            self.reload_timer.start()
+        else:
+            self.remember_vault_stamp()
+        self.watch_vault()
+        if self.settings.get("backup_enabled", True):
+            # 解锁时先备份一次（内容没有变化时不创建新备份），之后按设置的间隔备份
+            self.start_backup()
+        if session.legacy or any("password" in entry for entry in data.values()):
+            # 旧格式数据库，或条目中仍有明文密码，立即迁移（密码和长备注移入条目的密文层）
+            self.save_db()
+        rehash_error = None
+        if password and not self.read_only and self.crypto_manager.needs_rehash(self.session):
+            # 密钥派生参数已调整，用新参数重新包裹数据密钥（只重写文件头）；失败时下次登录再试
+            try:
+                self.vault_writer.flush()
+                with self.vault_lock.writing():
+                    self.set_session(self.crypto_manager.change_session_password(self.db_file, self.session, password))
+            except Exception as e:
+                rehash_error = f"更新密钥派生参数失败：{e}"
+        self.refresh_table()
+        if rehash_error:
+            self.status_bar.showMessage(rehash_error)
+    
+    def set_session(self, session):
+        """切换会话密钥，旧的会话密钥会被清除（先等待用旧会话提交的保存写完）"""
+        if self.session is not None and self.session is not session:
+            self.vault_writer.flush()
+            self.session.wipe()
+        self.session = session
+    
+    def save_db(self, changed=None, deleted=None):
+        """保存数据库（提交给后台写入线程，界面不等待磁盘；复用会话密钥，不再重新运行 Argon2）
+        
+        Args:
+            changed: 新增或修改的条目 id 列表，只把这些条目追加到变更日志
+            deleted: 删除的条目 id 列表
+            两者都不传时写入完整快照
+        
+        Returns:
+            bool: 是否提交了写入（内容没有变化或只读模式时直接返回 False，不触碰磁盘）
+        """
+        if self.read_only:
+            return False
         try:
-            self.crypto_manager.save_encrypted_db(self.db_file, self.master_password, self.entries, self.entries_order)
+            if self.session is None:
+                raise Exception("应用已锁定，无法保存")
+            if (changed is None and deleted is None) or self.snapshot_unsaved:
+                # 完整保存时 mark_dirty 会把所有条目记入待保存集合，变更按快照比较，只计入之前保存失败的条目（不写入时恢复原来的集合）
+                pending = set(self.dirty_ids)
+                self.mark_dirty(self.entries_order)
+                snapshot = self.vault.snapshot()
+                changes = self.changes_since_saved(snapshot, pending)
+                if changes == 0 and not self.snapshot_unsaved and not self.session.legacy:
+                    self.dirty_ids.intersection_update(pending)
+                    return False
+                self.dirty_ids.clear()
+                self.snapshot_unsaved = False
+                self.saved_state = (self.session, self.db_file, snapshot)
+                self.vault_writer.request_save(self.db_file, self.session, snapshot.entries, snapshot.order,
+                                               changes=changes)
+                return True
+            self.mark_dirty(changed or [])
+            for entry_id in deleted or []:
+                self.entry_digests.pop(entry_id, None)
+                self.dirty_ids.add(entry_id)
+            if not self.dirty_ids:
+                return False
+            records = [{"op": "delete", "id": entry_id} for entry_id in self.dirty_ids if entry_id not in self.entries]
+            # 条目是不可变的值（修改时整体替换），直接放入记录，不再拷贝
+            records += [{"op": "put", "id": entry_id, "entry": self.entries[entry_id]}
+                        for entry_id in self.entries_order if entry_id in self.dirty_ids]
+            self.dirty_ids.clear()
+            self.vault_writer.request_records(self.db_file, self.session, records)
+            self.remember_saved_snapshot()
+            return True
         except Exception as e:
-            msg_box = QMessageBox(self)
-            msg_box.setWindowTitle("错误")
-            msg_box.setText(f"保存数据失败：{e}")
-            msg_box.setIcon(QMessageBox.Icon.Critical)
-            msg_box.addButton("确定", QMessageBox.ButtonRole.AcceptRole)
-            msg_box.exec()
+            self.on_save_failed(str(e))
+            return False
+    
+    def remember_saved_snapshot(self):
+        """内存中的条目已提交保存或与磁盘一致时，记录当前快照作为下一次完整保存的比较基准"""
+        self.saved_state = (self.session, self.db_file, self.vault.snapshot()) if self.session is not None else None
+    
+    def changes_since_saved(self, snapshot, pending):
+        """与上次提交保存（或加载）的快照相比变更的条目数（只调整顺序时计为 1）
+        
+        pending 为之前保存失败、尚未写入的条目 id。
+        没有可比较的快照（新的会话或数据库路径）时返回 None，按全部条目计。
+        条目是不可变的值，内容未变的条目保留原来的对象，按对象比较即可。
+        """
+        if self.saved_state is None:
+            return None
+        session, db_file, saved = self.saved_state
+        if session is not self.session or db_file != self.db_file:
+            return None
+        changed = set(pending)
+        changed.update(entry_id for entry_id, entry in snapshot.entries.items() if saved.entries.get(entry_id) is not entry)
+        changed.update(entry_id for entry_id in saved.entries if entry_id not in snapshot.entries)
+        if not changed and list(snapshot.order) != list(saved.order):
+            return 1
+        return len(changed)
+    
+    def content_digest(self, entry):
+        """条目明文内容的摘要（带密钥的 BLAKE2b）"""
+        content = json.dumps(entry, ensure_ascii=False, sort_keys=True).encode('utf-8')
+        return hashlib.blake2b(content, key=self.digest_key, digest_size=16).digest()
+    
+    def remember_digest(self, entry):
+        """记录已保存条目的明文摘要和当前的密文（编辑前解密条目时调用，未修改的编辑不会触发保存）"""
+        self.entry_digests.setdefault(entry['id'], (self.content_digest(entry), self.entries.get(entry['id'])))
+    
+    def mark_dirty(self, entry_ids):
+        """把新增或修改的条目拆为索引层和密文层（条目字典中不保留明文密码），内容确实变化的条目记入待保存集合"""
+        sealed = {}
+        for entry_id in entry_ids:
+            entry = self.entries.get(entry_id)
+            if entry is None:
+                continue
+            if "password" in entry:
+                digest = self.content_digest(entry)
+                known = self.entry_digests.get(entry_id)
+                if known is not None and known[0] == digest:
+                    # 内容没有变化：放回原来的密文，不用新的 nonce 重新加密（否则重新读取和同步时会误判为修改）
+                    sealed[entry_id] = known[1]
+                    continue
+                sealed[entry_id] = self.crypto_manager.seal_entry(self.session, entry)
+                self.entry_digests[entry_id] = (digest, sealed[entry_id])
+            self.dirty_ids.add(entry_id)
+        # 一次替换所有拆分后的条目，只生成一个新版本
+        self.entries.update(sealed)
+    
+    def reset_dirty_tracking(self):
+        """切换到新加载的数据时清空修改跟踪"""
+        self.dirty_ids.clear()
+        self.entry_digests.clear()
+        self.snapshot_unsaved = False
+        self.remember_saved_snapshot()
+    
+    def save_pending_changes(self):
+        """重新提交保存失败后保留的修改"""
+        if self.session is None:
+            return
+        if self.snapshot_unsaved:
+            self.save_db()
+        elif self.dirty_ids:
+            self.save_db(changed=[])
+    
+    def on_save_finished(self, changes):
+        """后台写入完成后在状态栏右侧显示本次写入的变更条目数和本次运行累计写入的变更条目数"""
+        self.save_status_label.setText(f"上次保存 {changes} 个条目的修改（累计 {self.vault_writer.entries_changed} 个）")
+    
+    def on_save_failed(self, error, unsaved=None):
+        """后台保存失败时提示用户，没有写入的修改留到下一次保存时重新提交
+        
+        Args:
+            unsaved: 没有写入的条目 id；为 None 时（完整快照没有写入）下一次保存写入完整快照
+        """
+        # 磁盘上的内容与记录的摘要不再一致，之后的保存不再跳过
+        self.entry_digests.clear()
+        if unsaved is None:
+            self.snapshot_unsaved = True
+        else:
+            self.dirty_ids.update(unsaved)
+        msg_box = QMessageBox(self)
+        msg_box.setWindowTitle("错误")
+        msg_box.setText(f"保存数据失败：{error}\n\n未保存的修改已保留，将在下次保存、锁定或退出时重试")
+        msg_box.setIcon(QMessageBox.Icon.Critical)
+        msg_box.addButton("确定", QMessageBox.ButtonRole.AcceptRole)
+        msg_box.exec()
     
     def refresh_table(self):
         """刷新表格"""
         self.table_widget.setRowCount(0)
         self.last_selected_row = -1  # 重置Shift多选状态
         
-        for entry_id in self.entries_order:
-            if entry_id in self.entries:
-                self.add_entry_to_table(self.entries[entry_id])
+        for entry in self.vault.snapshot().ordered_entries():
+            self.add_entry_to_table(entry)
         
-        self.status_bar.showMessage(f"已加载 {len(self.entries)} 个密码条目")
+        self.status_bar.showMessage(f"已加载 {len(self.entries)} 个密码条目" + ("（只读模式）" if self.read_only else ""))
     
     def add_entry_to_table(self, entry):
         """添加条目到表格"""
@@ -1107,6 +1654,7 @@ class MainWindow(QMainWindow):
         # 序号
         seq_item = QTableWidgetItem(str(row + 1))
         seq_item.setFlags(Qt.ItemFlag.ItemIsEnabled)  # 禁用编辑和选择，提升性能
+        seq_item.setData(Qt.ItemDataRole.UserRole, entry['id'])  # 搜索时行号与条目顺序不一致，按行记录条目 id
         self.table_widget.setItem(row, 0, seq_item)
         
         # 选择框
@@ -1118,6 +1666,10 @@ class MainWindow(QMainWindow):
         checkbox.setProperty("row", row)  # 存储行号
         self.table_widget.setCellWidget(row, 1, checkbox)
         
+        self.fill_table_row(row, entry)
+    
+    def fill_table_row(self, row, entry):
+        """填充表格一行的条目内容和操作按钮（外部修改条目时只重新填充这一行）"""
         # 网站名（截断长文本）
         website_name = entry['website_name']
         website_item = QTableWidgetItem(self.truncate_text(website_name, 20))
@@ -1155,7 +1707,7 @@ class MainWindow(QMainWindow):
         
         copy_pass_btn = QPushButton("复制密码")
         copy_pass_btn.setFixedWidth(75)
-        copy_pass_btn.clicked.connect(lambda _, e=entry: self.copy_to_clipboard(e['password']))
+        copy_pass_btn.clicked.connect(lambda _, e=entry: self.copy_password(e['id']))
         
         action_layout.addWidget(copy_user_btn)
         action_layout.addWidget(copy_pass_btn)
@@ -1181,6 +1733,21 @@ class MainWindow(QMainWindow):
         # 显示提示
         self.status_bar.showMessage(f"已复制到剪贴板，15秒后自动清空")
     
+    def reveal_entry(self, entry):
+        """解密条目的密码和完整备注（只返回副本，明文不放回条目字典）"""
+        if self.session is None:
+            raise Exception("应用已锁定，请重新登录")
+        return self.crypto_manager.reveal_entry(self.session, entry)
+    
+    def copy_password(self, entry_id):
+        """解密并复制条目的密码"""
+        try:
+            password = self.reveal_entry(self.entries[entry_id])['password']
+        except Exception as e:
+            QMessageBox.warning(self, "警告", f"读取密码失败：{str(e)}")
+            return
+        self.copy_to_clipboard(password)
+    
     def clear_clipboard(self):
         """清空剪贴板"""
         from PyQt6.QtWidgets import QApplication
@@ -1190,21 +1757,24 @@ class MainWindow(QMainWindow):
     
     def add_entry(self):
         """添加密码条目"""
+        if not self.ensure_writable():
+            return
         dialog = PasswordEntryDialog(self)
         if dialog.exec() == QDialog.DialogCode.Accepted:
             entry = dialog.get_entry()
             self.entries[entry['id']] = entry
             self.entries_order.append(entry['id'])
-            self.save_db()
+            self.save_db(changed=[entry['id']])
             self.refresh_table()
     
     def edit_entry(self):
         """编辑密码条目"""
-        # 获取选中的条目
-        selected_rows = [i for i in range(self.table_widget.rowCount()) 
-                       if self.table_widget.cellWidget(i, 1).checkState() == Qt.CheckState.Checked]
+        if not self.ensure_writable():
+            return
+        # 获取选中的条目（搜索时行号与条目顺序不一致，按行记录的条目 id 取条目）
+        selected_ids = self.table_entry_ids()
         
-        if len(selected_rows) != 1:
+        if len(selected_ids) != 1:
             msg_box = QMessageBox(self)
             msg_box.setWindowTitle("警告")
             msg_box.setText("请选择一个条目进行编辑")
@@ -1213,24 +1783,26 @@ class MainWindow(QMainWindow):
             msg_box.exec()
             return
         
-        row = selected_rows[0]
-        entry_id = self.entries_order[row]
-        entry = self.entries[entry_id]
+        entry_id = selected_ids[0]
+        entry = self.reveal_entry(self.entries[entry_id])
+        self.remember_digest(entry)
         
         dialog = PasswordEntryDialog(self, entry)
         if dialog.exec() == QDialog.DialogCode.Accepted:
             updated_entry = dialog.get_entry()
             self.entries[updated_entry['id']] = updated_entry
-            self.save_db()
-            self.refresh_table()
+            # 保存失败由 on_save_failed 单独提示；修改仍保留在内存中等待重试，表格同样显示修改后的内容
+            self.save_db(changed=[updated_entry['id']])
+            self.filter_entries(self.search_edit.text())
     
     def delete_entries(self):
         """删除选中的密码条目"""
+        if not self.ensure_writable():
+            return
         # 获取选中的条目
-        selected_rows = [i for i in range(self.table_widget.rowCount()) 
-                       if self.table_widget.cellWidget(i, 1).checkState() == Qt.CheckState.Checked]
+        selected_ids = self.table_entry_ids()
         
-        if not selected_rows:
+        if not selected_ids:
             msg_box = QMessageBox(self)
             msg_box.setWindowTitle("警告")
             msg_box.setText("请选择要删除的条目")
@@ -1241,7 +1813,7 @@ class MainWindow(QMainWindow):
         
         msg_box = QMessageBox(self)
         msg_box.setWindowTitle("确认删除")
-        msg_box.setText(f"确定要删除选中的 {len(selected_rows)} 个条目吗？")
+        msg_box.setText(f"确定要删除选中的 {len(selected_ids)} 个条目吗？")
         msg_box.setIcon(QMessageBox.Icon.Question)
         
         # 添加自定义按钮
@@ -1252,17 +1824,166 @@ class MainWindow(QMainWindow):
         msg_box.exec()
         
         if msg_box.clickedButton() == ok_button:
-            # 按行号从大到小删除，避免索引错误
-            for row in sorted(selected_rows, reverse=True):
-                entry_id = self.entries_order[row]
-                del self.entries[entry_id]
-                del self.entries_order[row]
+            # 按条目 id 删除（一次生成一个新版本）
+            self.entries.remove_many(selected_ids)
+            self.entries_order.remove_items(set(selected_ids))
             
-            self.save_db()
-            self.refresh_table()
+            self.save_db(deleted=selected_ids)
+            self.filter_entries(self.search_edit.text())
+    
+    def load_archive(self):
+        """解密归档段（只在第一次需要时解密，锁定时清除）；与密码库重复的条目以密码库为准
+        
+        Returns:
+            tuple: (归档的条目, 归档的条目顺序)
+        """
+        if self.archive_entries is None:
+            if self.session is None:
+                raise Exception("应用已锁定，请重新登录")
+            data, order = self.read_locked(self.crypto_manager.load_archive, self.db_file, self.session)
+            self.archive_order = [entry_id for entry_id in order if entry_id not in self.entries]
+            self.archive_entries = {entry_id: data[entry_id] for entry_id in self.archive_order}
+        return self.archive_entries, self.archive_order
+    
+    def move_to_archive(self, entry_ids):
+        """把条目批量移到归档段：先重写归档，再向密码库追加删除记录（不重写密码库）
+        
+        Returns:
+            bool: 是否移动成功
+        """
+        try:
+            archive, archive_order = self.load_archive()
+            archived_at = datetime.now().isoformat()
+            new_archive = dict(archive)
+            for entry_id in entry_ids:
+                entry = self.entries[entry_id]
+                if "password" in entry:
+                    entry = self.crypto_manager.seal_entry(self.session, entry)
+                new_archive[entry_id] = {**entry, 'archived_at': archived_at}
+            new_order = archive_order + [entry_id for entry_id in entry_ids if entry_id not in archive]
+            # 先等待后台保存写完，归档写入成功后才从密码库中删除，中途失败不会丢失条目
+            self.vault_writer.flush()
+            with self.vault_lock.writing():
+                self.crypto_manager.save_archive(self.db_file, self.session, new_archive, new_order)
+                self.crypto_manager.append_journal(self.db_file, self.session,
+                                                   [{"op": "delete", "id": entry_id} for entry_id in entry_ids])
+                # 与写入线程相同：日志过大时合并为新的快照（此时密码库已经变小）
+                if self.crypto_manager.journal_needs_compaction(self.db_file):
+                    self.crypto_manager.compact_journal(self.db_file, self.session)
+        except Exception as e:
+            QMessageBox.warning(self, "警告", f"归档失败：{str(e)}")
+            return False
+        self.archive_entries, self.archive_order = new_archive, new_order
+        moved = set(entry_ids)
+        for entry_id in entry_ids:
+            del self.entries[entry_id]
+            self.entry_digests.pop(entry_id, None)
+        self.entries_order.remove_items(moved)
+        # 保持当前的搜索结果（没有搜索时刷新整个表格）
+        self.filter_entries(self.search_edit.text())
+        return True
+    
+    def restore_from_archive(self, entry_ids):
+        """把归档的条目批量移回密码库：先向密码库追加条目，再重写归档
+        
+        Returns:
+            bool: 是否移动成功
+        """
+        if not self.ensure_writable():
+            return False
+        try:
+            archive, archive_order = self.load_archive()
+            restored = {}
+            for entry_id in entry_ids:
+                entry = dict(archive[entry_id])
+                entry.pop('archived_at', None)
+                restored[entry_id] = entry
+            moved = set(entry_ids)
+            new_order = [entry_id for entry_id in archive_order if entry_id not in moved]
+            new_archive = {entry_id: archive[entry_id] for entry_id in new_order}
+            self.vault_writer.flush()
+            with self.vault_lock.writing():
+                self.crypto_manager.append_journal(self.db_file, self.session,
+                                                   [{"op": "put", "id": entry_id, "entry": entry}
+                                                    for entry_id, entry in restored.items()])
+                self.crypto_manager.save_archive(self.db_file, self.session, new_archive, new_order)
+        except Exception as e:
+            QMessageBox.warning(self, "警告", f"移回密码库失败：{str(e)}")
+            return False
+        self.archive_entries, self.archive_order = new_archive, new_order
+        self.entries.update(restored)
+        self.entries_order.extend(restored)
+        self.refresh_table()
+        return True
+    
+    def archive_selected_entries(self):
+        """归档选中的条目"""
+        if not self.ensure_writable():
+            return
+        # 搜索时表格只显示匹配的条目，按行记录的条目 id 取条目
+        entry_ids = self.table_entry_ids()
+        if not entry_ids:
+            QMessageBox.warning(self, "警告", "请选择要归档的条目")
+            return
+        if self.move_to_archive(entry_ids):
+            self.status_bar.showMessage(f"已归档 {len(entry_ids)} 个条目，剩余 {len(self.entries)} 个密码条目")
+    
+    def archive_old_entries(self):
+        """归档超过指定天数未修改的条目"""
+        if not self.ensure_writable():
+            return
+        days, ok = QInputDialog.getInt(self, "归档", "归档超过多少天未修改的条目：", 365, 1, 36500)
+        if not ok:
+            return
+        cutoff = datetime.now() - timedelta(days=days)
+        entry_ids = []
+        for entry_id in self.entries_order:
+            entry = self.entries[entry_id]
+            try:
+                changed_at = datetime.fromisoformat(entry.get('updated_at') or entry.get('created_at', ''))
+            except ValueError:
+                continue
+            if changed_at < cutoff:
+                entry_ids.append(entry_id)
+        if not entry_ids:
+            QMessageBox.information(self, "归档", f"没有超过 {days} 天未修改的条目")
+            return
+        
+        msg_box = QMessageBox(self)
+        msg_box.setWindowTitle("确认归档")
+        msg_box.setText(f"确定要归档 {len(entry_ids)} 个超过 {days} 天未修改的条目吗？\n\n归档的条目可以在 归档 → 查看归档 中移回密码库。")
+        msg_box.setIcon(QMessageBox.Icon.Question)
+        ok_button = msg_box.addButton("确定", QMessageBox.ButtonRole.AcceptRole)
+        cancel_button = msg_box.addButton("取消", QMessageBox.ButtonRole.RejectRole)
+        msg_box.setDefaultButton(cancel_button)
+        msg_box.exec()
+        if msg_box.clickedButton() != ok_button:
+            return
+        if self.move_to_archive(entry_ids):
+            self.status_bar.showMessage(f"已归档 {len(entry_ids)} 个条目，剩余 {len(self.entries)} 个密码条目")
+    
+    def open_archive(self):
+        """打开归档视图（此时才解密归档段），沿用主窗口的搜索文本"""
+        try:
+            self.load_archive()
+        except Exception as e:
+            QMessageBox.warning(self, "警告", f"读取归档失败：{str(e)}")
+            return
+        ArchiveDialog(self, self.search_edit.text()).exec()
+    
+    def copy_archived_password(self, entry_id):
+        """解密并复制归档条目的密码"""
+        try:
+            password = self.reveal_entry(self.load_archive()[0][entry_id])['password']
+        except Exception as e:
+            QMessageBox.warning(self, "警告", f"读取密码失败：{str(e)}")
+            return
+        self.copy_to_clipboard(password)
     
     def batch_add_entries(self):
         """批量添加密码条目"""
+        if not self.ensure_writable():
+            return
         # 显示标准模板提示
         template_dialog = QDialog(self)
         template_dialog.setWindowTitle("批量导入模板提示")
@@ -1411,7 +2132,7 @@ N网,https://www.nexusmods.com/,username1,password1
                 self.entries[entry['id']] = entry
                 self.entries_order.append(entry['id'])
             
-            self.save_db()
+            self.save_db(changed=[entry['id'] for entry in entries])
             self.refresh_table()
             msg_box = QMessageBox(self)
             msg_box.setWindowTitle("成功")
@@ -1548,8 +2269,7 @@ N网,https://www.nexusmods.com/,username1,password1
     def open_url(self, index):
         """双击打开URL"""
         if index.column() in [1, 2, 3, 4]:  # 网站名、网址、账号、备注列都可以双击打开
-            row = index.row()
-            entry_id = self.entries_order[row]
+            entry_id = self.table_widget.item(index.row(), 0).data(Qt.ItemDataRole.UserRole)
             entry = self.entries[entry_id]
             QDesktopServices.openUrl(QUrl(entry['url']))
     
@@ -1560,18 +2280,266 @@ N网,https://www.nexusmods.com/,username1,password1
             return
         
         self.last_selected_row = -1  # 重置Shift多选状态
-        filtered_order = [entry_id for entry_id in self.entries_order 
-                         if text.lower() in self.entries[entry_id]['website_name'].lower() or 
-                         text.lower() in self.entries[entry_id]['username'].lower()]
+        matched = [entry for entry in self.vault.snapshot().ordered_entries()
+                   if text.lower() in entry['website_name'].lower() or
+                   text.lower() in entry['username'].lower()]
         
         # 刷新表格显示过滤后的条目
         self.table_widget.setRowCount(0)
-        for entry_id in filtered_order:
-            self.add_entry_to_table(self.entries[entry_id])
+        for entry in matched:
+            self.add_entry_to_table(entry)
+        
+        # 密码库中没有匹配的条目时再搜索归档
+        if not matched and os.path.exists(self.crypto_manager.archive_path(self.db_file)):
+            try:
+                archive, archive_order = self.load_archive()
+            except Exception as e:
+                self.status_bar.showMessage(f"读取归档失败：{e}")
+                return
+            matches = [entry_id for entry_id in archive_order
+                       if text.lower() in archive[entry_id]['website_name'].lower() or
+                       text.lower() in archive[entry_id]['username'].lower()]
+            if matches:
+                self.status_bar.showMessage(f"密码库中没有匹配的条目，归档中有 {len(matches)} 个匹配（菜单 归档 → 查看归档）")
+    
+    def backup_store(self):
+        """备份目录（相对路径按数据库所在目录计算）"""
+        directory = self.settings.get("backup_dir") or DEFAULT_BACKUP_DIR
+        return BackupStore(os.path.join(os.path.dirname(os.path.abspath(self.db_file)), directory))
+    
+    def backup_paths(self):
+        """需要备份的文件：数据库、变更日志或 WAL、归档段、同步记录"""
+        return self.crypto_manager.vault_files(self.db_file) + [self.crypto_manager.archive_path(self.db_file),
+                                                                self.crypto_manager.sync_state_path(self.db_file)]
+    
+    def backup_vault(self, db_file, paths, store, retention=None):
+        """备份数据库；传入 retention 时按保留策略清理旧备份
+        
+        在数据区间的锁内读取文件，读到的数据库、变更日志和归档段属于同一时刻；
+        分块和写入备份目录在锁外进行。
+        
+        Returns:
+            tuple: (新备份的清单，内容没有变化时为 None；清理结果，未清理时为 None)
+        """
+        with self.vault_lock.writing(record=False):
+            files = read_vault_files(db_file, paths)
+        manifest = store.create(os.path.basename(db_file), files) if files else None
+        pruned = store.prune(retention) if retention is not None else None
+        return manifest, pruned
+    
+    def start_backup(self, manual=False):
+        """在备份线程中备份数据库（只读模式下由以可写模式打开数据库的窗口负责备份）"""
+        if self.read_only or not os.path.exists(self.db_file):
+            if manual:
+                QMessageBox.warning(self, "警告", "数据库以只读模式打开，请在以可写模式打开的窗口中备份"
+                                    if self.read_only else "数据库不存在")
+            return
+        if self.backup_future is not None and not self.backup_future.done():
+            return
+        retention = self.settings.get("backup_retention") or DEFAULT_RETENTION
+        self.backup_future = self.backup_executor.submit(
+            self.backup_vault, self.db_file, self.backup_paths(), self.backup_store(), retention)
+        self.backup_future.add_done_callback(lambda future: self.backup_finished.emit((future, manual)))
+    
+    def on_backup_finished(self, result):
+        """在状态栏显示备份结果（手动备份时弹出提示）"""
+        future, manual = result
+        try:
+            manifest, pruned = future.result()
+        except Exception as e:
+            text = f"备份失败：{e}"
+        else:
+            if manifest is None:
+                text = "数据库自上次备份以来没有变化，未创建新备份"
+            else:
+                stats = manifest["stats"]
+                text = (f"已备份数据库：新增 {stats['new_chunks']} 个数据块 {stats['new_bytes'] / 1024:.1f} KB"
+                        f"（数据库共 {stats['total_bytes'] / 1024:.1f} KB）")
+            if pruned and pruned["removed_backups"]:
+                text += f"，清理 {pruned['removed_backups']} 个旧备份，回收 {pruned['reclaimed_bytes'] / 1024:.1f} KB"
+        self.status_bar.showMessage(text)
+        if manual:
+            QMessageBox.information(self, "备份", text)
+    
+    def restore_backup(self):
+        """从备份恢复数据库：恢复前先备份当前数据库，恢复后需要用该备份时的主密码重新登录"""
+        if not self.ensure_writable():
+            return
+        store = self.backup_store()
+        backups = store.list_backups(os.path.basename(self.db_file))
+        if not backups:
+            QMessageBox.warning(self, "警告", "没有可恢复的备份")
+            return
+        labels = [f"{i}. {backup['created_at'].replace('T', ' ')}（{backup['stats']['total_bytes'] / 1024:.1f} KB）"
+                  for i, backup in enumerate(backups, 1)]
+        label, ok = QInputDialog.getItem(self, "从备份恢复", "选择要恢复的备份：", labels, 0, False)
+        if not ok:
+            return
+        backup = backups[labels.index(label)]
+        
+        msg_box = QMessageBox(self)
+        msg_box.setWindowTitle("从备份恢复")
+        msg_box.setText(f"当前数据库将被替换为 {backup['created_at'].replace('T', ' ')} 的备份，"
+                        "恢复前会先备份当前数据库。\n\n恢复后需要用该备份时的主密码重新登录，是否继续？")
+        msg_box.setIcon(QMessageBox.Icon.Question)
+        ok_button = msg_box.addButton("恢复", QMessageBox.ButtonRole.AcceptRole)
+        msg_box.addButton("取消", QMessageBox.ButtonRole.RejectRole)
+        msg_box.exec()
+        if msg_box.clickedButton() != ok_button:
+            return
+        
+        try:
+            self.vault_writer.flush()
+            if self.backup_future is not None:
+                self.backup_future.result()
+            # 先备份当前数据库（不清理旧备份，避免要恢复的备份被清理）
+            paths = self.backup_paths()
+            self.backup_vault(self.db_file, paths, store)
+            with self.vault_lock.writing():
+                store.restore(backup["name"], self.db_file, [path[len(self.db_file):] for path in paths])
+        except Exception as e:
+            QMessageBox.warning(self, "警告", f"恢复失败：{str(e)}")
+            return
+        # 恢复的数据库可能使用不同的主密码和数据密钥，当前会话和快速解锁状态作废
+        self.quick_unlock.clear()
+        self.lock_app()
+    
+    def sync_with_folder(self):
+        """与文件夹中同名的数据库副本同步（U 盘、同步盘等），两边只交换内容不同的条目
+        
+        文件夹中还没有数据库时写入一份副本；本地移入归档的条目不会从副本拉回。
+        """
+        if not self.ensure_writable() or self.session is None:
+            return
+        folder = QFileDialog.getExistingDirectory(self, "选择同步文件夹", self.settings.get("sync_folder", ""))
+        if not folder:
+            return
+        remote_path = os.path.abspath(os.path.join(folder, os.path.basename(self.db_file)))
+        if remote_path == os.path.abspath(self.db_file):
+            QMessageBox.warning(self, "警告", "请选择数据库所在目录以外的文件夹")
+            return
+        self.settings["sync_folder"] = folder
+        try:
+            save_to_settings({"sync_folder": folder})
+        except Exception as e:
+            self.status_bar.showMessage(f"保存同步文件夹设置失败：{e}")
+        
+        try:
+            self.vault_writer.flush()
+            state = self.read_locked(self.crypto_manager.load_sync_state, self.db_file, self.session)
+            archive, _ = self.load_archive()
+            snapshot = self.vault.snapshot()
+            result = sync_with_copy(self.crypto_manager, self.session, snapshot.entries, snapshot.order, remote_path,
+                                    set(state.get(remote_path, [])), set(archive))
+            state[remote_path] = sorted(result["synced_ids"])
+            with self.vault_lock.writing():
+                self.crypto_manager.save_sync_state(self.db_file, self.session, state)
+        except Exception as e:
+            QMessageBox.warning(self, "警告", f"同步失败：{str(e)}")
+            return
+        
+        # 拉取的条目与副本中的条目相同（同一个数据密钥加密），直接放入条目字典
+        pulled = result["pulled"]
+        added = [entry_id for entry_id in result["pull"] if entry_id not in self.entries]
+        changed = [entry_id for entry_id in result["pull"] if entry_id in self.entries]
+        removed = result["delete_local"]
+        self.entries.update(pulled)
+        self.entries_order.extend(added)
+        self.entries.remove_many(removed)
+        self.entries_order.remove_items(set(removed))
+        for entry_id in changed + removed:
+            self.entry_digests.pop(entry_id, None)
+        if pulled or removed:
+            self.save_db(changed=list(pulled), deleted=removed)
+            self.update_table_rows({"added": added, "changed": changed, "removed": removed, "reordered": False},
+                                   bool(added or removed))
+            if hasattr(self, 'floating_window'):
+                self.floating_window.refresh_entries()
+        
+        if result["created"]:
+            text = f"已在文件夹中创建数据库副本（{len(result['push'])} 个条目）"
+        elif result["buckets"] is not None and not result["buckets"][0]:
+            text = "两边的数据库一致，无需同步"
+        else:
+            text = (f"同步完成：推送 {len(result['push'])} 个、拉取 {len(result['pull'])} 个条目，"
+                    f"两边各删除 {len(result['delete_remote'])} / {len(removed)} 个条目")
+            if result["buckets"] is not None:
+                text += f"（比较了 {result['buckets'][0]} / {result['buckets'][1]} 个分组）"
+        self.status_bar.showMessage(text)
+        QMessageBox.information(self, "同步", text)
+    
+    def merge_import(self, data, entries_order, import_session):
+        """把已解密的导入数据库合并到当前数据库（vault_merge），结果用当前的会话密钥一次保存
+        
+        导入条目的密文由导入文件的数据密钥加密，解密后重新用当前的数据密钥加密，主密码不变，无需重新登录。
+        """
+        if self.session is None:
+            return
+        try:
+            archive, _ = self.load_archive()
+            plan = plan_merge(self.entries, data, entries_order, self.reveal_entry,
+                              lambda entry: self.crypto_manager.reveal_entry(import_session, entry), set(archive))
+        except Exception as e:
+            QMessageBox.warning(self, "警告", f"合并失败：{str(e)}")
+            return
+        
+        policy = "newer"
+        if plan["conflicts"]:
+            msg_box = QMessageBox(self)
+            msg_box.setWindowTitle("条目冲突")
+            msg_box.setText(f"有 {len(plan['conflicts'])} 个条目在两个数据库中的内容不同，请选择保留哪一边：")
+            msg_box.setIcon(QMessageBox.Icon.Question)
+            buttons = {
+                msg_box.addButton("保留较新的", QMessageBox.ButtonRole.AcceptRole): "newer",
+                msg_box.addButton("保留当前的", QMessageBox.ButtonRole.AcceptRole): "local",
+                msg_box.addButton("使用导入的", QMessageBox.ButtonRole.AcceptRole): "incoming",
+            }
+            msg_box.addButton("取消", QMessageBox.ButtonRole.RejectRole)
+            msg_box.setDefaultButton(next(iter(buttons)))
+            msg_box.exec()
+            if msg_box.clickedButton() not in buttons:
+                return
+            policy = buttons[msg_box.clickedButton()]
+        
+        try:
+            merged = {}
+            for local_id, entry_id in resolve_conflicts(plan["conflicts"], self.entries, data, policy):
+                entry = self.crypto_manager.reveal_entry(import_session, data[entry_id])
+                entry['id'] = local_id
+                merged[local_id] = entry
+            for entry_id in plan["add"]:
+                merged[entry_id] = self.crypto_manager.reveal_entry(import_session, data[entry_id])
+        except Exception as e:
+            QMessageBox.warning(self, "警告", f"合并失败：{str(e)}")
+            return
+        
+        changed = [entry_id for entry_id in merged if entry_id in self.entries]
+        self.entries.update(merged)
+        self.entries_order.extend(plan["add"])
+        for entry_id in changed:
+            self.entry_digests.pop(entry_id, None)
+        if merged:
+            # 明文条目在保存时用当前的会话密钥重新拆分加密
+            self.save_db(changed=list(merged))
+            self.update_table_rows({"added": plan["add"], "changed": changed, "removed": [], "reordered": False},
+                                   bool(plan["add"]))
+            if hasattr(self, 'floating_window'):
+                self.floating_window.refresh_entries()
+        
+        text = (f"合并完成：新增 {len(plan['add'])} 个、更新 {len(changed)} 个条目，"
+                f"{plan['unchanged']} 个条目内容相同")
+        if len(plan["conflicts"]) > len(changed):
+            text += f"，{len(plan['conflicts']) - len(changed)} 个冲突保留了当前的条目"
+        if plan["skipped"]:
+            text += f"，{plan['skipped']} 个已归档的条目未导入"
+        self.status_bar.showMessage(text)
+        QMessageBox.information(self, "导入", text)
     
     def import_db(self):
         """导入数据库"""
-        file_path, _ = QFileDialog.getOpenFileName(self, "选择导入文件", "", "Encrypted Files (*.json.aes)")
+        if not self.ensure_writable():
+            return
+        file_path, _ = QFileDialog.getOpenFileName(self, "选择导入文件", "", "Encrypted Files (*.json.aes *.db)")
         if not file_path:
             return
         
@@ -1628,8 +2596,10 @@ N网,https://www.nexusmods.com/,username1,password1
         else:
             return
         
-        # 验证密码是否正确
-        if not self.crypto_manager.verify_master_password(file_path, password):
+        # 验证密码并解密导入文件（只派生一次密钥，加密文件和 SQLite 数据库都可以导入）
+        try:
+            data, entries_order, session = SQLiteCryptoManager().unlock_db(file_path, password)
+        except Exception:
             msg_box = QMessageBox(self)
             msg_box.setWindowTitle("警告")
             msg_box.setText("原数据库主密码不正确")
@@ -1638,10 +2608,32 @@ N网,https://www.nexusmods.com/,username1,password1
             msg_box.exec()
             return
         
+        # 选择导入方式：合并保留当前的条目和主密码，覆盖则整体替换为导入的数据库
+        msg_box = QMessageBox(self)
+        msg_box.setWindowTitle("导入方式")
+        msg_box.setText(f"导入文件中有 {len(data)} 个条目。\n\n合并导入：把导入文件的条目合并到当前数据库，保留当前的主密码\n"
+                        "覆盖导入：用导入文件替换当前数据库，主密码变为导入文件的主密码")
+        msg_box.setIcon(QMessageBox.Icon.Question)
+        merge_button = msg_box.addButton("合并导入", QMessageBox.ButtonRole.AcceptRole)
+        replace_button = msg_box.addButton("覆盖导入", QMessageBox.ButtonRole.DestructiveRole)
+        msg_box.addButton("取消", QMessageBox.ButtonRole.RejectRole)
+        msg_box.setDefaultButton(merge_button)
+        msg_box.exec()
+        
+        if msg_box.clickedButton() == merge_button:
+            try:
+                self.merge_import(data, entries_order, session)
+            finally:
+                session.wipe()
+            return
+        if msg_box.clickedButton() != replace_button:
+            session.wipe()
+            return
+        
         # 显示主密码变更提示
         msg_box = QMessageBox(self)
         msg_box.setWindowTitle("主密码变更提示")
-        msg_box.setText("导入后，您的主密码将变为原加密文件的主密码。\n\n此操作将：\n1. 覆盖当前所有密码数据\n2. 主密码变为导入文件的密码\n3. 需要重新登录\n\n确定要继续吗？")
+        msg_box.setText("导入后，您的主密码将变为原加密文件的主密码。\n\n此操作将：\n1. 覆盖当前所有密码数据\n2. 主密码变为导入文件的密码\n\n确定要继续吗？")
         msg_box.setIcon(QMessageBox.Icon.Question)
         
         # 添加自定义按钮
@@ -1651,28 +2643,149 @@ N网,https://www.nexusmods.com/,username1,password1
         
         msg_box.exec()
         
-        if msg_box.clickedButton() == ok_button:
-            # 复制文件
-            try:
-                import shutil
-                shutil.copy(file_path, self.db_file)
-                msg_box = QMessageBox(self)
-                msg_box.setWindowTitle("成功")
-                msg_box.setText("数据库导入成功，需要重新登录")
-                msg_box.setIcon(QMessageBox.Icon.Information)
-                msg_box.addButton("确定", QMessageBox.ButtonRole.AcceptRole)
-                msg_box.exec()
-                self.lock_app()
-            except Exception as e:
-                msg_box = QMessageBox(self)
-                msg_box.setWindowTitle("错误")
-                msg_box.setText(f"导入失败：{str(e)}")
-                msg_box.setIcon(QMessageBox.Icon.Critical)
-                msg_box.addButton("确定", QMessageBox.ButtonRole.AcceptRole)
-                msg_box.exec()
+        if msg_box.clickedButton() != ok_button:
+            session.wipe()
+            return
+        
+        # 用导入文件的会话密钥按当前存储引擎写入，直接使用已解密的数据，无需重新登录
+        try:
+            # 先写完待保存的修改，避免覆盖导入的数据库
+            self.vault_writer.flush()
+            # 导入文件的归档段（如果有）一并导入，当前的归档段由旧数据密钥加密，不再保留
+            archive, archive_order = SQLiteCryptoManager().load_archive(file_path, session)
+            with self.vault_lock.writing():
+                self.crypto_manager.save_encrypted_db_with_session(self.db_file, session, data, entries_order)
+                self.crypto_manager.save_archive(self.db_file, session, archive, archive_order)
+                # 同步记录属于被覆盖的数据库
+                if os.path.exists(self.crypto_manager.sync_state_path(self.db_file)):
+                    os.remove(self.crypto_manager.sync_state_path(self.db_file))
+        except Exception as e:
+            session.wipe()
+            msg_box = QMessageBox(self)
+            msg_box.setWindowTitle("错误")
+            msg_box.setText(f"导入失败：{str(e)}")
+            msg_box.setIcon(QMessageBox.Icon.Critical)
+            msg_box.addButton("确定", QMessageBox.ButtonRole.AcceptRole)
+            msg_box.exec()
+            return
+        
+        self.apply_unlocked_vault(password, data, entries_order, session)
+        if hasattr(self, 'floating_window'):
+            self.floating_window.refresh_entries()
+        
+        msg_box = QMessageBox(self)
+        msg_box.setWindowTitle("成功")
+        msg_box.setText("数据库导入成功，主密码已变为导入文件的主密码")
+        msg_box.setIcon(QMessageBox.Icon.Information)
+        msg_box.addButton("确定", QMessageBox.ButtonRole.AcceptRole)
+        msg_box.exec()
+    
+    def table_entry_ids(self, checked_only=True):
+        """表格中（勾选的）行对应的条目 id，按表格中的顺序"""
+        return [self.table_widget.item(row, 0).data(Qt.ItemDataRole.UserRole)
+                for row in range(self.table_widget.rowCount())
+                if not checked_only or self.table_widget.cellWidget(row, 1).checkState() == Qt.CheckState.Checked]
+    
+    def export_selected(self, entry_ids):
+        """把条目导出为新的加密数据库（用新的主密码），在后台线程中重新加密和写入（vault_export）"""
+        if self.session is None:
+            return
+        if self.export_future is not None and not self.export_future.done():
+            QMessageBox.warning(self, "警告", "上一次导出还没有完成，请稍候")
+            return
+        
+        dialog = QDialog(self)
+        dialog.setWindowTitle("导出选中的条目")
+        dialog.resize(400, 200)
+        
+        layout = QVBoxLayout(dialog)
+        layout.addWidget(QLabel(f"将 {len(entry_ids)} 个条目导出为新的加密数据库，请设置它的主密码："))
+        
+        password_edit = QLineEdit(dialog)
+        password_edit.setEchoMode(QLineEdit.EchoMode.Password)
+        password_edit.setPlaceholderText("主密码")
+        layout.addWidget(password_edit)
+        
+        confirm_edit = QLineEdit(dialog)
+        confirm_edit.setEchoMode(QLineEdit.EchoMode.Password)
+        confirm_edit.setPlaceholderText("确认主密码")
+        layout.addWidget(confirm_edit)
+        
+        button_layout = QHBoxLayout()
+        ok_button = QPushButton("确定", dialog)
+        cancel_button = QPushButton("取消", dialog)
+        button_layout.addStretch()
+        button_layout.addWidget(ok_button)
+        button_layout.addWidget(cancel_button)
+        layout.addLayout(button_layout)
+        
+        ok_button.clicked.connect(dialog.accept)
+        cancel_button.clicked.connect(dialog.reject)
+        
+        if dialog.exec() != QDialog.DialogCode.Accepted:
+            return
+        password = password_edit.text()
+        if not password:
+            QMessageBox.warning(self, "警告", "主密码不能为空")
+            return
+        if password != confirm_edit.text():
+            QMessageBox.warning(self, "警告", "两次输入的密码不一致")
+            return
+        
+        file_path, selected_filter = QFileDialog.getSaveFileName(
+            self, "选择导出文件", "passwords_shared.json.aes", "Encrypted Files (*.json.aes);;SQLite Files (*.db)")
+        if not file_path:
+            return
+        if not file_path.endswith((".json.aes", ".db")):
+            file_path += ".db" if "*.db" in selected_filter else ".json.aes"
+        if os.path.abspath(file_path) in {os.path.abspath(path) for path in self.backup_paths()}:
+            QMessageBox.warning(self, "警告", "不能导出到当前数据库的文件")
+            return
+        
+        # 导出快照中的条目，导出期间界面的修改不影响导出的内容
+        entries = self.vault.snapshot().entries
+        self.export_future = self.backup_executor.submit(
+            export_entries, self.crypto_manager, self.session, entries, entry_ids, file_path, password)
+        self.export_future.add_done_callback(lambda future: self.export_finished.emit((future, file_path)))
+        self.status_bar.showMessage(f"正在导出 {len(entry_ids)} 个条目...")
+    
+    def on_export_finished(self, result):
+        """提示导出选中条目的结果"""
+        future, file_path = result
+        try:
+            count = future.result()
+        except Exception as e:
+            self.status_bar.showMessage(f"导出失败：{e}")
+            QMessageBox.warning(self, "警告", f"导出失败：{str(e)}")
+            return
+        text = f"已将 {count} 个条目导出为新的加密数据库\n{file_path}"
+        self.status_bar.showMessage(text.replace("\n", "："))
+        QMessageBox.information(self, "导出", text)
     
     def export_db(self):
-        """导出数据库"""
+        """导出数据库（勾选了条目或正在搜索时可以只导出这些条目）"""
+        # 勾选的条目优先，没有勾选时使用搜索结果
+        entry_ids = self.table_entry_ids()
+        scope = "勾选的"
+        if not entry_ids and self.search_edit.text():
+            entry_ids = self.table_entry_ids(checked_only=False)
+            scope = "搜索结果中的"
+        if entry_ids and self.session is not None:
+            msg_box = QMessageBox(self)
+            msg_box.setWindowTitle("导出")
+            msg_box.setText(f"导出{scope} {len(entry_ids)} 个条目（新的加密数据库，单独设置主密码），还是导出整个数据库？")
+            msg_box.setIcon(QMessageBox.Icon.Question)
+            selected_button = msg_box.addButton(f"导出{scope}条目", QMessageBox.ButtonRole.AcceptRole)
+            whole_button = msg_box.addButton("导出整个数据库", QMessageBox.ButtonRole.AcceptRole)
+            msg_box.addButton("取消", QMessageBox.ButtonRole.RejectRole)
+            msg_box.setDefaultButton(selected_button)
+            msg_box.exec()
+            if msg_box.clickedButton() == selected_button:
+                self.export_selected(entry_ids)
+                return
+            if msg_box.clickedButton() != whole_button:
+                return
+        
         # 显示导出提示
         msg_box = QMessageBox(self)
         msg_box.setWindowTitle("导出提示")
@@ -1689,7 +2802,9 @@ N网,https://www.nexusmods.com/,username1,password1
         if msg_box.clickedButton() == cancel_button:
             return
         
-        file_path, _ = QFileDialog.getSaveFileName(self, "选择导出文件", "passwords.json.aes", "Encrypted Files (*.json.aes)")
+        file_name = os.path.basename(self.db_file)
+        file_filter = "SQLite Files (*.db)" if file_name.endswith(".db") else "Encrypted Files (*.json.aes)"
+        file_path, _ = QFileDialog.getSaveFileName(self, "选择导出文件", file_name, file_filter)
         if not file_path:
             return
         
@@ -1728,7 +2843,22 @@ N网,https://www.nexusmods.com/,username1,password1
         # 复制文件
         try:
             import shutil
-            shutil.copy(self.db_file, file_path)
+            # 等待后台保存写完，并把变更日志合并进快照，导出的单个文件即为完整数据库
+            self.vault_writer.flush()
+            if self.read_only:
+                # 只读模式不能合并日志，用已解锁的内容写出导出文件（内容与磁盘上的数据库相同）
+                snapshot = self.vault.snapshot()
+                self.crypto_manager.save_encrypted_db_with_session(file_path, self.session, snapshot.entries, snapshot.order)
+            else:
+                if self.session is not None:
+                    with self.vault_lock.writing():
+                        self.crypto_manager.compact_journal(self.db_file, self.session)
+                shutil.copy(self.db_file, file_path)
+            # 归档段放在导出文件旁边，导入时一并导入
+            archive_path = self.crypto_manager.archive_path(self.db_file)
+            if os.path.exists(archive_path):
+                with self.vault_lock.reading():
+                    shutil.copy(archive_path, self.crypto_manager.archive_path(file_path))
             msg_box = QMessageBox(self)
             msg_box.setWindowTitle("成功")
             msg_box.setText("数据库导出成功")
@@ -1749,6 +2879,19 @@ N网,https://www.nexusmods.com/,username1,password1
         if dialog.exec() == QDialog.DialogCode.Accepted:
             self.load_settings()
             self.update_lock_timer()
+            # 密钥派生参数变化后立即用新参数重新包裹数据密钥
+            if (self.session and self.master_password and not self.read_only
+                    and self.crypto_manager.needs_rehash(self.session)):
+                try:
+                    self.vault_writer.flush()
+                    with self.vault_lock.writing():
+                        self.set_session(self.crypto_manager.change_session_password(
+                            self.db_file, self.session, self.master_password))
+                except Exception as e:
+                    QMessageBox.warning(self, "警告", f"更新密钥派生参数失败：{str(e)}")
+            # 刚启用 PIN 快速解锁时设置 PIN
+            if self.session is not None and self.settings.get("quick_unlock", False) and not self.quick_unlock.armed:
+                self.setup_quick_unlock_pin()
             # 更新悬浮窗口的快捷键设置
             if hasattr(self, 'floating_window') and hasattr(self.floating_window, 'update_shortcut'):
                 shortcut_key = self.settings.get("floating_window_shortcut", "Ctrl+Shift+X")
@@ -1836,33 +2979,179 @@ N网,https://www.nexusmods.com/,username1,password1
         msg_box.addButton("确定", QMessageBox.ButtonRole.AcceptRole)
         msg_box.exec()
     
+    def setup_quick_unlock_pin(self):
+        """设置 PIN 快速解锁使用的 PIN（只保存在内存中，退出程序后需要重新设置）"""
+        dialog = QDialog(self)
+        dialog.setWindowTitle("设置快速解锁 PIN")
+        dialog.setFixedSize(320, 170)
+        dialog.setModal(True)
+        
+        layout = QVBoxLayout(dialog)
+        layout.addWidget(QLabel(f"自动锁定后可以用 PIN 解锁（{MIN_PIN_LENGTH} 到 {MAX_PIN_LENGTH} 位数字）：\n"
+                                "PIN 只保存在内存中，不会写入磁盘。"))
+        
+        form_layout = QFormLayout()
+        pin_edit = QLineEdit()
+        pin_edit.setEchoMode(QLineEdit.EchoMode.Password)
+        confirm_edit = QLineEdit()
+        confirm_edit.setEchoMode(QLineEdit.EchoMode.Password)
+        form_layout.addRow("PIN：", pin_edit)
+        form_layout.addRow("确认 PIN：", confirm_edit)
+        layout.addLayout(form_layout)
+        
+        button_layout = QHBoxLayout()
+        ok_btn = QPushButton("确定")
+        ok_btn.clicked.connect(dialog.accept)
+        cancel_btn = QPushButton("跳过")
+        cancel_btn.clicked.connect(dialog.reject)
+        button_layout.addStretch()
+        button_layout.addWidget(ok_btn)
+        button_layout.addWidget(cancel_btn)
+        layout.addLayout(button_layout)
+        
+        if dialog.exec() != QDialog.DialogCode.Accepted:
+            return
+        if pin_edit.text() != confirm_edit.text():
+            QMessageBox.warning(self, "警告", "两次输入的 PIN 不一致，本次未启用快速解锁")
+            return
+        try:
+            self.quick_unlock.set_pin(pin_edit.text())
+        except Exception as e:
+            QMessageBox.warning(self, "警告", f"{str(e)}，本次未启用快速解锁")
+    
     def load_settings(self):
         """加载设置（直接读取文件，不创建对话框）"""
         import json
         import os
-        default_settings = {
-            "auto_lock_time": 5,
-            "lock_on_minimize": True,
-            "theme": "light",
-            "email": "",
-            "email_password": "",
-            "floating_window_shortcut": "Ctrl+Shift+X",
-            "enable_auto_lock": True
-        }
+        default = default_settings()
 
         settings_file = "settings.json"
         if os.path.exists(settings_file):
             try:
                 with open(settings_file, 'r', encoding='utf-8') as f:
                     loaded = json.load(f)
-                    self.settings = {**default_settings, **loaded}
+                    self.settings = {**default, **loaded}
             except:
-                self.settings = default_settings
+                self.settings = default
         else:
-            self.settings = default_settings
+            self.settings = default
+
+        self.apply_storage_backend()
+
+        # 无效的设置回退为默认值，并在状态栏提示
+        warnings = []
+
+        # 新数据库、更改主密码和重新包裹时使用的密钥派生参数
+        try:
+            self.crypto_manager.set_kdf_params(self.settings.get("kdf_params"))
+        except Exception as e:
+            warnings.append(f"密钥派生参数无效，使用默认参数：{e}")
+            self.crypto_manager.set_kdf_params(None)
+
+        # 保存数据库时使用的压缩算法
+        try:
+            self.crypto_manager.set_compression(self.settings.get("compression"))
+        except Exception as e:
+            warnings.append(f"压缩设置无效，不压缩数据库：{e}")
+            self.crypto_manager.set_compression(None)
+
+        # 新数据库使用的加密算法（已有数据库按文件头记录的算法）
+        try:
+            self.crypto_manager.set_cipher(self.settings.get("cipher"))
+        except Exception as e:
+            warnings.append(f"加密算法设置无效，使用默认算法：{e}")
+            self.crypto_manager.set_cipher(None)
+
+        if warnings:
+            self.status_bar.showMessage("；".join(warnings))
+
+        # 定时备份
+        self.backup_timer.setInterval(max(1, self.settings.get("backup_interval_hours", 1)) * 3600 * 1000)
+        if self.settings.get("backup_enabled", True):
+            self.backup_timer.start()
+        else:
+            self.backup_timer.stop()
+
+        # PIN 快速解锁
+        self.quick_unlock.max_attempts = self.settings.get("quick_unlock_attempts", 3)
+        self.quick_unlock.lifetime_minutes = self.settings.get("quick_unlock_minutes", 60)
+        if not self.settings.get("quick_unlock", False):
+            self.quick_unlock.clear()
 
         self.apply_theme()
     
+    def create_vault_session(self, password):
+        """为新数据库创建会话密钥；未指定加密算法时先在本机测速，选择更快的算法
+        
+        旧数据库的归档段和同步记录由旧的数据密钥加密，新数据库不再沿用，一并删除。
+        """
+        for path in (self.crypto_manager.archive_path(self.db_file), self.crypto_manager.sync_state_path(self.db_file)):
+            if os.path.exists(path):
+                os.remove(path)
+        self.archive_entries = None
+        self.archive_order = []
+        if not self.settings.get("cipher"):
+            self.crypto_manager.set_cipher(select_cipher())
+        return self.crypto_manager.create_session(password)
+    
+    def apply_storage_backend(self):
+        """按设置选择存储引擎；已登录时把当前数据库转换到新的存储引擎"""
+        backend = self.settings.get("storage_backend", "file")
+        if backend not in self.STORAGE_BACKENDS:
+            backend = "file"
+        db_file, manager_class = self.STORAGE_BACKENDS[backend]
+
+        if self.session is None and not os.path.exists(db_file):
+            # 未登录时无法转换，沿用已存在的数据库文件
+            for other_file, other_class in self.STORAGE_BACKENDS.values():
+                if os.path.exists(other_file):
+                    db_file, manager_class = other_file, other_class
+                    break
+
+        if type(self.crypto_manager) is manager_class:
+            self.db_file = db_file
+            return
+
+        manager = manager_class()
+        new_lock = None
+        if self.session is not None and self.session.active:
+            if self.read_only:
+                QMessageBox.warning(self, "警告", "数据库以只读模式打开，不能转换存储引擎")
+                return
+            # 用同一个会话密钥写入新的存储引擎，主密码保持不变；先取得新数据库的写入者锁
+            new_lock = VaultLock(db_file)
+            new_lock.stamp = self.current_vault_stamp
+            if not new_lock.acquire_owner():
+                new_lock.release()
+                QMessageBox.warning(self, "警告", f"转换存储引擎失败：{db_file} 已被{new_lock.describe_owner()}打开")
+                return
+            try:
+                self.vault_writer.flush()
+                snapshot = self.vault.snapshot()
+                manager.save_encrypted_db_with_session(db_file, self.session, snapshot.entries, snapshot.order)
+            except Exception as e:
+                new_lock.release()
+                QMessageBox.warning(self, "警告", f"转换存储引擎失败：{str(e)}")
+                return
+            old_file = self.db_file
+            # 归档段和同步记录与存储引擎无关，跟随数据库文件改名
+            for old_path, new_path in ((self.crypto_manager.archive_path(old_file), manager.archive_path(db_file)),
+                                       (self.crypto_manager.sync_state_path(old_file), manager.sync_state_path(db_file))):
+                if os.path.exists(old_path):
+                    os.replace(old_path, new_path)
+            for path in (old_file, self.crypto_manager.journal_path(old_file), old_file + "-wal", old_file + "-shm"):
+                if os.path.exists(path):
+                    os.remove(path)
+        self.crypto_manager = manager
+        self.vault_writer.crypto_manager = manager
+        self.quick_unlock.crypto_manager = manager
+        self.db_file = db_file
+        if new_lock is not None:
+            self.vault_lock.release()
+            self.vault_lock = self.vault_writer.vault_lock = new_lock
+            self.remember_vault_stamp()
+            self.watch_vault()
+
     def toggle_floating_window(self):
         """显示/隐藏悬浮窗口"""
         if hasattr(self, 'floating_window'):
@@ -1871,7 +3160,8 @@ N网,https://www.nexusmods.com/,username1,password1
             # 如果悬浮窗口不存在，创建一个
             from floating_window import FloatingWindow
             self.floating_window = FloatingWindow(self)
-            self.floating_window.set_entries(self.entries, self.entries_order)
+            snapshot = self.vault.snapshot()
+            self.floating_window.set_entries(snapshot.entries, snapshot.order)
             self.floating_window.show()
     
     def apply_theme(self):
@@ -1961,10 +3251,20 @@ N网,https://www.nexusmods.com/,username1,password1
     
     def lock_app(self, show_login=True):
         """锁定应用"""
+        self.save_pending_changes()
+        if self.session is not None and self.settings.get("quick_unlock", False):
+            # 已设置 PIN 时，在内存中保存用 PIN 包裹的会话密钥和条目快照
+            self.vault_writer.flush()
+            snapshot = self.vault.snapshot()
+            self.quick_unlock.lock(self.session, snapshot.entries, snapshot.order)
         # 清空数据
         self.master_password = ""
+        self.set_session(None)
         self.entries = {}
         self.entries_order = []
+        self.archive_entries = None
+        self.archive_order = []
+        self.reset_dirty_tracking()
         self.refresh_table()
         self.clipboard_timer.stop()
         self.clear_clipboard()
@@ -1978,6 +3278,12 @@ N网,https://www.nexusmods.com/,username1,password1
     
     def close_app(self):
         """关闭应用"""
+        # 退出前重新提交保存失败的修改，等待后台保存和备份完成，再释放数据库的锁
+        self.save_pending_changes()
+        self.vault_writer.close()
+        self.backup_executor.shutdown(wait=True)
+        if self.vault_lock is not None:
+            self.vault_lock.release()
         self.tray_icon.hide()
         # 关闭悬浮窗口
         if hasattr(self, 'floating_window'):
@@ -1990,6 +3296,11 @@ N网,https://www.nexusmods.com/,username1,password1
     
     def force_exit_app(self):
         """强制退出应用，不弹出确认窗口"""
+        self.save_pending_changes()
+        self.vault_writer.close()
+        self.backup_executor.shutdown(wait=True)
+        if self.vault_lock is not None:
+            self.vault_lock.release()
         self.tray_icon.hide()
         # 关闭悬浮窗口
         if hasattr(self, 'floating_window'):
@@ -2101,7 +3412,7 @@ N网,https://www.nexusmods.com/,username1,password1
     def show_normal(self):
         """显示主窗口"""
         # 检查是否已锁定
-        if not self.master_password:
+        if self.session is None:
             # 检查是否已有登录对话框显示
             if self.login_dialog_visible:
                 return
@@ -2117,7 +3428,7 @@ N网,https://www.nexusmods.com/,username1,password1
             layout = QVBoxLayout(login_dialog)
             
             form_layout = QFormLayout()
-            password_label = QLabel("主密码：")
+            password_label = QLabel(self.login_prompt_text())
             password_edit = QLineEdit()
             password_edit.setEchoMode(QLineEdit.EchoMode.Password)
             form_layout.addRow(password_label, password_edit)
@@ -2147,6 +3458,7 @@ N网,https://www.nexusmods.com/,username1,password1
             # 回车键登录
             password_edit.returnPressed.connect(lambda: self.login(password_edit.text(), login_dialog))
             
+            self.start_prefetch()
             try:
                 result = login_dialog.exec()
                 if result != QDialog.DialogCode.Accepted:
@@ -2167,17 +3479,17 @@ N网,https://www.nexusmods.com/,username1,password1
             if self.windowState() & Qt.WindowState.WindowMinimized:
                 # 最小化到托盘并立即锁定
                 print("[DEBUG] 窗口最小化，lock_on_minimize:", self.settings.get("lock_on_minimize", True))
-                print("[DEBUG] master_password 存在:", bool(self.master_password))
+                print("[DEBUG] 已登录:", self.session is not None)
                 
                 # 只有在启用了最小化锁定选项时才立即锁定
-                if self.master_password and self.settings.get("lock_on_minimize", True):
+                if self.session is not None and self.settings.get("lock_on_minimize", True):
                     print("[DEBUG] 执行锁定操作")
                     # 立即锁定，不等待定时器
                     self.lock_app(show_login=False)  # 最小化时不立即显示登录框，等用户点击托盘图标时再显示
                 else:
                     # 如果没启用锁定，只是隐藏到托盘
                     self.hide()
-            elif self.isVisible() and self.master_password:
+            elif self.isVisible() and self.session is not None:
                 # 窗口恢复可见时重置定时器
                 self.reset_lock_timer()
     
@@ -2198,7 +3510,7 @@ N网,https://www.nexusmods.com/,username1,password1
     
     def reset_lock_timer(self):
         """重置自动锁定定时器"""
-        if self.master_password:  # 只有在登录状态下才重置定时器
+        if self.session is not None:  # 只有在登录状态下才重置定时器
             # 只有在窗口可见且启用了自动锁定时才重置定时器
             if self.isVisible() and self.settings.get("enable_auto_lock", True) and self.settings.get("auto_lock_time", 5) > 0:
                 self.lock_timer.start()
@@ -2225,7 +3537,9 @@ N网,https://www.nexusmods.com/,username1,password1
             event.ignore()
     
     def verify_master_password(self, password):
-        """验证主密码"""
+        """验证主密码（已登录时只与会话密钥比较，不再读取和解密数据库）"""
+        if self.session is not None:
+            return self.crypto_manager.verify_session_password(self.session, password)
         return self.crypto_manager.verify_master_password(self.db_file, password)
     
     def export_passwords(self):
@@ -2238,8 +3552,8 @@ N网,https://www.nexusmods.com/,username1,password1
         try:
             # 准备导出数据
             export_data = []
-            for entry_id in self.entries_order:
-                entry = self.entries[entry_id]
+            for entry in self.vault.snapshot().ordered_entries():
+                entry = self.reveal_entry(entry)
                 export_data.append({
                     "website_name": entry["website_name"],
                     "url": entry["url"],
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+PIN 快速解锁
+
+自动锁定（或最小化锁定）时，会话数据密钥用短 PIN 派生的密钥包裹，
+条目快照用会话密钥加密，二者只保存在内存中；PIN 派生参数很低，
+重新解锁只需几毫秒，不再运行主密码的 Argon2，也不再读取和解密数据库文件。
+
+PIN 的强度远低于主密码，因此只允许少量尝试，并且有最长有效期：
+尝试次数用完或超过有效期后清除内存中的状态，只能用主密码解锁。
+PIN 只能是数字，登录框中的输入只有看起来像 PIN 时才按 PIN 验证，
+输错的主密码不会消耗 PIN 的尝试次数。
+"""
+
+import json
+import time
+
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+from crypto import LEGACY_KDF_PARAMS, VaultSession
+
+# PIN 派生密钥使用的 Argon2 参数（只需抵抗界面上的少量尝试，取很低的成本）
+QUICK_UNLOCK_KDF_PARAMS = {**LEGACY_KDF_PARAMS, "time_cost": 1, "memory_cost": 8192, "parallelism": 1}
+# 包裹数据密钥和加密条目快照时使用的关联数据
+QUICK_UNLOCK_KEY_AAD = b"local-password-manager/quick-unlock-key/v1"
+QUICK_UNLOCK_SNAPSHOT_AAD = b"local-password-manager/quick-unlock-snapshot/v1"
+# 默认允许的 PIN 尝试次数和有效期（分钟）
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_LIFETIME_MINUTES = 60
+MIN_PIN_LENGTH = 4
+MAX_PIN_LENGTH = 8
+
+
+def is_pin(text: str) -> bool:
+    """输入看起来像 PIN（4 到 8 位数字）"""
+    return MIN_PIN_LENGTH <= len(text) <= MAX_PIN_LENGTH and text.isascii() and text.isdigit()
+
+
+class QuickUnlock:
+    """锁定期间保存在内存中的快速解锁状态
+
+    设置 PIN 后保留 PIN 派生的密钥，锁定时用它包裹会话数据密钥后立即清除；
+    用 PIN 解锁成功后重新保留派生密钥，下次锁定时继续使用。
+    """
+
+    def __init__(self, crypto_manager, max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+                 lifetime_minutes: int = DEFAULT_LIFETIME_MINUTES):
+        self.crypto_manager = crypto_manager
+        self.max_attempts = max_attempts
+        self.lifetime_minutes = lifetime_minutes
+        self._salt = None
+        self._pin_key = None
+        self._locked = None
+        self.attempts_left = 0
+        self.expires_at = 0.0
+
+    @property
+    def armed(self) -> bool:
+        """已设置 PIN，锁定时可以保存快速解锁状态"""
+        return self._pin_key is not None
+
+    @property
+    def available(self) -> bool:
+        """当前处于锁定状态，且可以用 PIN 解锁"""
+        if self._locked is None:
+            return False
+        if self.attempts_left <= 0 or time.time() > self.expires_at:
+            self.clear()
+            return False
+        return True
+
+    def _derive(self, pin: str, salt: bytes) -> bytearray:
+        return bytearray(self.crypto_manager.derive_key(pin, salt, QUICK_UNLOCK_KDF_PARAMS))
+
+    def set_pin(self, pin: str) -> None:
+        """设置 PIN（已解锁时调用）"""
+        if not is_pin(pin):
+            raise Exception(f"PIN 需要 {MIN_PIN_LENGTH} 到 {MAX_PIN_LENGTH} 位数字")
+        self.clear()
+        self._salt = self.crypto_manager.generate_salt()
+        self._pin_key = self._derive(pin, self._salt)
+
+    def lock(self, session: VaultSession, entries: dict, entries_order: list) -> bool:
+        """锁定时保存快速解锁状态，返回是否已保存（未设置 PIN 时返回 False）"""
+        if self._pin_key is None or session is None or not session.active:
+            return False
+        wrap_nonce = self.crypto_manager.generate_nonce()
+        wrapped_key = AESGCM(bytes(self._pin_key)).encrypt(wrap_nonce, bytes(session._key), QUICK_UNLOCK_KEY_AAD)
+        snapshot_nonce = self.crypto_manager.generate_nonce()
+        snapshot = session.aead.encrypt(
+            snapshot_nonce,
+            json.dumps({"entries": dict(entries), "entries_order": list(entries_order)}, ensure_ascii=False).encode('utf-8'),
+            QUICK_UNLOCK_SNAPSHOT_AAD)
+        # 文件头字段不含秘密，原样保留，解锁后重建同一个会话
+        header = {
+            "salt": session.salt, "wrap_nonce": session.wrap_nonce, "wrapped_key": session.wrapped_key,
+            "key_check": session.key_check, "kdf_params": dict(session.kdf_params), "cipher": session.cipher
+        }
+        self._locked = (wrap_nonce, wrapped_key, snapshot_nonce, snapshot, header)
+        self._wipe_pin_key()
+        self.attempts_left = self.max_attempts
+        self.expires_at = time.time() + self.lifetime_minutes * 60
+        return True
+
+    def unlock(self, pin: str) -> tuple[dict, list, VaultSession]:
+        """用 PIN 解锁，返回条目、条目顺序和会话密钥
+
+        PIN 错误时减少剩余尝试次数并抛出异常；次数用完或超过有效期后状态被清除。
+        """
+        if not self.available:
+            raise Exception("快速解锁已失效，请使用主密码解锁")
+        wrap_nonce, wrapped_key, snapshot_nonce, snapshot, header = self._locked
+        pin_key = self._derive(pin, self._salt)
+        try:
+            data_key = AESGCM(bytes(pin_key)).decrypt(wrap_nonce, wrapped_key, QUICK_UNLOCK_KEY_AAD)
+        except Exception:
+            for i in range(len(pin_key)):
+                pin_key[i] = 0
+            self.attempts_left -= 1
+            if self.attempts_left <= 0:
+                self.clear()
+                raise Exception("PIN 错误次数过多，请使用主密码解锁")
+            raise Exception(f"PIN 不正确，还可以尝试 {self.attempts_left} 次")
+
+        session = VaultSession(data_key, header["salt"], header["wrap_nonce"], header["wrapped_key"],
+                               key_check=header["key_check"], kdf_params=header["kdf_params"],
+                               cipher=header["cipher"])
+        payload = json.loads(session.aead.decrypt(snapshot_nonce, snapshot, QUICK_UNLOCK_SNAPSHOT_AAD))
+        self._locked = None
+        self._pin_key = pin_key
+        return payload["entries"], payload["entries_order"], session
+
+    def _wipe_pin_key(self) -> None:
+        if self._pin_key is not None:
+            for i in range(len(self._pin_key)):
+                self._pin_key[i] = 0
+        self._pin_key = None
+
+    def clear(self) -> None:
+        """清除 PIN 和锁定期间保存的状态（关闭快速解锁或回退到主密码解锁时调用）"""
+        self._wipe_pin_key()
+        self._salt = None
+        self._locked = None
+        self.attempts_left = 0
+        self.expires_at = 0.0
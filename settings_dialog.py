@@ -1,11 +1,13 @@
 from PyQt6.QtWidgets import (QDialog, QWidget, QVBoxLayout, QHBoxLayout, QLabel,
                              QSpinBox, QCheckBox, QPushButton, QLineEdit,
                              QGroupBox, QGridLayout, QTabWidget, QMessageBox,
-                             QRadioButton, QButtonGroup)
-from PyQt6.QtCore import Qt
+                             QRadioButton, QButtonGroup, QComboBox, QProgressDialog)
+from PyQt6.QtCore import Qt, pyqtSignal
 from PyQt6.QtGui import QKeySequence
+from concurrent.futures import ThreadPoolExecutor
 import json
 import os
+import threading
 import base64
 import hashlib
 import smtplib
@@ -15,11 +17,74 @@ import secrets
 import string
 from datetime import datetime, timedelta
 
+from vault_backup import DEFAULT_BACKUP_DIR, DEFAULT_RETENTION
+
+
+def default_settings() -> dict:
+    """默认设置（设置对话框和主窗口共用，每次返回新的字典）"""
+    return {
+        "auto_lock_time": 5,  # 分钟
+        "lock_on_minimize": True,
+        "theme": "light",
+        "email": "",
+        "email_password": "",  # 加密存储
+        "floating_window_shortcut": "Ctrl+Shift+X",  # 悬浮窗口快捷键
+        "enable_auto_lock": True,  # 是否启用自动锁定（默认为启用）
+        "kdf_params": None,  # 密钥派生参数（None 表示使用默认参数）
+        "unlock_budget_ms": 500,  # 解锁耗时预算（毫秒）
+        "compression": None,  # 数据库压缩算法和级别（None 表示不压缩）
+        "storage_backend": "file",  # 存储引擎（file 加密文件 / sqlite）
+        "cipher": None,  # 新数据库的加密算法（None 表示新建时测速选择）
+        "quick_unlock": False,  # 自动锁定后允许用 PIN 快速解锁
+        "quick_unlock_minutes": 60,  # PIN 快速解锁的有效期（分钟）
+        "quick_unlock_attempts": 3,  # PIN 允许尝试的次数
+        "backup_enabled": True,  # 定时增量备份加密的数据库文件
+        "backup_interval_hours": 1,  # 备份间隔（小时）
+        "backup_dir": DEFAULT_BACKUP_DIR,  # 备份目录（相对路径按数据库所在目录计算）
+        "backup_retention": dict(DEFAULT_RETENTION),  # 按小时/天/周保留的备份个数
+        "sync_folder": ""  # 上次同步的文件夹
+    }
+
+
+def save_to_settings(values: dict, settings_file: str = "settings.json") -> None:
+    """把若干设置项写入设置文件（保留其他设置项原样）"""
+    settings = {}
+    if os.path.exists(settings_file):
+        with open(settings_file, 'r', encoding='utf-8') as f:
+            settings = json.load(f)
+    settings.update(values)
+    with open(settings_file, 'w', encoding='utf-8') as f:
+        json.dump(settings, f, ensure_ascii=False, indent=2)
+
+
 class SettingsDialog(QDialog):
+    # 校准线程每测量一个候选发出一次，参数为测量结果，在界面线程中处理
+    calibration_progress = pyqtSignal(object)
+    # 校准线程结束时发出，参数为 (future, 耗时预算)，在界面线程中处理
+    calibration_finished = pyqtSignal(object)
+    # 数据库压缩选项：(显示文本, 压缩参数)
+    COMPRESSION_OPTIONS = [
+        ("不压缩", {"name": "none", "level": 0}),
+        ("zlib 快速", {"name": "zlib", "level": 1}),
+        ("zlib 标准", {"name": "zlib", "level": 6}),
+        ("lzma 最小文件（保存较慢）", {"name": "lzma", "level": 6})
+    ]
+    # 存储引擎选项：(显示文本, 设置值)
+    STORAGE_BACKEND_OPTIONS = [
+        ("加密文件", "file"),
+        ("SQLite（逐条加密）", "sqlite")
+    ]
+    # 新数据库的加密算法选项：(显示文本, 算法名称)
+    CIPHER_OPTIONS = [
+        ("自动（新建时测速选择）", None),
+        ("AES-256-GCM", "aes-256-gcm"),
+        ("ChaCha20-Poly1305", "chacha20-poly1305")
+    ]
+    
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setWindowTitle("设置")
-        self.setFixedSize(500, 400)
+        self.setFixedSize(500, 640)
         self.setModal(True)
 
         self.settings_file = "settings.json"
@@ -28,6 +93,13 @@ class SettingsDialog(QDialog):
         self.settings = self.load_settings()
         self.verification_code = ""
         self.code_expiry = None
+        # 参数校准会分配最多 1 GiB 内存并持续数秒，放在后台线程中执行
+        self.calibration_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="KdfCalibration")
+        self.calibration_future = None
+        self.calibration_cancel = threading.Event()
+        self.calibration_dialog = None
+        self.calibration_progress.connect(self.on_calibration_progress)
+        self.calibration_finished.connect(self.on_calibration_finished)
 
         self.init_ui()
 
@@ -61,28 +133,20 @@ class SettingsDialog(QDialog):
 
     def load_settings(self) -> dict:
         """加载设置"""
-        default_settings = {
-            "auto_lock_time": 5,  # 分钟
-            "lock_on_minimize": True,
-            "theme": "light",
-            "email": "",
-            "email_password": "",  # 加密存储
-            "floating_window_shortcut": "Ctrl+Shift+X",  # 悬浮窗口快捷键
-            "enable_auto_lock": True  # 是否启用自动锁定（默认为启用）
-        }
+        default = default_settings()
 
         if os.path.exists(self.settings_file):
             try:
                 with open(self.settings_file, 'r', encoding='utf-8') as f:
                     loaded = json.load(f)
-                    settings = {**default_settings, **loaded}
+                    settings = {**default, **loaded}
                     # 解密邮箱授权码
                     if settings.get("email_password"):
                         settings["email_password"] = self._decrypt_password(settings["email_password"])
                     return settings
             except:
-                return default_settings
-        return default_settings
+                return default
+        return default
 
     def save_settings(self):
         """保存设置（加密邮箱授权码）"""
@@ -171,6 +235,21 @@ class SettingsDialog(QDialog):
         self.lock_on_minimize_check.setChecked(self.settings["lock_on_minimize"])
         lock_layout.addWidget(self.lock_on_minimize_check)
         
+        # PIN 快速解锁（锁定后在有效期内可以用 PIN 解锁，PIN 只保存在内存中）
+        quick_layout = QHBoxLayout()
+        self.quick_unlock_check = QCheckBox("锁定后允许用 PIN 快速解锁，有效期：")
+        self.quick_unlock_check.setChecked(self.settings.get("quick_unlock", False))
+        self.quick_unlock_spinbox = QSpinBox()
+        self.quick_unlock_spinbox.setRange(1, 24 * 60)
+        self.quick_unlock_spinbox.setValue(self.settings.get("quick_unlock_minutes", 60))
+        self.quick_unlock_spinbox.setEnabled(self.quick_unlock_check.isChecked())
+        self.quick_unlock_check.toggled.connect(self.quick_unlock_spinbox.setEnabled)
+        quick_layout.addWidget(self.quick_unlock_check)
+        quick_layout.addWidget(self.quick_unlock_spinbox)
+        quick_layout.addWidget(QLabel("分钟"))
+        quick_layout.addStretch()
+        lock_layout.addLayout(quick_layout)
+        
         lock_group.setLayout(lock_layout)
         layout.addWidget(lock_group)
         
@@ -204,9 +283,198 @@ class SettingsDialog(QDialog):
         password_group.setLayout(password_layout)
         layout.addWidget(password_group)
         
+        # 密钥派生参数
+        kdf_group = QGroupBox("密钥派生参数")
+        kdf_layout = QVBoxLayout()
+        
+        self.kdf_params_label = QLabel()
+        self.update_kdf_params_label()
+        kdf_layout.addWidget(self.kdf_params_label)
+        
+        budget_layout = QHBoxLayout()
+        budget_label = QLabel("解锁耗时预算：")
+        self.unlock_budget_spinbox = QSpinBox()
+        self.unlock_budget_spinbox.setRange(100, 5000)
+        self.unlock_budget_spinbox.setSingleStep(100)
+        self.unlock_budget_spinbox.setValue(self.settings["unlock_budget_ms"])
+        budget_unit = QLabel("毫秒")
+        self.calibrate_kdf_btn = QPushButton("自动校准")
+        self.calibrate_kdf_btn.clicked.connect(self.calibrate_kdf_params)
+        budget_layout.addWidget(budget_label)
+        budget_layout.addWidget(self.unlock_budget_spinbox)
+        budget_layout.addWidget(budget_unit)
+        budget_layout.addStretch()
+        budget_layout.addWidget(self.calibrate_kdf_btn)
+        kdf_layout.addLayout(budget_layout)
+        
+        kdf_group.setLayout(kdf_layout)
+        layout.addWidget(kdf_group)
+        
+        # 存储引擎、压缩（先压缩后加密，下次保存时生效）和新数据库的加密算法
+        storage_group = QGroupBox("数据库存储")
+        storage_group_layout = QVBoxLayout()
+        storage_layout = QHBoxLayout()
+        storage_layout.addWidget(QLabel("存储引擎："))
+        self.storage_backend_combo = QComboBox()
+        for text, backend in self.STORAGE_BACKEND_OPTIONS:
+            self.storage_backend_combo.addItem(text, backend)
+        index = self.storage_backend_combo.findData(self.settings.get("storage_backend", "file"))
+        self.storage_backend_combo.setCurrentIndex(max(index, 0))
+        self.storage_backend_combo.setToolTip("切换后当前数据库会立即转换，主密码不变")
+        storage_layout.addWidget(self.storage_backend_combo)
+        storage_layout.addWidget(QLabel("压缩："))
+        self.compression_combo = QComboBox()
+        for text, compression in self.COMPRESSION_OPTIONS:
+            self.compression_combo.addItem(text, compression)
+        current = self.settings.get("compression") or {"name": "none", "level": 0}
+        for i, (text, compression) in enumerate(self.COMPRESSION_OPTIONS):
+            if compression == current:
+                self.compression_combo.setCurrentIndex(i)
+        self.compression_combo.setToolTip("只用于加密文件存储")
+        storage_layout.addWidget(self.compression_combo)
+        storage_layout.addStretch()
+        storage_group_layout.addLayout(storage_layout)
+        
+        cipher_layout = QHBoxLayout()
+        cipher_layout.addWidget(QLabel("新数据库加密算法："))
+        self.cipher_combo = QComboBox()
+        for text, cipher in self.CIPHER_OPTIONS:
+            self.cipher_combo.addItem(text, cipher)
+        self.cipher_combo.setCurrentIndex(max(self.cipher_combo.findData(self.settings.get("cipher")), 0))
+        self.cipher_combo.setToolTip("已有数据库继续使用文件头中记录的算法")
+        cipher_layout.addWidget(self.cipher_combo)
+        cipher_layout.addStretch()
+        self.benchmark_cipher_btn = QPushButton("测速")
+        self.benchmark_cipher_btn.clicked.connect(self.benchmark_ciphers)
+        cipher_layout.addWidget(self.benchmark_cipher_btn)
+        storage_group_layout.addLayout(cipher_layout)
+        
+        # 定时备份（增量备份加密的数据库文件，菜单 备份 → 从备份恢复）
+        backup_layout = QHBoxLayout()
+        self.backup_check = QCheckBox("定时备份数据库，间隔：")
+        self.backup_check.setChecked(self.settings.get("backup_enabled", True))
+        self.backup_spinbox = QSpinBox()
+        self.backup_spinbox.setRange(1, 7 * 24)
+        self.backup_spinbox.setValue(self.settings.get("backup_interval_hours", 1))
+        self.backup_spinbox.setEnabled(self.backup_check.isChecked())
+        self.backup_check.toggled.connect(self.backup_spinbox.setEnabled)
+        backup_layout.addWidget(self.backup_check)
+        backup_layout.addWidget(self.backup_spinbox)
+        backup_layout.addWidget(QLabel("小时"))
+        backup_layout.addStretch()
+        storage_group_layout.addLayout(backup_layout)
+        
+        storage_group.setLayout(storage_group_layout)
+        layout.addWidget(storage_group)
+        
         layout.addStretch()
         self.security_tab.setLayout(layout)
     
+    def update_kdf_params_label(self):
+        """显示当前的密钥派生参数"""
+        from crypto import default_kdf_params
+        params = self.settings.get("kdf_params") or default_kdf_params()
+        source = "已校准" if self.settings.get("kdf_params") else "默认"
+        self.kdf_params_label.setText(
+            f"当前参数（{source}）：迭代 {params['time_cost']} 次，"
+            f"内存 {params['memory_cost'] // 1024} MiB，并行 {params['parallelism']}")
+    
+    def calibrate_kdf_params(self):
+        """在校准线程中测量 Argon2 耗时，选出解锁耗时预算内强度最高的参数"""
+        from kdf_calibration import calibrate_kdf
+        
+        if self.calibration_future is not None and not self.calibration_future.done():
+            return
+        target_ms = self.unlock_budget_spinbox.value()
+        self.calibration_cancel.clear()
+        self.calibrate_kdf_btn.setEnabled(False)
+        
+        # 候选数量取决于测量结果，进度框只显示正在测量的参数
+        self.calibration_dialog = QProgressDialog("正在测量密钥派生耗时…", "取消", 0, 0, self)
+        self.calibration_dialog.setWindowTitle("自动校准")
+        self.calibration_dialog.setWindowModality(Qt.WindowModality.WindowModal)
+        self.calibration_dialog.setMinimumDuration(0)
+        self.calibration_dialog.canceled.connect(self.cancel_calibration)
+        self.calibration_dialog.show()
+        
+        self.calibration_future = self.calibration_executor.submit(
+            calibrate_kdf, target_ms, progress=self.report_calibration_progress)
+        self.calibration_future.add_done_callback(
+            lambda future: self.calibration_finished.emit((future, target_ms)))
+    
+    def report_calibration_progress(self, result):
+        """校准线程的进度回调：转发到界面线程，取消后中止校准"""
+        from kdf_calibration import CalibrationCancelled
+        
+        if self.calibration_cancel.is_set():
+            raise CalibrationCancelled()
+        self.calibration_progress.emit(result)
+    
+    def on_calibration_progress(self, result):
+        """在进度框中显示最近测量的参数"""
+        if self.calibration_dialog is not None:
+            self.calibration_dialog.setLabelText(
+                f"正在测量密钥派生耗时…\n迭代 {result['time_cost']} 次，内存 {result['memory_cost'] // 1024} MiB，"
+                f"并行 {result['parallelism']}：{result['elapsed_ms']:.0f} 毫秒")
+    
+    def cancel_calibration(self):
+        """取消校准：当前候选测量完成后停止"""
+        self.calibration_cancel.set()
+        if self.calibration_dialog is not None:
+            self.calibration_dialog.setLabelText("正在取消…")
+    
+    def on_calibration_finished(self, result):
+        """显示校准结果并选用新参数"""
+        from kdf_calibration import CalibrationCancelled, format_results
+        
+        future, target_ms = result
+        if self.calibration_dialog is not None:
+            self.calibration_dialog.canceled.disconnect(self.cancel_calibration)
+            self.calibration_dialog.close()
+            self.calibration_dialog = None
+        self.calibrate_kdf_btn.setEnabled(True)
+        if self.calibration_cancel.is_set():
+            # 已取消或对话框已关闭，丢弃结果
+            return
+        try:
+            params, results = future.result()
+        except CalibrationCancelled:
+            return
+        except Exception as e:
+            QMessageBox.critical(self, "错误", f"校准失败：{str(e)}")
+            return
+        
+        msg_box = QMessageBox(self)
+        msg_box.setWindowTitle("校准结果")
+        msg_box.setText(f"已选出解锁耗时约 {target_ms} 毫秒内强度最高的参数，保存设置后生效。")
+        msg_box.setDetailedText(format_results(results, params))
+        msg_box.setIcon(QMessageBox.Icon.Information)
+        msg_box.exec()
+        
+        self.settings["kdf_params"] = params
+        self.update_kdf_params_label()
+    
+    def done(self, result):
+        """关闭对话框时中止仍在进行的校准"""
+        self.calibration_cancel.set()
+        self.calibration_executor.shutdown(wait=False)
+        super().done(result)
+    
+    def benchmark_ciphers(self):
+        """在本机测量各加密算法的速度，选中更快的算法"""
+        from cipher_benchmark import benchmark_ciphers, select_cipher, format_results
+        
+        results = benchmark_ciphers()
+        selected = select_cipher(results)
+        self.cipher_combo.setCurrentIndex(max(self.cipher_combo.findData(selected), 0))
+        
+        msg_box = QMessageBox(self)
+        msg_box.setWindowTitle("测速结果")
+        msg_box.setText(f"本机上 {selected} 更快，已选中，保存设置后用于新建的数据库。")
+        msg_box.setDetailedText(format_results(results, selected))
+        msg_box.setIcon(QMessageBox.Icon.Information)
+        msg_box.exec()
+    
     def init_appearance_tab(self):
         """初始化外观设置标签页"""
         layout = QVBoxLayout()
@@ -576,6 +844,14 @@ class SettingsDialog(QDialog):
         self.settings["enable_auto_lock"] = self.enable_auto_lock_check.isChecked()
         self.settings["auto_lock_time"] = self.idle_spinbox.value()
         self.settings["lock_on_minimize"] = self.lock_on_minimize_check.isChecked()
+        self.settings["quick_unlock"] = self.quick_unlock_check.isChecked()
+        self.settings["quick_unlock_minutes"] = self.quick_unlock_spinbox.value()
+        self.settings["unlock_budget_ms"] = self.unlock_budget_spinbox.value()
+        self.settings["compression"] = self.compression_combo.currentData()
+        self.settings["storage_backend"] = self.storage_backend_combo.currentData()
+        self.settings["cipher"] = self.cipher_combo.currentData()
+        self.settings["backup_enabled"] = self.backup_check.isChecked()
+        self.settings["backup_interval_hours"] = self.backup_spinbox.value()
         
         # 更新主题
         if self.light_theme_radio.isChecked():
@@ -596,6 +872,8 @@ class SettingsDialog(QDialog):
     def import_txt_to_database(self):
         """导入TXT文件到数据库"""
         from PyQt6.QtWidgets import QFileDialog
+        if hasattr(self.parent(), 'ensure_writable') and not self.parent().ensure_writable():
+            return
         import uuid
         from datetime import datetime
         
@@ -628,6 +906,7 @@ class SettingsDialog(QDialog):
             success_count = 0
             error_count = 0
             error_reasons = []
+            imported_ids = []
             
             for website in websites:
                 try:
@@ -650,6 +929,7 @@ class SettingsDialog(QDialog):
                     if hasattr(self.parent(), 'entries') and hasattr(self.parent(), 'entries_order'):
                         self.parent().entries[entry_id] = entry
                         self.parent().entries_order.append(entry_id)
+                        imported_ids.append(entry_id)
                         success_count += 1
                     else:
                         raise Exception("无法访问数据库")
@@ -658,9 +938,9 @@ class SettingsDialog(QDialog):
                     error_count += 1
                     error_reasons.append(str(e))
             
-            # 保存数据库
+            # 保存数据库（只追加导入的条目）
             if hasattr(self.parent(), 'save_db'):
-                self.parent().save_db()
+                self.parent().save_db(changed=imported_ids)
             
             # 4. 操作反馈
             if error_count == 0:
@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SQLite 存储引擎
+
+与 CryptoManager 相同的加载/保存接口，数据存放在本地 SQLite 文件中：
+每个条目一行，用数据密钥单独做 AEAD 加密（条目 id 作为关联数据），
+条目顺序同样逐行加密存放。添加、修改、删除和批量导入都是单个事务内的行写入，
+只加载一页条目时无需解密整个数据库。
+
+主密码相关的文件头（密钥派生参数、salt、包裹后的数据密钥、密钥校验值）与
+加密文件格式完全相同，同一个会话密钥可以在两种存储之间直接转换。
+"""
+
+import json
+import os
+import sqlite3
+import struct
+import time
+from contextlib import closing
+
+from crypto import AEAD, CryptoManager, MERKLE_AAD, VaultSession, VAULT_FORMAT_VERSION
+
+# SQLite 文件开头的固定标识
+SQLITE_MAGIC = b"SQLite format 3\x00"
+# 条目和顺序密文的关联数据前缀（后接条目 id），密文无法被挪到其他条目上
+ENTRY_AAD = b"local-password-manager/sqlite-entry/v1:"
+POSITION_AAD = b"local-password-manager/sqlite-position/v1:"
+POSITION = struct.Struct(">Q")
+# Merkle 树（vault_merkle）保存在 meta 表中；之后逐行写入的条目 id 记入 merkle_changed，
+# 超过此数量时由写入线程重新计算树
+MERKLE_SQLITE_AAD = MERKLE_AAD + b"sqlite"
+MERKLE_CHANGED_LIMIT = 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    id TEXT PRIMARY KEY,
+    nonce BLOB NOT NULL,
+    ciphertext BLOB NOT NULL,
+    position_nonce BLOB NOT NULL,
+    position BLOB NOT NULL
+);
+"""
+
+
+def is_sqlite_vault(file_path: str) -> bool:
+    """判断文件是否为 SQLite 数据库"""
+    try:
+        with open(file_path, 'rb') as f:
+            return f.read(len(SQLITE_MAGIC)) == SQLITE_MAGIC
+    except OSError:
+        return False
+
+
+def is_file_vault(file_path: str) -> bool:
+    """判断路径是否为已有的加密文件（存在、非空且不是 SQLite 数据库）"""
+    try:
+        return os.path.getsize(file_path) > 0 and not is_sqlite_vault(file_path)
+    except OSError:
+        return False
+
+
+class SQLiteCryptoManager(CryptoManager):
+    """SQLite 存储引擎（密钥派生、会话密钥和文件头逻辑沿用 CryptoManager）
+
+    不是 SQLite 文件的路径（加密文件格式）交给父类处理，因此加密文件仍可直接解锁、导入和保存；
+    不存在的路径新建为 SQLite 数据库。
+    """
+
+    def _connect(self, file_path: str) -> sqlite3.Connection:
+        """打开数据库：WAL 模式，每次提交都同步到磁盘"""
+        conn = sqlite3.connect(file_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=FULL")
+        conn.executescript(SCHEMA)
+        return conn
+
+    def _read_meta(self, conn: sqlite3.Connection) -> dict:
+        """读取文件头字段"""
+        row = conn.execute("SELECT value FROM meta WHERE key = 'header'").fetchone()
+        if row is None:
+            raise Exception("数据库文件头不存在")
+        return {**json.loads(row[0]), "version": VAULT_FORMAT_VERSION}
+
+    def _write_meta(self, conn: sqlite3.Connection, session: VaultSession) -> None:
+        """写入文件头字段"""
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('header', ?)",
+                     (json.dumps(self._header_fields(session)),))
+
+    def _check_session(self, conn: sqlite3.Connection, session: VaultSession) -> None:
+        """确认数据库仍由当前会话的数据密钥加密"""
+        header = self._parse_header(self._read_meta(conn))
+        if header["wrapped_key"] != session.wrapped_key:
+            raise Exception("数据库已被替换，请重新登录")
+
+    def _next_position(self, conn: sqlite3.Connection) -> int:
+        row = conn.execute("SELECT value FROM meta WHERE key = 'next_position'").fetchone()
+        return int(row[0]) if row else 0
+
+    def _set_next_position(self, conn: sqlite3.Connection, position: int) -> None:
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('next_position', ?)", (str(position),))
+
+    def _merkle_changed(self, conn: sqlite3.Connection) -> set:
+        row = conn.execute("SELECT value FROM meta WHERE key = 'merkle_changed'").fetchone()
+        return set(json.loads(row[0])) if row else set()
+
+    def _write_merkle(self, conn: sqlite3.Connection, aead: AEAD, data: dict) -> None:
+        """写入条目的 Merkle 树，清空之后变更的条目 id"""
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('merkle', ?)",
+                     (self._seal_merkle(aead, self.merkle_tree(data), MERKLE_SQLITE_AAD),))
+        conn.execute("DELETE FROM meta WHERE key = 'merkle_changed'")
+
+    def _seal(self, aead: AEAD, plaintext: bytes, aad: bytes) -> tuple[bytes, bytes]:
+        nonce = self.generate_nonce()
+        return nonce, aead.encrypt(nonce, plaintext, aad)
+
+    def _seal_entry(self, aead: AEAD, entry_id: str, entry: dict) -> tuple[bytes, bytes]:
+        """加密单个条目，条目 id 作为关联数据"""
+        plaintext = json.dumps(entry, ensure_ascii=False).encode('utf-8')
+        return self._seal(aead, plaintext, ENTRY_AAD + entry_id.encode('utf-8'))
+
+    def _seal_position(self, aead: AEAD, entry_id: str, position: int) -> tuple[bytes, bytes]:
+        """加密条目的排序位置"""
+        return self._seal(aead, POSITION.pack(position), POSITION_AAD + entry_id.encode('utf-8'))
+
+    def _open_position(self, aead: AEAD, entry_id: str, nonce: bytes, ciphertext: bytes) -> int:
+        return POSITION.unpack(aead.decrypt(nonce, ciphertext, POSITION_AAD + entry_id.encode('utf-8')))[0]
+
+    def _open_entry(self, aead: AEAD, entry_id: str, nonce: bytes, ciphertext: bytes) -> dict:
+        return json.loads(aead.decrypt(nonce, ciphertext, ENTRY_AAD + entry_id.encode('utf-8')))
+
+    def _select_rows(self, conn: sqlite3.Connection) -> list:
+        return conn.execute("SELECT id, nonce, ciphertext, position_nonce, position FROM entries").fetchall()
+
+    def _load_rows(self, rows: list, aead: AEAD) -> tuple[dict, list]:
+        """解密所有条目，按顺序列排序"""
+        data = {}
+        positions = []
+        try:
+            for entry_id, nonce, ciphertext, position_nonce, position in rows:
+                data[entry_id] = self._open_entry(aead, entry_id, nonce, ciphertext)
+                positions.append((self._open_position(aead, entry_id, position_nonce, position), entry_id))
+        except Exception:
+            raise Exception("解密失败，主密码可能不正确")
+        positions.sort()
+        return data, [entry_id for _, entry_id in positions]
+
+    def read_header(self, file_path: str) -> dict:
+        if not is_sqlite_vault(file_path):
+            return super().read_header(file_path)
+        with closing(self._connect(file_path)) as conn:
+            return self._parse_header(self._read_meta(conn))
+
+    def save_encrypted_db_with_session(self, file_path: str, session: VaultSession, data: dict, entries_order: list) -> None:
+        """在一个事务中写入完整的数据库（替换所有行）；已有的加密文件交给父类按文件格式保存"""
+        if is_file_vault(file_path):
+            return super().save_encrypted_db_with_session(file_path, session, data, entries_order)
+        aead = session.aead
+        # 与加密文件格式一样容忍条目顺序中的异常：跳过没有对应条目的 id 和重复的 id
+        entries_order = [entry_id for entry_id in dict.fromkeys(entries_order) if entry_id in data]
+        rows = []
+        for position, entry_id in enumerate(entries_order):
+            rows.append((entry_id, *self._seal_entry(aead, entry_id, data[entry_id]),
+                         *self._seal_position(aead, entry_id, position)))
+        with closing(self._connect(file_path)) as conn, conn:
+            conn.execute("DELETE FROM entries")
+            conn.executemany("INSERT INTO entries (id, nonce, ciphertext, position_nonce, position) "
+                             "VALUES (?, ?, ?, ?, ?)", rows)
+            self._write_meta(conn, session)
+            self._set_next_position(conn, len(entries_order))
+            self._write_merkle(conn, aead, data)
+        session.legacy = False
+
+    def load_encrypted_db_with_session(self, file_path: str, session: VaultSession) -> tuple[dict, list]:
+        if not is_sqlite_vault(file_path):
+            return super().load_encrypted_db_with_session(file_path, session)
+        with closing(self._connect(file_path)) as conn:
+            self._check_session(conn, session)
+            return self._load_rows(self._select_rows(conn), session.aead)
+
+    def load_page(self, file_path: str, session: VaultSession, offset: int, limit: int) -> tuple[dict, list, int]:
+        """只加载一页条目：解密全部顺序列（每行 8 字节），只解密这一页的条目
+
+        主窗口的表格、搜索和悬浮窗口需要全部条目，目前仍在解锁时解密所有行；此方法供性能测试使用。
+
+        Returns:
+            tuple: (这一页的条目, 这一页的条目 id 顺序, 条目总数)
+        """
+        aead = session.aead
+        with closing(self._connect(file_path)) as conn:
+            self._check_session(conn, session)
+            positions = sorted(
+                (self._open_position(aead, entry_id, nonce, ciphertext), entry_id)
+                for entry_id, nonce, ciphertext in conn.execute("SELECT id, position_nonce, position FROM entries"))
+            page_ids = [entry_id for _, entry_id in positions[offset:offset + limit]]
+            data = {}
+            placeholders = ",".join("?" * len(page_ids))
+            if page_ids:
+                for entry_id, nonce, ciphertext in conn.execute(
+                        f"SELECT id, nonce, ciphertext FROM entries WHERE id IN ({placeholders})", page_ids):
+                    data[entry_id] = self._open_entry(aead, entry_id, nonce, ciphertext)
+        return data, page_ids, len(positions)
+
+    def _vault_stamp(self, file_path: str) -> tuple:
+        """数据库文件和 WAL 文件的标记"""
+        return self._file_stamp(file_path), self._file_stamp(file_path + "-wal")
+
+    def vault_files(self, file_path: str) -> list:
+        """数据库文件和 WAL 文件"""
+        return [file_path, file_path + "-wal"]
+
+    def prefetch(self, file_path: str) -> dict:
+        """预读文件头和所有行的密文（不需要主密码）；加密文件格式交给父类处理"""
+        if not is_sqlite_vault(file_path):
+            return super().prefetch(file_path)
+        start = time.perf_counter()
+        with closing(self._connect(file_path)) as conn:
+            meta = self._read_meta(conn)
+            rows = self._select_rows(conn)
+        # 关闭最后一个连接时 SQLite 会把 WAL 写回主文件，关闭之后再记录文件标记
+        stamp = self._vault_stamp(file_path)
+        return {
+            "file_path": file_path, "stamp": stamp, "db": meta, "rows": rows,
+            "elapsed_ms": (time.perf_counter() - start) * 1000
+        }
+
+    def unlock_db(self, file_path: str, master_password: str, prefetched: dict = None) -> tuple[dict, list, VaultSession]:
+        """一次派生完成解锁；传入仍然有效的预读结果时不再查询数据库。加密文件格式交给父类处理"""
+        if not is_sqlite_vault(file_path):
+            return super().unlock_db(file_path, master_password, prefetched)
+        if self.prefetch_is_fresh(file_path, prefetched) and "rows" in prefetched:
+            meta, rows = prefetched["db"], prefetched["rows"]
+        else:
+            with closing(self._connect(file_path)) as conn:
+                meta, rows = self._read_meta(conn), self._select_rows(conn)
+        header = self._parse_header(meta)
+        wrapping_key = self.derive_key(master_password, header["salt"], header["kdf"])
+        self.check_key(wrapping_key, header["key_check"])
+        data_key = self.unwrap_key(wrapping_key, header["wrap_nonce"], header["wrapped_key"])
+        session = VaultSession(data_key, header["salt"], header["wrap_nonce"], header["wrapped_key"],
+                               key_check=header["key_check"], kdf_params=header["kdf"],
+                               cipher=header["cipher"])
+        try:
+            data, entries_order = self._load_rows(rows, session.aead)
+        except Exception:
+            session.wipe()
+            raise
+        return data, entries_order, session
+
+    def append_journal(self, file_path: str, session: VaultSession, records: list) -> None:
+        """在一个事务中按记录写入变更的行（put 新增或替换，delete 删除，order 重写顺序列）；加密文件格式交给父类处理"""
+        if is_file_vault(file_path):
+            return super().append_journal(file_path, session, records)
+        aead = session.aead
+        with closing(self._connect(file_path)) as conn, conn:
+            self._check_session(conn, session)
+            next_position = self._next_position(conn)
+            for record in records:
+                entry_id = record.get("id")
+                if record["op"] == "put":
+                    nonce, ciphertext = self._seal_entry(aead, entry_id, record["entry"])
+                    updated = conn.execute("UPDATE entries SET nonce = ?, ciphertext = ? WHERE id = ?",
+                                           (nonce, ciphertext, entry_id)).rowcount
+                    if not updated:
+                        conn.execute("INSERT INTO entries (id, nonce, ciphertext, position_nonce, position) "
+                                     "VALUES (?, ?, ?, ?, ?)",
+                                     (entry_id, nonce, ciphertext, *self._seal_position(aead, entry_id, next_position)))
+                        next_position += 1
+                elif record["op"] == "delete":
+                    conn.execute("DELETE FROM entries WHERE id = ?", (entry_id,))
+                elif record["op"] == "order":
+                    for position, order_id in enumerate(record["entries_order"]):
+                        conn.execute("UPDATE entries SET position_nonce = ?, position = ? WHERE id = ?",
+                                     (*self._seal_position(aead, order_id, position), order_id))
+                    next_position = max(next_position, len(record["entries_order"]))
+            self._set_next_position(conn, next_position)
+            changed = self._merkle_changed(conn)
+            changed.update(record["id"] for record in records if "id" in record)
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('merkle_changed', ?)",
+                         (json.dumps(sorted(changed)),))
+
+    def read_merkle(self, file_path: str, session: VaultSession) -> tuple:
+        """读取 meta 表中的 Merkle 树和之后变更的条目 id（不解密条目）；加密文件格式交给父类处理"""
+        if not is_sqlite_vault(file_path):
+            return super().read_merkle(file_path, session)
+        with closing(self._connect(file_path)) as conn:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'merkle'").fetchone()
+            if row is None:
+                return None, set()
+            return self._open_merkle(session.aead, row[0], MERKLE_SQLITE_AAD), self._merkle_changed(conn)
+
+    def journal_needs_compaction(self, file_path: str) -> bool:
+        """SQLite 自行维护 WAL；Merkle 树之后变更的条目过多时需要重新计算树"""
+        if not is_sqlite_vault(file_path):
+            return super().journal_needs_compaction(file_path)
+        with closing(self._connect(file_path)) as conn:
+            return len(self._merkle_changed(conn)) >= MERKLE_CHANGED_LIMIT
+
+    def compact_journal(self, file_path: str, session: VaultSession) -> None:
+        """重新计算有变更的 Merkle 树，并把 WAL 中的修改写回主文件（复制或导出数据库文件前调用）"""
+        if not is_sqlite_vault(file_path):
+            return super().compact_journal(file_path, session)
+        with closing(self._connect(file_path)) as conn:
+            if self._merkle_changed(conn):
+                self._check_session(conn, session)
+                data, _ = self._load_rows(self._select_rows(conn), session.aead)
+                with conn:
+                    self._write_merkle(conn, session.aead, data)
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def rewrite_header(self, file_path: str, session: VaultSession) -> None:
+        """更改主密码：只替换文件头中的包裹密钥，条目行保持不变"""
+        if not is_sqlite_vault(file_path):
+            return super().rewrite_header(file_path, session)
+        with closing(self._connect(file_path)) as conn, conn:
+            self._write_meta(conn, session)
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试 PIN 快速解锁（只在内存中保存状态、尝试次数限制、有效期、解锁耗时）
+"""
+
+import time
+
+from crypto import CryptoManager
+from quick_unlock import QuickUnlock, is_pin
+
+print("=" * 60)
+print("PIN 快速解锁测试")
+print("=" * 60)
+
+cm = CryptoManager()
+session = cm.create_session('master_password')
+entries = {'id1': {'id': 'id1', 'website_name': '示例网站', 'secret': 'c2VhbGVk'}}
+entries_order = ['id1']
+
+# 测试 1: 设置 PIN 后锁定，再用 PIN 解锁得到同一个数据密钥和条目
+print("\n[测试 1] 锁定与 PIN 解锁")
+print("-" * 60)
+quick = QuickUnlock(cm)
+assert not quick.lock(session, entries, entries_order), "未设置 PIN 时不应保存状态!"
+quick.set_pin('1234')
+assert quick.lock(session, entries, entries_order) and quick.available, "锁定后应可以快速解锁!"
+assert not quick.armed, "锁定后 PIN 派生的密钥应被清除!"
+start = time.perf_counter()
+data, order, restored = quick.unlock('1234')
+elapsed_ms = (time.perf_counter() - start) * 1000
+assert data == entries and order == entries_order, "快速解锁后的条目不匹配!"
+assert bytes(restored._key) == bytes(session._key), "快速解锁后的数据密钥不匹配!"
+assert restored.wrapped_key == session.wrapped_key and restored.cipher == session.cipher, "文件头字段不匹配!"
+assert quick.armed and not quick.available, "解锁后应保留 PIN，等待下次锁定!"
+print(f"✓ PIN 解锁耗时 {elapsed_ms:.1f} ms，数据密钥和条目与锁定前一致")
+
+# 测试 2: PIN 错误时减少尝试次数，用完后只能使用主密码
+print("\n[测试 2] 尝试次数限制")
+print("-" * 60)
+quick.lock(restored, entries, entries_order)
+for remaining in (2, 1):
+    try:
+        quick.unlock('0000')
+        raise AssertionError("错误的 PIN 解锁成功")
+    except AssertionError:
+        raise
+    except Exception as e:
+        assert str(remaining) in str(e), f"剩余次数提示不正确: {e}"
+try:
+    quick.unlock('0000')
+    raise AssertionError("错误的 PIN 解锁成功")
+except AssertionError:
+    raise
+except Exception:
+    pass
+assert not quick.available and not quick.armed, "尝试次数用完后状态应被清除!"
+try:
+    quick.unlock('1234')
+    raise AssertionError("状态清除后 PIN 仍然可以解锁")
+except AssertionError:
+    raise
+except Exception:
+    pass
+print("✓ 连续输错 3 次后清除状态，正确的 PIN 也不能再解锁")
+
+# 测试 3: 超过有效期后失效
+print("\n[测试 3] 有效期")
+print("-" * 60)
+quick.set_pin('1234')
+quick.lock(session, entries, entries_order)
+quick.expires_at = time.time() - 1
+assert not quick.available and not quick.armed, "超过有效期后状态应被清除!"
+print("✓ 超过有效期后只能使用主密码解锁")
+
+# 测试 4: PIN 只能是 4 到 8 位数字，主密码不会被当作 PIN
+print("\n[测试 4] PIN 格式")
+print("-" * 60)
+for invalid in ('12', '123456789', 'abcd', '12ab', '１２３４'):
+    try:
+        quick.set_pin(invalid)
+        raise AssertionError(f"无效的 PIN 被接受: {invalid}")
+    except AssertionError:
+        raise
+    except Exception:
+        pass
+assert is_pin('1234') and is_pin('12345678'), "有效的 PIN 未被识别!"
+assert not is_pin('master_password') and not is_pin('123456789'), "主密码被当作 PIN!"
+print("✓ 过短、过长或包含非数字的 PIN 被拒绝，主密码不会按 PIN 验证")
+session.wipe()
+restored.wipe()
+
+print("\n✅ PIN 快速解锁测试通过")
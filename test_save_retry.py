@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试后台保存：失败后修改不会丢失（重新提交到下一次保存、退出前重试），
+完整保存只统计变更的条目，没有变化时不写入
+"""
+
+import os
+import tempfile
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt6.QtWidgets import QApplication, QDialog, QMessageBox
+
+from main_window import MainWindow
+
+print("=" * 60)
+print("保存失败重试测试")
+print("=" * 60)
+
+app = QApplication.instance() or QApplication([])
+original_cwd = os.getcwd()
+original_exec = QMessageBox.exec
+original_setup = MainWindow.setup_first_run
+errors = []
+# 保存失败时的提示框不等待点击
+QMessageBox.exec = lambda self: errors.append(self.text()) or 0
+MainWindow.setup_first_run = lambda self: None
+
+
+def wait_for_failure(window, count):
+    """写入线程的失败信号排队到界面线程，处理事件直到收到"""
+    window.vault_writer.flush()
+    deadline = time.time() + 5
+    while len(errors) < count and time.time() < deadline:
+        app.processEvents()
+        time.sleep(0.01)
+    assert len(errors) == count, "没有收到保存失败的信号!"
+
+
+def fail_once(manager, name):
+    """让 manager 的下一次 name 调用失败"""
+    original = getattr(manager, name)
+
+    def failing(*args, **kwargs):
+        setattr(manager, name, original)
+        raise OSError("模拟磁盘已满")
+    setattr(manager, name, failing)
+
+
+with tempfile.TemporaryDirectory() as temp_dir:
+    os.chdir(temp_dir)
+    try:
+        window = MainWindow()
+        window.setup_master_password("test_password", "test_password", QDialog())
+        for i in range(3):
+            entry = {'id': f'id{i}', 'website_name': f'网站{i}', 'url': 'https://example.com', 'username': 'user',
+                     'password': f'pw{i}', 'note': '', 'created_at': '2026-01-01', 'updated_at': '2026-01-01'}
+            window.entries[entry['id']] = entry
+            window.entries_order.append(entry['id'])
+        window.save_db()
+        window.vault_writer.flush()
+
+        # 测试 1: 追加变更日志失败后，修改随下一次保存写入
+        print("\n[测试 1] 追加变更日志失败")
+        print("-" * 60)
+        fail_once(window.crypto_manager, "append_journal")
+        window.entries['id1'] = {**window.reveal_entry(window.entries['id1']), 'password': 'changed'}
+        window.save_db(changed=['id1'])
+        wait_for_failure(window, 1)
+        assert 'id1' in window.dirty_ids, "保存失败后没有保留修改!"
+        window.entries['id2'] = {**window.reveal_entry(window.entries['id2']), 'note': '另一个修改'}
+        window.save_db(changed=['id2'])
+        window.vault_writer.flush()
+        data, _ = window.crypto_manager.load_encrypted_db_with_session(window.db_file, window.session)
+        assert window.crypto_manager.reveal_entry(window.session, data['id1'])['password'] == 'changed', "修改丢失!"
+        assert data['id2']['note'] == '另一个修改' and not window.dirty_ids
+        print("✓ 保存失败的修改保留在待保存集合中，随下一次保存写入")
+
+        # 测试 2: 完整快照写入失败后，退出前重新写入完整快照
+        print("\n[测试 2] 完整快照写入失败")
+        print("-" * 60)
+        fail_once(window.crypto_manager, "save_encrypted_db_with_session")
+        del window.entries['id0']
+        window.entries_order.remove('id0')
+        window.save_db()
+        wait_for_failure(window, 2)
+        assert window.snapshot_unsaved, "完整快照写入失败后没有标记!"
+        window.save_pending_changes()
+        window.vault_writer.flush()
+        data, order = window.crypto_manager.load_encrypted_db_with_session(window.db_file, window.session)
+        assert 'id0' not in data and order == ['id1', 'id2'] and not window.snapshot_unsaved, order
+        print("✓ 完整快照写入失败后，退出或锁定前重新写入完整快照")
+
+        # 测试 3: 完整保存只统计变更的条目，内容没有变化时不写入
+        print("\n[测试 3] 完整保存的变更统计")
+        print("-" * 60)
+        requested = window.vault_writer.saves_requested
+        sealed = window.entries['id1']
+        revealed = window.reveal_entry(sealed)
+        window.remember_digest(revealed)
+        window.entries['id1'] = dict(revealed)
+        assert window.save_db() is False and window.vault_writer.saves_requested == requested, "没有变化时仍然写入!"
+        assert window.entries['id1'] is sealed and not window.dirty_ids, "内容没有变化的条目被重新加密!"
+        window.entries['id2'] = {**window.reveal_entry(window.entries['id2']), 'note': '完整保存'}
+        assert window.save_db() is True
+        window.vault_writer.flush()
+        assert window.vault_writer.last_write_changes == 1, window.vault_writer.last_write_changes
+        window.entries_order = ['id2', 'id1']
+        assert window.save_db() is True
+        window.vault_writer.flush()
+        app.processEvents()
+        assert window.vault_writer.last_write_changes == 1 and "上次保存 1 个" in window.save_status_label.text()
+        print("✓ 完整保存只统计变更的条目并显示在状态栏，内容没有变化时不写入")
+
+        window.vault_writer.close()
+        window.backup_executor.shutdown(wait=True)
+        if window.vault_lock is not None:
+            window.vault_lock.release()
+    finally:
+        os.chdir(original_cwd)
+        QMessageBox.exec = original_exec
+        MainWindow.setup_first_run = original_setup
+
+print("\n✅ 保存失败重试测试通过")
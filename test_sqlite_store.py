@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试 SQLite 存储引擎（逐条加密、事务写入、分页加载、与加密文件互相转换）
+"""
+
+import os
+import sqlite3
+import tempfile
+
+from crypto import CryptoManager
+from sqlite_store import SQLiteCryptoManager, is_sqlite_vault
+
+print("=" * 60)
+print("SQLite 存储引擎测试")
+print("=" * 60)
+
+cm = SQLiteCryptoManager()
+
+with tempfile.TemporaryDirectory() as temp_dir:
+    db_file = os.path.join(temp_dir, 'passwords.db')
+    entries = {f'id{i}': {'id': f'id{i}', 'website_name': f'网站{i}', 'password': f'secret{i}'} for i in range(50)}
+    entries_order = [f'id{i}' for i in reversed(range(50))]
+
+    # 测试 1: 保存、解锁，错误的主密码被拒绝
+    print("\n[测试 1] 保存与解锁")
+    print("-" * 60)
+    cm.save_encrypted_db(db_file, 'test_password', entries, entries_order)
+    assert is_sqlite_vault(db_file), "保存的不是 SQLite 数据库!"
+    data, order, session = cm.unlock_db(db_file, 'test_password')
+    assert data == entries and order == entries_order, "解锁后的数据不匹配!"
+    assert cm.verify_master_password(db_file, 'test_password'), "正确的主密码验证失败!"
+    assert not cm.verify_master_password(db_file, 'wrong_password'), "错误的主密码验证通过!"
+    with sqlite3.connect(db_file) as conn:
+        raw = b"".join(row[0] for row in conn.execute("SELECT ciphertext FROM entries"))
+    assert b'secret' not in raw and '网站'.encode('utf-8') not in raw, "数据库中存在明文!"
+    print("✓ 每个条目单独加密存放，解锁后数据和顺序一致")
+
+    # 测试 2: 单个条目的修改按行写入
+    print("\n[测试 2] 按行写入修改")
+    print("-" * 60)
+    cm.append_journal(db_file, session, [
+        {"op": "put", "id": "id3", "entry": {'id': 'id3', 'password': 'changed'}},
+        {"op": "put", "id": "new", "entry": {'id': 'new', 'password': 'added'}},
+        {"op": "delete", "id": "id4"}
+    ])
+    data, order = cm.load_encrypted_db_with_session(db_file, session)
+    assert data['id3']['password'] == 'changed' and 'id4' not in data, "修改或删除未写入!"
+    assert order[-1] == 'new' and 'id4' not in order, "新增条目的顺序不正确!"
+    cm.append_journal(db_file, session, [{"op": "order", "entries_order": list(reversed(order))}])
+    reordered = cm.load_encrypted_db_with_session(db_file, session)[1]
+    assert reordered == list(reversed(order)), "顺序修改未写入!"
+    assert not os.path.exists(cm.journal_path(db_file)), "SQLite 存储不应生成变更日志文件!"
+    print("✓ 新增、修改、删除和重新排序都只写入相应的行")
+
+    # 测试 3: 密文与条目 id 绑定，挪到其他行后无法解密
+    print("\n[测试 3] 篡改检测")
+    print("-" * 60)
+    with sqlite3.connect(db_file) as conn:
+        nonce, ciphertext = conn.execute("SELECT nonce, ciphertext FROM entries WHERE id = 'id1'").fetchone()
+        conn.execute("UPDATE entries SET nonce = ?, ciphertext = ? WHERE id = 'id2'", (nonce, ciphertext))
+    try:
+        cm.load_encrypted_db_with_session(db_file, session)
+        raise AssertionError("挪到其他行的密文未被检测到")
+    except AssertionError:
+        raise
+    except Exception:
+        pass
+    cm.save_encrypted_db_with_session(db_file, session, data, order)
+    print("✓ 挪到其他条目上的密文解密失败")
+
+    # 测试 4: 分页加载
+    print("\n[测试 4] 分页加载")
+    print("-" * 60)
+    page, page_ids, total = cm.load_page(db_file, session, 10, 5)
+    assert total == len(order) and page_ids == order[10:15], "分页顺序不正确!"
+    assert all(page[entry_id] == data[entry_id] for entry_id in page_ids) and len(page) == 5, "分页数据不正确!"
+    print(f"✓ 共 {total} 个条目，只解密了其中 {len(page)} 个")
+
+    # 测试 5: 更改主密码只替换文件头
+    print("\n[测试 5] 更改主密码")
+    print("-" * 60)
+    assert cm.change_master_password(db_file, 'test_password', 'new_password'), "更改主密码失败!"
+    assert cm.unlock_db(db_file, 'new_password')[0] == data, "更改主密码后数据不匹配!"
+    assert not cm.verify_master_password(db_file, 'test_password'), "旧主密码仍然有效!"
+    print("✓ 更改主密码后条目保持不变，旧主密码失效")
+
+    # 测试 6: 加密文件可以导入并转换为 SQLite，主密码不变
+    print("\n[测试 6] 加密文件转换")
+    print("-" * 60)
+    file_vault = os.path.join(temp_dir, 'passwords.json.aes')
+    CryptoManager().save_encrypted_db(file_vault, 'file_password', entries, entries_order)
+    data, order, file_session = cm.unlock_db(file_vault, 'file_password')
+    converted = os.path.join(temp_dir, 'converted.db')
+    cm.save_encrypted_db_with_session(converted, file_session, data, order)
+    assert cm.unlock_db(converted, 'file_password')[:2] == (entries, entries_order), "转换后的数据不匹配!"
+    back = os.path.join(temp_dir, 'back.json.aes')
+    CryptoManager().save_encrypted_db_with_session(back, file_session, data, order)
+    assert CryptoManager().unlock_db(back, 'file_password')[:2] == (entries, entries_order), "转换回加密文件后数据不匹配!"
+    print("✓ 加密文件与 SQLite 数据库可以使用同一个会话互相转换")
+    # 条目顺序中没有对应条目或重复的 id 被跳过
+    skipped = os.path.join(temp_dir, 'skipped.db')
+    cm.save_encrypted_db_with_session(skipped, file_session, data, ['missing'] + order + [order[0]])
+    assert cm.load_encrypted_db_with_session(skipped, file_session) == (entries, entries_order), "异常的条目顺序未被跳过!"
+    # 已有的加密文件仍按文件格式保存和追加日志，不会被当作 SQLite 数据库
+    cm.save_encrypted_db_with_session(file_vault, file_session, data, order)
+    cm.append_journal(file_vault, file_session, [{"op": "delete", "id": "id1"}])
+    assert not is_sqlite_vault(file_vault) and os.path.exists(cm.journal_path(file_vault)), "加密文件被写成了 SQLite!"
+    assert 'id1' not in CryptoManager().unlock_db(file_vault, 'file_password')[0], "加密文件的日志未生效!"
+    print("✓ SQLite 存储引擎保存已有的加密文件时按文件格式写入")
+
+    # 测试 7: 预读所有行，数据库被修改后预读内容作废
+    print("\n[测试 7] 预读数据库")
+    print("-" * 60)
+    prefetched = cm.prefetch(converted)
+    assert cm.prefetch_is_fresh(converted, prefetched), "刚预读的内容应有效!"
+    assert cm.unlock_db(converted, 'file_password', prefetched)[:2] == (entries, entries_order), "使用预读内容解锁后数据不匹配!"
+    cm.append_journal(converted, file_session, [{"op": "delete", "id": "id0"}])
+    assert not cm.prefetch_is_fresh(converted, prefetched), "数据库修改后预读内容仍被视为有效!"
+    assert 'id0' not in cm.unlock_db(converted, 'file_password', prefetched)[0], "预读内容过期后未重新查询!"
+    print("✓ 预读的行在数据库未修改时直接用于解锁，修改后回退为重新查询")
+    file_session.wipe()
+    session.wipe()
+
+print("\n✅ SQLite 存储引擎测试通过")
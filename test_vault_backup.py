@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试增量备份（内容定义分块、去重、恢复任意时间点、保留策略）
+"""
+
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+from crypto import CryptoManager
+from vault_backup import BackupStore, read_vault_files, select_retained, split_chunks
+
+print("=" * 60)
+print("增量备份测试")
+print("=" * 60)
+
+# 测试 1: 中间插入内容后，插入点之后的块边界不变
+print("\n[测试 1] 内容定义分块")
+print("-" * 60)
+data = os.urandom(2 * 1024 * 1024)
+chunks = split_chunks(data)
+assert b''.join(chunks) == data, "分块拼接后与原数据不一致!"
+changed = data[:1000000] + os.urandom(100) + data[1000000:]
+changed_chunks = split_chunks(changed)
+shared = set(chunks) & set(changed_chunks)
+assert len(shared) >= len(chunks) - 2, f"插入 100 字节后只有 {len(shared)}/{len(chunks)} 个块不变!"
+print(f"✓ {len(chunks)} 个块，平均 {len(data) // len(chunks) // 1024} KB；插入 100 字节后 {len(shared)} 个块不变")
+
+with tempfile.TemporaryDirectory() as temp_dir:
+    db_file = os.path.join(temp_dir, "passwords.json.aes")
+    store = BackupStore(os.path.join(temp_dir, "backups"))
+    cm = CryptoManager()
+    session = cm.create_session('master_password')
+    entries = {f'id{i}': {'id': f'id{i}', 'website_name': f'网站{i}', 'url': f'https://site{i}.example.com',
+                          'username': f'user{i}', 'password': os.urandom(12).hex(), 'note': '备注' * 20}
+               for i in range(3000)}
+    order = list(entries)
+    cm.save_encrypted_db_with_session(db_file, session, entries, order)
+    paths = cm.vault_files(db_file) + [cm.archive_path(db_file)]
+
+    # 测试 2: 两次日志合并之间的连续备份只存储新追加的日志
+    print("\n[测试 2] 相邻备份去重")
+    print("-" * 60)
+    start = datetime(2026, 1, 1, 9, 0)
+    points = []
+    manifest = store.create("passwords.json.aes", read_vault_files(db_file, paths), start)
+    points.append((manifest["name"], read_vault_files(db_file, paths)))
+    for n in range(5):
+        cm.append_journal(db_file, session, [{"op": "put", "id": f'id{n}',
+                                              "entry": {**entries[f'id{n}'], 'note': f'修改 {n}'}}])
+        manifest = store.create("passwords.json.aes", read_vault_files(db_file, paths),
+                                start + timedelta(minutes=10 * (n + 1)))
+        stats = manifest["stats"]
+        assert stats["new_bytes"] * 20 < stats["total_bytes"], f"相邻备份新增 {stats['new_bytes']} 字节，去重无效!"
+        points.append((manifest["name"], read_vault_files(db_file, paths)))
+    assert store.create("passwords.json.aes", read_vault_files(db_file, paths), start + timedelta(hours=1)) is None, \
+        "内容没有变化时不应创建新备份!"
+    print(f"✓ 数据库 {stats['total_bytes'] // 1024} KB，追加一条日志后的备份新增 {stats['new_bytes'] // 1024} KB")
+
+    # 测试 3: 恢复任意时间点，逐字节一致；备份中没有的附属文件被删除
+    print("\n[测试 3] 恢复任意时间点")
+    print("-" * 60)
+    suffixes = [path[len(db_file):] for path in paths]
+    for name, files in points:
+        store.restore(name, db_file, suffixes)
+        assert read_vault_files(db_file, paths) == files, f"恢复 {name} 后文件内容不一致!"
+    store.restore(points[0][0], db_file, suffixes)
+    assert not os.path.exists(cm.journal_path(db_file)), "恢复没有日志的备份后应删除日志!"
+    data, _ = cm.load_encrypted_db_with_session(db_file, session)
+    assert data['id0']['note'] == '备注' * 20, "恢复后的数据库内容不正确!"
+    print(f"✓ {len(points)} 个时间点都可以逐字节恢复")
+
+    # 测试 4: 保留策略与回收
+    print("\n[测试 4] 保留策略")
+    print("-" * 60)
+    synthetic = [{"name": f"b{i}", "created_at": (start - timedelta(hours=i)).isoformat()} for i in range(24 * 60)]
+    keep = select_retained(synthetic, {"last": 3, "hourly": 24, "daily": 7, "weekly": 4})
+    assert {"b0", "b1", "b2"} <= keep and len(keep) < 24 + 7 + 4, f"保留的备份数不正确: {len(keep)}"
+    chunk_count = sum(len(files) for _, _, files in os.walk(store.chunks_dir))
+    result = store.prune({"last": 1, "hourly": 1})
+    backups = store.list_backups("passwords.json.aes")
+    assert result["removed_backups"] == len(points) - 1 and len(backups) == 1, "保留策略没有删除旧备份!"
+    assert 0 < result["reclaimed_chunks"] < chunk_count, "没有回收不再引用的块!"
+    store.restore(backups[0]["name"], db_file, suffixes)
+    assert read_vault_files(db_file, paths) == points[-1][1], "清理后保留的备份无法恢复!"
+    session.wipe()
+    print(f"✓ 60 天的每小时备份保留 {len(keep)} 个；清理删除 {result['removed_backups']} 个备份，"
+          f"回收 {result['reclaimed_chunks']} 个块")
+
+print("\n✅ 增量备份测试通过")
@@ -0,0 +1,437 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试数据库加密存储（会话密钥、保存/加载）
+"""
+
+import os
+import json
+import builtins
+import base64
+import tempfile
+
+import crypto
+
+from crypto import CryptoManager, LEGACY_KDF_PARAMS, VAULT_FORMAT_VERSION, VAULT_MAGIC
+
+print("=" * 60)
+print("数据库加密存储测试")
+print("=" * 60)
+
+cm = CryptoManager()
+test_data = {
+    'id1': {'id': 'id1', 'website_name': 'GitHub', 'url': 'https://github.com',
+            'username': 'test', 'password': 'secret123', 'note': ''}
+}
+
+with tempfile.TemporaryDirectory() as temp_dir:
+    db_file = os.path.join(temp_dir, 'passwords.json.aes')
+
+    # 测试 1: 会话密钥保存不再重新派生密钥
+    print("\n[测试 1] 会话密钥保存/加载")
+    print("-" * 60)
+    session = cm.create_session('test_password')
+    derive_calls = []
+    original_derive_key = cm.derive_key
+    cm.derive_key = lambda *args, **kwargs: derive_calls.append(args) or original_derive_key(*args, **kwargs)
+    try:
+        cm.save_encrypted_db_with_session(db_file, session, test_data, ['id1'])
+        cm.save_encrypted_db_with_session(db_file, session, test_data, ['id1'])
+        loaded, order = cm.load_encrypted_db_with_session(db_file, session)
+    finally:
+        cm.derive_key = original_derive_key
+    assert loaded == test_data and order == ['id1'], "会话密钥保存/加载不匹配!"
+    assert not derive_calls, "会话密钥保存不应重新派生密钥!"
+    print("✓ 会话密钥保存/加载测试通过（未重新派生密钥）")
+
+    # 测试 2: 会话密钥写入的文件可以用主密码打开
+    loaded, order = cm.load_encrypted_db(db_file, 'test_password')
+    assert loaded == test_data, "主密码加载不匹配!"
+    print("✓ 主密码加载会话密钥保存的数据库通过")
+
+    # 测试 3: 锁定后会话密钥被清除
+    session.wipe()
+    assert not session.active, "会话密钥未清除!"
+    try:
+        cm.save_encrypted_db_with_session(db_file, session, test_data, ['id1'])
+        print("✗ 清除后的会话密钥仍可保存")
+        raise AssertionError("清除后的会话密钥仍可保存")
+    except AssertionError:
+        raise
+    except Exception:
+        print("✓ 清除后的会话密钥无法继续使用")
+
+    # 单次派生解锁：验证和加载共用一次密钥派生
+    print("\n[测试 2] 单次派生解锁")
+    print("-" * 60)
+    cm.save_encrypted_db(db_file, 'test_password', test_data, ['id1'])
+    derive_calls.clear()
+    cm.derive_key = lambda *args, **kwargs: derive_calls.append(args) or original_derive_key(*args, **kwargs)
+    try:
+        loaded, order, session = cm.unlock_db(db_file, 'test_password')
+    finally:
+        cm.derive_key = original_derive_key
+    assert loaded == test_data and order == ['id1'], "解锁数据不匹配!"
+    assert len(derive_calls) == 1, f"解锁应只派生一次密钥，实际 {len(derive_calls)} 次"
+    print("✓ 解锁只派生一次密钥并返回会话密钥")
+
+    assert cm.verify_session_password(session, 'test_password'), "会话密码验证失败!"
+    assert not cm.verify_session_password(session, 'wrong_password'), "错误密码通过了会话验证!"
+    print("✓ 会话密码验证通过（不读取数据库）")
+
+    try:
+        cm.unlock_db(db_file, 'wrong_password')
+        raise AssertionError("错误密码解锁成功")
+    except AssertionError:
+        raise
+    except Exception:
+        print("✓ 错误密码解锁被拒绝")
+    session.wipe()
+
+    # 测试 3: 更改主密码只重写文件头
+    print("\n[测试 3] 密钥包裹格式与更改主密码")
+    print("-" * 60)
+    loaded, order, session = cm.unlock_db(db_file, 'test_password')
+    before = cm._read_db(db_file)
+    new_session = cm.change_session_password(db_file, session, 'new_password')
+    after = cm._read_db(db_file)
+    assert after["version"] == VAULT_FORMAT_VERSION, "数据库格式版本不正确!"
+    assert after["ciphertext"] == before["ciphertext"] and after["nonce_prefix"] == before["nonce_prefix"], "更改主密码不应重新加密条目!"
+    assert after["wrapped_key"] != before["wrapped_key"], "包裹密钥未更新!"
+    print("✓ 更改主密码只重新包裹数据密钥，密文保持不变")
+    loaded, order = cm.load_encrypted_db(db_file, 'new_password')
+    assert loaded == test_data, "新主密码加载不匹配!"
+    assert not cm.verify_master_password(db_file, 'test_password'), "旧主密码仍然有效!"
+    print("✓ 新主密码生效，旧主密码失效")
+    session.wipe()
+    new_session.wipe()
+
+    # 测试 4: 旧格式（版本 1）迁移
+    print("\n[测试 4] 旧格式数据库迁移")
+    print("-" * 60)
+    salt = cm.generate_salt()
+    nonce, ciphertext = cm.encrypt_data(cm.derive_key('test_password', salt, LEGACY_KDF_PARAMS), test_data)
+    with open(db_file, 'w', encoding='utf-8') as f:
+        json.dump({
+            "salt": base64.b64encode(salt).decode('utf-8'),
+            "nonce": base64.b64encode(nonce).decode('utf-8'),
+            "ciphertext": base64.b64encode(ciphertext).decode('utf-8'),
+            "entries_order": ['id1']
+        }, f)
+    loaded, order, session = cm.unlock_db(db_file, 'test_password')
+    assert loaded == test_data and session.legacy, "旧格式数据库解锁失败!"
+    cm.save_encrypted_db_with_session(db_file, session, loaded, order)
+    assert cm.read_header(db_file)["version"] == VAULT_FORMAT_VERSION, "旧格式数据库未迁移!"
+    loaded, order = cm.load_encrypted_db(db_file, 'test_password')
+    assert loaded == test_data, "迁移后加载不匹配!"
+    print("✓ 旧格式数据库解锁并迁移为密钥包裹格式")
+    session.wipe()
+
+    # 测试 5: 密钥校验值
+    print("\n[测试 5] 文件头密钥校验")
+    print("-" * 60)
+    cm.save_encrypted_db(db_file, 'test_password', test_data, ['id1'])
+    header = cm.read_header(db_file)
+    assert len(header["key_check"]) == 16, "文件头缺少密钥校验值!"
+    with open(db_file, 'r+b') as f:
+        f.seek(-16, os.SEEK_END)
+        f.write(b"corrupted-bytes!")
+    assert cm.verify_master_password(db_file, 'test_password'), "验证主密码不应读取密文!"
+    assert not cm.verify_master_password(db_file, 'wrong_password'), "错误主密码通过了密钥校验!"
+    print("✓ 验证主密码只读取文件头，错误主密码在密钥派生后立即被拒绝")
+
+    # 测试 6: 文件头记录密钥派生参数
+    print("\n[测试 6] 密钥派生参数与重新包裹")
+    print("-" * 60)
+    fast_params = {"time_cost": 1, "memory_cost": 16384, "parallelism": 2}
+    old_cm = CryptoManager(kdf_params=fast_params)
+    old_cm.save_encrypted_db(db_file, 'test_password', test_data, ['id1'])
+    header = cm.read_header(db_file)
+    assert header["kdf"]["parallelism"] == 2 and header["kdf"]["memory_cost"] == 16384, "文件头未记录密钥派生参数!"
+    loaded, order, session = cm.unlock_db(db_file, 'test_password')
+    assert loaded == test_data, "按文件头参数解锁失败!"
+    assert not cm.needs_rehash(session), "使用默认参数时不应重新包裹已有数据库!"
+    tuned_cm = CryptoManager(kdf_params={"time_cost": 2, "memory_cost": 16384, "parallelism": 1})
+    assert tuned_cm.needs_rehash(session), "配置的参数变化后应需要重新包裹!"
+    new_session = tuned_cm.change_session_password(db_file, session, 'test_password')
+    assert cm.read_header(db_file)["kdf"] == tuned_cm.kdf_params, "重新包裹后文件头参数未更新!"
+    assert not tuned_cm.needs_rehash(new_session), "重新包裹后不应再需要更新!"
+    assert cm.load_encrypted_db(db_file, 'test_password')[0] == test_data, "重新包裹后加载失败!"
+    print("✓ 文件头记录密钥派生参数，配置的参数变化后解锁时透明重新包裹，默认参数不触发重新包裹")
+    session.wipe()
+    new_session.wipe()
+
+    # 测试 7: 二进制容器与旧的 JSON 格式
+    print("\n[测试 7] 二进制容器格式")
+    print("-" * 60)
+    cm.save_encrypted_db(db_file, 'test_password', test_data, ['id1'])
+    with open(db_file, 'rb') as f:
+        content = f.read()
+    assert content.startswith(VAULT_MAGIC), "数据库未使用二进制容器!"
+    assert b'secret123' not in content and b'entries_order' not in content, "条目顺序应放入密文!"
+    loaded, order, session = cm.unlock_db(db_file, 'test_password')
+    size = os.path.getsize(db_file)
+    inode = os.stat(db_file).st_ino
+    header_size = len(cm._pack_header({}, cm._read_db(db_file)["header_length"]))
+    new_session = cm.change_session_password(db_file, session, 'new_password')
+    assert os.path.getsize(db_file) == size, "更改主密码后文件头长度不应变化!"
+    with open(db_file, 'rb') as f:
+        rewritten = f.read()
+    assert os.stat(db_file).st_ino == inode and rewritten[header_size:] == content[header_size:], "应原地覆盖文件头!"
+    assert not os.path.exists(cm.header_backup_path(db_file)), "覆盖完成后应删除旧文件头备份!"
+    assert cm.load_encrypted_db(db_file, 'new_password') == (test_data, ['id1']), "替换文件头后加载失败!"
+    print("✓ 二进制容器保存/加载通过，更改主密码原地覆盖文件头，密文不被复制")
+
+    # 原地覆盖中途崩溃：备份已写入、文件头只写了一半；读取时在内存中使用备份，不写入文件
+    with open(cm.header_backup_path(db_file), 'wb') as f:
+        f.write(rewritten[:header_size])
+    with open(db_file, 'r+b') as f:
+        f.write(content[:header_size // 2])
+    with open(db_file, 'rb') as f:
+        torn = f.read()
+    loaded, order, restored_session = cm.unlock_db(db_file, 'new_password')
+    assert (loaded, order) == (test_data, ['id1']), "使用备份的文件头解锁失败!"
+    assert cm.verify_master_password(db_file, 'new_password'), "使用备份的文件头验证主密码失败!"
+    with open(db_file, 'rb') as f:
+        assert f.read() == torn and os.path.exists(cm.header_backup_path(db_file)), "读取时不应写入数据库文件!"
+    # 可写模式下（持有写入锁）写回备份的文件头
+    assert cm.restore_headers(db_file), "没有写回备份的文件头!"
+    assert not os.path.exists(cm.header_backup_path(db_file)), "写回后应删除旧文件头备份!"
+    assert cm.load_encrypted_db(db_file, 'new_password') == (test_data, ['id1']), "写回文件头后加载失败!"
+    restored_session.wipe()
+    print("✓ 覆盖文件头中途崩溃后，读取时使用备份的文件头，可写模式下写回")
+
+    # 版本 2 的 JSON 格式仍可读取，保存后迁移为二进制容器
+    nonce = cm.generate_nonce()
+    ciphertext = new_session.aead.encrypt(nonce, json.dumps(test_data).encode('utf-8'), None)
+    with open(db_file, 'w', encoding='utf-8') as f:
+        json.dump({
+            "version": 2,
+            **cm._header_fields(new_session),
+            "nonce": base64.b64encode(nonce).decode('utf-8'),
+            "ciphertext": base64.b64encode(ciphertext).decode('utf-8'),
+            "entries_order": ['id1']
+        }, f, ensure_ascii=False, indent=2)
+    assert cm.verify_master_password(db_file, 'new_password'), "JSON 格式文件头读取失败!"
+    loaded, order, session = cm.unlock_db(db_file, 'new_password')
+    assert loaded == test_data and order == ['id1'], "JSON 格式数据库加载失败!"
+    cm.save_encrypted_db_with_session(db_file, session, loaded, order)
+    assert cm.read_header(db_file)["version"] == VAULT_FORMAT_VERSION, "JSON 格式数据库未迁移!"
+    assert cm.load_encrypted_db(db_file, 'new_password')[0] == test_data, "迁移后加载不匹配!"
+    print("✓ 版本 2 的 JSON 格式仍可读取，保存后迁移为二进制容器")
+    session.wipe()
+    new_session.wipe()
+
+    # 测试 8: 分块流式加密
+    print("\n[测试 8] 分块流式加密")
+    print("-" * 60)
+    many_entries = {
+        f'id{i}': {'id': f'id{i}', 'website_name': f'网站{i}', 'url': f'https://example{i}.com',
+                   'username': f'user{i}', 'password': f'secret{i}', 'note': '测试'}
+        for i in range(300)
+    }
+    many_order = list(many_entries)
+    original_chunk_size, original_cpu_count = crypto.CHUNK_SIZE, crypto.os.cpu_count
+    crypto.CHUNK_SIZE = 1024
+    crypto.os.cpu_count = lambda: 4
+    try:
+        session = cm.create_session('test_password')
+        cm.save_encrypted_db_with_session(db_file, session, many_entries, many_order)
+        header = cm._read_db(db_file)
+        assert header["chunk_size"] == 1024 and len(header["ciphertext"]) > 10 * 1040, "未按分块加密!"
+        loaded, order = cm.load_encrypted_db_with_session(db_file, session)
+        assert loaded == many_entries and order == many_order, "分块并行解密结果不匹配!"
+        print("✓ 多分块保存/并行解密通过")
+
+        with open(db_file, 'rb') as f:
+            content = f.read()
+        body_start = len(content) - len(header["ciphertext"])
+        swapped = (content[:body_start] + content[body_start + 1040:body_start + 2080]
+                   + content[body_start:body_start + 1040] + content[body_start + 2080:])
+        for label, tampered in (("调换分块", swapped), ("截断文件", content[:body_start + 2080])):
+            with open(db_file, 'wb') as f:
+                f.write(tampered)
+            try:
+                cm.load_encrypted_db_with_session(db_file, session)
+                raise AssertionError(f"{label}后仍能加载")
+            except AssertionError:
+                raise
+            except Exception:
+                print(f"✓ {label}被认证拒绝")
+        session.wipe()
+    finally:
+        crypto.CHUNK_SIZE = original_chunk_size
+        crypto.os.cpu_count = original_cpu_count
+
+    # 测试 9: 先压缩后加密
+    print("\n[测试 9] 数据库压缩")
+    print("-" * 60)
+    session = cm.create_session('test_password')
+    cm.save_encrypted_db_with_session(db_file, session, many_entries, many_order)
+    plain_size = os.path.getsize(db_file)
+    for compression in ({"name": "zlib", "level": 6}, {"name": "lzma", "level": 1}):
+        cm.set_compression(compression)
+        cm.save_encrypted_db_with_session(db_file, session, many_entries, many_order)
+        assert cm._read_db(db_file)["compression"] == compression, "文件头未记录压缩参数!"
+        assert os.path.getsize(db_file) < plain_size / 2, f"{compression['name']} 压缩后文件未变小!"
+        cm.set_compression(None)
+        loaded, order = cm.load_encrypted_db_with_session(db_file, session)
+        assert loaded == many_entries and order == many_order, f"{compression['name']} 压缩数据库加载不匹配!"
+        print(f"✓ {compression['name']} 压缩保存/加载通过（按文件头参数解压）")
+    session.wipe()
+
+    # 测试 10: 变更日志
+    print("\n[测试 10] 变更日志")
+    print("-" * 60)
+    session = cm.create_session('test_password')
+    cm.save_encrypted_db_with_session(db_file, session, many_entries, many_order)
+    base_size = os.path.getsize(db_file)
+    journal_file = cm.journal_path(db_file)
+    new_entry = {'id': 'new', 'website_name': '新网站', 'password': 'new-secret'}
+    edited_entry = {**many_entries['id5'], 'password': 'changed'}
+    cm.append_journal(db_file, session, [{"op": "put", "id": "new", "entry": new_entry}])
+    cm.append_journal(db_file, session, [{"op": "put", "id": "id5", "entry": edited_entry},
+                                         {"op": "delete", "id": "id0"}])
+    assert os.path.getsize(db_file) == base_size, "追加日志不应重写数据库!"
+    assert os.path.getsize(journal_file) < 1024, "日志记录应只包含变更的条目!"
+    expected = {**many_entries, 'new': new_entry, 'id5': edited_entry}
+    del expected['id0']
+    expected_order = many_order[1:] + ['new']
+    loaded, order = cm.load_encrypted_db_with_session(db_file, session)
+    assert loaded == expected and order == expected_order, "重放日志结果不匹配!"
+    loaded, order, unlocked = cm.unlock_db(db_file, 'test_password')
+    assert loaded == expected and order == expected_order, "解锁时未重放日志!"
+    unlocked.wipe()
+    print("✓ 修改只追加到日志，加载和解锁时重放")
+
+    with open(journal_file, 'ab') as f:
+        f.write(b"\x00\x00\x01\x00half")
+    assert cm.load_encrypted_db_with_session(db_file, session)[0] == expected, "写了一半的记录应被忽略!"
+    cm._journal_state.clear()
+    cm.append_journal(db_file, session, [{"op": "delete", "id": "new"}])
+    del expected['new']
+    assert cm.load_encrypted_db_with_session(db_file, session)[0] == expected, "截掉半条记录后追加失败!"
+    print("✓ 写入时崩溃留下的半条记录被忽略并在下次追加前截掉")
+
+    with open(journal_file, 'r+b') as f:
+        f.seek(-1, os.SEEK_END)
+        last = f.read(1)
+        f.seek(-1, os.SEEK_END)
+        f.write(bytes([last[0] ^ 1]))
+    try:
+        cm.load_encrypted_db_with_session(db_file, session)
+        raise AssertionError("篡改的日志记录仍能加载")
+    except AssertionError:
+        raise
+    except Exception:
+        print("✓ 篡改的日志记录被认证拒绝")
+    with open(journal_file, 'r+b') as f:
+        f.seek(-1, os.SEEK_END)
+        f.write(last)
+
+    cm.compact_journal(db_file, session)
+    assert not os.path.exists(journal_file), "合并后日志未删除!"
+    assert cm.load_encrypted_db_with_session(db_file, session)[0] == expected, "合并后数据不匹配!"
+    print("✓ 日志合并为新的快照")
+
+    # 新快照之前遗留的日志不会被重放
+    cm.append_journal(db_file, session, [{"op": "delete", "id": "id1"}])
+    with open(journal_file, 'rb') as f:
+        stale_journal = f.read()
+    cm.save_encrypted_db_with_session(db_file, session, expected, expected_order[:-1])
+    with open(journal_file, 'wb') as f:
+        f.write(stale_journal)
+    assert 'id1' in cm.load_encrypted_db_with_session(db_file, session)[0], "遗留的日志被重放到新快照上!"
+    print("✓ 其他快照遗留的日志被忽略")
+
+    # 测试 11: 条目的索引层与密文层
+    print("\n[测试 11] 条目密文层")
+    print("-" * 60)
+    long_note = "长备注" * 40
+    full = {'id': 'a', 'website_name': '网站', 'username': 'user', 'password': 'secret-a', 'note': long_note}
+    sealed = cm.seal_entry(session, full)
+    assert 'password' not in sealed and 'secret-a' not in json.dumps(sealed), "索引层中存在明文密码!"
+    assert sealed['website_name'] == '网站' and len(sealed['note']) < len(long_note), "索引层字段不正确!"
+    cm.save_encrypted_db_with_session(db_file, session, {'a': sealed}, ['a'])
+    loaded = cm.load_encrypted_db_with_session(db_file, session)[0]['a']
+    assert 'password' not in loaded, "解锁时解密了密文层!"
+    assert cm.reveal_entry(session, loaded) == full, "解密后的条目不匹配!"
+    moved = {**cm.seal_entry(session, {**full, 'id': 'b'}), 'secret': sealed['secret']}
+    try:
+        cm.reveal_entry(session, moved)
+        raise AssertionError("挪到其他条目上的密文层仍能解密")
+    except AssertionError:
+        raise
+    except Exception:
+        pass
+    print("✓ 密码和长备注只在需要时解密，密文层与条目 id 绑定")
+    session.wipe()
+
+    # 测试 12: 加密算法记录在文件头中
+    print("\n[测试 12] 加密算法")
+    print("-" * 60)
+    chacha_manager = CryptoManager(cipher="chacha20-poly1305")
+    chacha_file = os.path.join(temp_dir, 'chacha.json.aes')
+    chacha_manager.save_encrypted_db(chacha_file, 'test_password', many_entries, many_order)
+    assert cm.read_header(chacha_file)["cipher"] == "chacha20-poly1305", "文件头未记录加密算法!"
+    # 默认算法的管理器按文件头记录的算法解锁、保存和更改主密码
+    data, order, session = cm.unlock_db(chacha_file, 'test_password')
+    assert (data, order) == (many_entries, many_order) and session.cipher == "chacha20-poly1305", "ChaCha20 数据库解锁失败!"
+    cm.append_journal(chacha_file, session, [{"op": "delete", "id": many_order[0]}])
+    assert cm.change_master_password(chacha_file, 'test_password', 'new_password'), "更改主密码失败!"
+    data, order, session = cm.unlock_db(chacha_file, 'new_password')
+    assert many_order[0] not in data and cm.read_header(chacha_file)["cipher"] == "chacha20-poly1305", "更改主密码后算法改变!"
+    session.wipe()
+    assert cm.read_header(db_file)["cipher"] == "aes-256-gcm", "默认算法不正确!"
+    from cipher_benchmark import select_cipher
+    assert select_cipher() in crypto.CIPHER_SUITES, "测速未选出可用的算法!"
+    print("✓ 新数据库可使用 ChaCha20-Poly1305，已有数据库按文件头记录的算法读写")
+
+    # 测试 13: 登录前预读数据库，文件被修改后预读内容作废
+    print("\n[测试 13] 预读数据库")
+    print("-" * 60)
+    prefetched = cm.prefetch(chacha_file)
+    assert cm.prefetch_is_fresh(chacha_file, prefetched), "刚预读的内容应有效!"
+    opened = []
+    original_open = builtins.open
+    builtins.open = lambda *args, **kwargs: opened.append(args[0]) or original_open(*args, **kwargs)
+    try:
+        data, order, session = cm.unlock_db(chacha_file, 'new_password', prefetched)
+    finally:
+        builtins.open = original_open
+    assert chacha_file not in opened, "使用预读内容时仍然读取了数据库文件!"
+    assert many_order[0] not in data and order == many_order[1:], "使用预读内容解锁后数据不匹配!"
+    cm.append_journal(chacha_file, session, [{"op": "delete", "id": many_order[1]}])
+    assert not cm.prefetch_is_fresh(chacha_file, prefetched), "文件修改后预读内容仍被视为有效!"
+    data, order, reloaded = cm.unlock_db(chacha_file, 'new_password', prefetched)
+    assert many_order[1] not in data, "预读内容过期后未重新读取文件!"
+    reloaded.wipe()
+    session.wipe()
+    print(f"✓ 预读耗时 {prefetched['elapsed_ms']:.1f} ms，解锁时不再读取文件；文件被修改后回退为直接读取")
+
+    # 测试 14: 归档段单独加密存放，移动条目只追加密码库的日志
+    print("\n[测试 14] 归档段")
+    print("-" * 60)
+    data, order, session = cm.unlock_db(chacha_file, 'new_password')
+    moved = order[:100]
+    vault_before = open(chacha_file, 'rb').read()
+    cm.save_archive(chacha_file, session, {entry_id: data[entry_id] for entry_id in moved}, moved)
+    cm.append_journal(chacha_file, session, [{"op": "delete", "id": entry_id} for entry_id in moved])
+    assert open(chacha_file, 'rb').read() == vault_before, "移动条目时重写了密码库!"
+    live, live_order, session = cm.unlock_db(chacha_file, 'new_password')
+    assert live_order == order[100:] and not set(moved) & set(live), "归档的条目仍在密码库中!"
+    archive, archive_order = cm.load_archive(chacha_file, session)
+    assert archive_order == moved and all(archive[i] == data[i] for i in moved), "归档的条目不匹配!"
+    # 更改主密码后归档段的文件头同样更新，旧主密码无法从归档文件头解开数据密钥
+    new_session = cm.change_session_password(chacha_file, session, 'archive_password')
+    archive_header = cm.read_header(cm.archive_path(chacha_file))
+    assert archive_header["wrapped_key"] == new_session.wrapped_key, "归档段的文件头未更新!"
+    assert cm.load_archive(chacha_file, new_session)[1] == moved, "更改主密码后归档无法解密!"
+    cm.save_archive(chacha_file, new_session, {}, [])
+    assert not os.path.exists(cm.archive_path(chacha_file)), "归档为空时应删除归档文件!"
+    assert cm.load_archive(chacha_file, new_session) == ({}, []), "没有归档时应返回空!"
+    new_session.wipe()
+    session.wipe()
+    print("✓ 归档条目不随密码库解密，移动时密码库只追加日志，更改主密码后归档同样只能用新主密码解开")
+
+print("\n✅ 数据库加密存储测试通过")
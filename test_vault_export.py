@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试把选中的条目导出为新的加密数据库（vault_export）
+"""
+
+import os
+import tempfile
+import time
+
+from crypto import CryptoManager
+from sqlite_store import SQLiteCryptoManager
+from vault_export import export_entries
+
+print("=" * 60)
+print("导出选中条目测试")
+print("=" * 60)
+
+cm = CryptoManager()
+session = cm.create_session('master_password')
+entries = {f'id{i}': cm.seal_entry(session, {'id': f'id{i}', 'website_name': f'网站{i}', 'url': f'site{i}.com',
+                                             'username': f'user{i}', 'password': f'pw{i}', 'note': '长备注' * 100 * (i % 2),
+                                             'updated_at': '2026-01-01T00:00:00'})
+           for i in range(10000)}
+selected = [f'id{i}' for i in range(0, 10000, 2)]
+
+with tempfile.TemporaryDirectory() as temp_dir:
+    for name in ("shared.json.aes", "shared.db"):
+        print(f"\n[测试] 导出到 {name}")
+        print("-" * 60)
+        file_path = os.path.join(temp_dir, name)
+        start = time.perf_counter()
+        count = export_entries(cm, session, entries, selected, file_path, 'share_password')
+        elapsed = time.perf_counter() - start
+        assert count == len(selected), f"导出了 {count} 个条目!"
+
+        # 新数据库用自己的主密码和数据密钥，原主密码打不开
+        data, order, export_session = SQLiteCryptoManager().unlock_db(file_path, 'share_password')
+        assert order == selected, "导出的条目顺序不正确!"
+        for entry_id in ('id0', 'id4242', 'id9998'):
+            revealed = cm.reveal_entry(export_session, data[entry_id])
+            assert revealed == cm.reveal_entry(session, entries[entry_id]), f"{entry_id} 的内容不一致!"
+        for attempt in (lambda: cm.reveal_entry(session, data['id0']),
+                        lambda: SQLiteCryptoManager().unlock_db(file_path, 'master_password')):
+            try:
+                attempt()
+                raise AssertionError("当前的数据密钥或主密码打开了导出的数据库")
+            except AssertionError:
+                raise
+            except Exception:
+                pass
+        export_session.wipe()
+        print(f"✓ 导出 {count} 个条目 {elapsed * 1000:.0f} ms，只能用新的主密码打开")
+
+session.wipe()
+print("\n✅ 导出选中条目测试通过")
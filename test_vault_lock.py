@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试多进程文件锁（写入者互斥、读写互斥、只读打开、锁被占用时的提示）
+
+锁属于进程，另一个进程用子进程模拟。
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from crypto import CryptoManager
+from vault_lock import VaultLock, open_read_only
+from vault_writer import VaultWriter
+
+print("=" * 60)
+print("多进程文件锁测试")
+print("=" * 60)
+
+CHILD = """
+import sys
+from vault_lock import VaultLock
+lock = VaultLock(sys.argv[1])
+assert lock.acquire_owner()
+print("owner", flush=True)
+for command in sys.stdin:
+    command = command.strip()
+    if command == "write":
+        with lock.writing():
+            print("writing", flush=True)
+            sys.stdin.readline()
+        print("written", flush=True)
+    elif command == "quit":
+        break
+lock.release()
+"""
+
+
+def start_child(path):
+    child = subprocess.Popen([sys.executable, "-c", CHILD, path], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                             text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    assert child.stdout.readline().strip() == "owner", "子进程未取得写入者锁!"
+    return child
+
+
+def send(child, command):
+    child.stdin.write(command + "\n")
+    child.stdin.flush()
+
+
+with tempfile.TemporaryDirectory() as temp_dir:
+    db_file = os.path.join(temp_dir, "passwords.json.aes")
+    cm = CryptoManager()
+    session = cm.create_session('master_password')
+    cm.save_encrypted_db_with_session(db_file, session, {'id1': {'id': 'id1', 'website_name': '示例网站'}}, ['id1'])
+
+    # 测试 1: 同一时间只有一个写入者，被占用时可以看到写入者的进程号
+    print("\n[测试 1] 写入者互斥")
+    print("-" * 60)
+    child = start_child(db_file)
+    lock = VaultLock(db_file, timeout=0.3)
+    assert not lock.acquire_owner() and not lock.owner, "另一个进程持有写入者锁时不应再取得!"
+    assert lock.owner_info().get("pid") == child.pid, "锁文件中的进程号不正确!"
+    assert str(child.pid) in lock.describe_owner(), "提示中没有写入者的进程号!"
+    try:
+        with lock.writing():
+            raise AssertionError("只读进程可以写入")
+    except AssertionError:
+        raise
+    except Exception:
+        pass
+    print(f"✓ 第二个进程不能取得写入者锁，提示：{lock.describe_owner()}")
+
+    # 测试 2: 写入期间只读进程等待，超时后得到明确的错误；写完后可以读取
+    print("\n[测试 2] 读写互斥")
+    print("-" * 60)
+    send(child, "write")
+    assert child.stdout.readline().strip() == "writing"
+    start = time.perf_counter()
+    try:
+        with lock.reading():
+            raise AssertionError("写入期间读取成功")
+    except AssertionError:
+        raise
+    except Exception as e:
+        assert "写入" in str(e), f"错误信息不明确: {e}"
+    waited_ms = (time.perf_counter() - start) * 1000
+    send(child, "")
+    assert child.stdout.readline().strip() == "written"
+    with lock.reading():
+        pass
+    print(f"✓ 写入期间读取等待 {waited_ms:.0f} ms 后报错，写完后读取成功")
+
+    # 测试 3: 可写进程运行期间以只读模式打开（脚本查询），写入线程不会启动
+    print("\n[测试 3] 只读打开")
+    print("-" * 60)
+    lock.release()
+    data, order, read_session = open_read_only(db_file, 'master_password')
+    assert order == ['id1'] and data['id1']['website_name'] == '示例网站', "只读打开的内容不正确!"
+    writer = VaultWriter(cm)
+    assert writer._thread is None and writer.flush(0) and writer.idle, "未提交保存时写入线程不应启动!"
+    writer.close()
+    read_session.wipe()
+    print("✓ 可写进程运行期间可以只读打开，且不启动写入线程")
+
+    # 测试 4: 写入者退出后可以取得写入者锁，退出时清除写入者信息
+    print("\n[测试 4] 释放")
+    print("-" * 60)
+    send(child, "quit")
+    child.wait(10)
+    lock = VaultLock(db_file)
+    assert lock.acquire_owner() and lock.owner_info().get("pid") == os.getpid(), "写入者退出后不能取得锁!"
+    lock.release()
+    assert lock.owner_info() == {}, "释放后应清除写入者信息!"
+    session.wipe()
+    print("✓ 写入者退出后可以取得写入者锁")
+
+print("\n✅ 多进程文件锁测试通过")
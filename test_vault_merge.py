@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试合并导入（vault_merge）
+"""
+
+import time
+
+from crypto import CryptoManager
+from vault_merge import match_key, normalize_url, plan_merge, resolve_conflicts
+
+print("=" * 60)
+print("合并导入测试")
+print("=" * 60)
+
+
+def make_entry(i, **fields):
+    entry = {'id': f'id{i}', 'website_name': f'网站{i}', 'url': f'https://site{i}.example.com',
+             'username': f'user{i}', 'password': f'pw{i}', 'note': '', 'updated_at': '2026-01-01T00:00:00'}
+    entry.update(fields)
+    return entry
+
+
+# 测试 1: 规范化网址和辅助配对键
+print("\n[测试 1] 辅助配对键")
+print("-" * 60)
+assert normalize_url("https://WWW.Example.com/login/") == normalize_url("example.com/login") == "example.com/login"
+assert normalize_url("http://user@example.com?next=/") == "example.com"
+assert match_key({'url': 'https://www.a.com/', 'username': ' Alice '}) == match_key({'url': 'a.com', 'username': 'alice'})
+assert match_key({'url': '', 'username': ''}) is None
+print("✓ 忽略协议、www. 前缀、域名大小写和末尾的斜杠，网址和用户名都为空时不参与配对")
+
+# 测试 2: 按 id 和辅助键配对，找出新增条目和冲突（密文由两个不同的数据密钥加密）
+print("\n[测试 2] 配对与冲突")
+print("-" * 60)
+cm = CryptoManager()
+local_session = cm.create_session('local_password')
+import_session = cm.create_session('import_password')
+local = {f'id{i}': cm.seal_entry(local_session, make_entry(i)) for i in range(6)}
+incoming_plain = [
+    make_entry(0),                                                   # 相同
+    make_entry(1, password='changed', updated_at='2026-02-01T00:00:00'),  # 只有密码不同，导入的较新
+    make_entry(2, note='旧的', updated_at='2025-01-01T00:00:00'),     # 当前的较新
+    make_entry(3, id='other3', url='http://WWW.site3.example.com/', username='USER3'),  # 辅助键配对
+    make_entry(9),                                                   # 新增
+    make_entry(50, id='archived'),                                   # 已归档
+]
+incoming = {entry['id']: cm.seal_entry(import_session, entry) for entry in incoming_plain}
+plan = plan_merge(local, incoming, [entry['id'] for entry in incoming_plain],
+                  lambda entry: cm.reveal_entry(local_session, entry),
+                  lambda entry: cm.reveal_entry(import_session, entry), exclude={'archived'})
+assert plan["add"] == ['id9'] and plan["skipped"] == 1, plan
+assert plan["conflicts"] == [('id1', 'id1'), ('id2', 'id2'), ('id3', 'other3')], plan["conflicts"]
+assert plan["unchanged"] == 1, plan
+assert resolve_conflicts(plan["conflicts"], local, incoming, "newer") == [('id1', 'id1')]
+assert resolve_conflicts(plan["conflicts"], local, incoming, "local") == []
+assert resolve_conflicts(plan["conflicts"], local, incoming, "incoming") == plan["conflicts"]
+print("✓ 只有密码不同的条目也识别为冲突，辅助键配对的条目沿用当前的 id，已归档的条目不导入")
+
+# 测试 3: 10 万 × 10 万条目的合并与条目数成线性关系
+print("\n[测试 3] 合并的耗时")
+print("-" * 60)
+
+
+def timed_merge(count):
+    local = {f'id{i}': make_entry(i) for i in range(count)}
+    incoming = {f'id{i}': make_entry(i) for i in range(count // 2)}
+    # 另一半是在导入文件中分别创建的同一账号（id 不同）和新条目
+    incoming.update({f'new{i}': make_entry(i, id=f'new{i}', updated_at='2026-05-01T00:00:00')
+                     for i in range(count // 2, count)})
+    incoming.update({f'extra{i}': make_entry(count + i, id=f'extra{i}') for i in range(count // 4)})
+    start = time.perf_counter()
+    plan = plan_merge(local, incoming, list(incoming), dict, dict)
+    taken = resolve_conflicts(plan["conflicts"], local, incoming)
+    elapsed = time.perf_counter() - start
+    assert len(plan["add"]) == count // 4 and plan["unchanged"] == count // 2, plan["unchanged"]
+    assert len(taken) == len(plan["conflicts"]) == count // 2
+    return elapsed
+
+
+small = timed_merge(20000)
+large = timed_merge(100000)
+assert large < small * 12, f"合并耗时不是线性的: {small:.2f}s / {large:.2f}s"
+print(f"✓ 2 万 × 2 万条目 {small * 1000:.0f} ms，10 万 × 10 万条目 {large * 1000:.0f} ms")
+
+local_session.wipe()
+import_session.wipe()
+print("\n✅ 合并导入测试通过")
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试条目摘要的 Merkle 树和文件夹同步
+"""
+
+import os
+import tempfile
+
+import vault_merkle
+from crypto import CryptoManager
+from sqlite_store import SQLiteCryptoManager
+from vault_merkle import MerkleTree
+from vault_sync import sync_with_copy
+
+print("=" * 60)
+print("Merkle 树与文件夹同步测试")
+print("=" * 60)
+
+
+def make_entry(i, **fields):
+    entry = {'id': f'id{i}', 'website_name': f'网站{i}', 'url': f'https://site{i}.example.com',
+             'username': f'user{i}', 'note': '', 'updated_at': '2026-01-01T00:00:00'}
+    entry.update(fields)
+    return entry
+
+
+cm = CryptoManager()
+entries = {f'id{i}': make_entry(i) for i in range(5000)}
+order = list(entries)
+
+# 测试 1: 只修改一个条目时，比较只展开一条路径，找到唯一不同的桶
+print("\n[测试 1] 比较两棵树")
+print("-" * 60)
+tree = cm.merkle_tree(entries)
+changed = {**entries, 'id42': make_entry(42, note='修改')}
+other = CryptoManager().merkle_tree(changed)
+assert tree.root != other.root and tree.diff(other) == [tree.bucket_of('id42')], "没有找到唯一不同的桶!"
+assert tree.diff(cm.merkle_tree(dict(reversed(list(entries.items()))))) == [], "树与条目的顺序有关!"
+restored = MerkleTree.from_bytes(tree.to_bytes())
+assert restored.root == tree.root and restored.diff(other) == tree.diff(other), "序列化后的树不一致!"
+print(f"✓ {len(entries)} 个条目、{len(tree.levels[-1])} 个桶，修改一个条目只有 1 个桶不同")
+
+# 测试 2: 摘要缓存只为替换过的条目重新计算
+print("\n[测试 2] 摘要缓存")
+print("-" * 60)
+calls = []
+original_leaf_digest = vault_merkle.leaf_digest
+vault_merkle.leaf_digest = lambda entry: calls.append(entry['id']) or original_leaf_digest(entry)
+try:
+    cm.merkle_tree(changed)
+finally:
+    vault_merkle.leaf_digest = original_leaf_digest
+assert calls == ['id42'], f"缓存未命中: {len(calls)} 次计算"
+print("✓ 再次计算树时只为修改过的 1 个条目计算摘要")
+
+with tempfile.TemporaryDirectory() as temp_dir:
+    session = cm.create_session('master_password')
+
+    # 测试 3: 保存快照时树写入文件头，之后的变更日志只记录条目 id；数据密钥不同时无法读取
+    print("\n[测试 3] 文件头中的树")
+    print("-" * 60)
+    for manager, name in ((CryptoManager(), "passwords.json.aes"), (SQLiteCryptoManager(), "passwords.db")):
+        db_file = os.path.join(temp_dir, name)
+        manager.save_encrypted_db_with_session(db_file, session, entries, order)
+        stored, journal_ids = manager.read_merkle(db_file, session)
+        assert stored.root == tree.root and journal_ids == set(), f"{name} 中的树不正确!"
+        manager.append_journal(db_file, session, [{"op": "put", "id": "id7", "entry": make_entry(7, note='x')},
+                                                  {"op": "delete", "id": "id8"}])
+        stored, journal_ids = manager.read_merkle(db_file, session)
+        assert stored.root == tree.root and journal_ids == {"id7", "id8"}, f"{name} 没有记录变更的条目!"
+        manager.compact_journal(db_file, session)
+        data, _ = manager.load_encrypted_db_with_session(db_file, session)
+        stored, journal_ids = manager.read_merkle(db_file, session)
+        assert stored.root == CryptoManager().merkle_tree(data).root and not journal_ids, f"{name} 合并后的树不正确!"
+        try:
+            manager.read_merkle(db_file, cm.create_session('other'))
+            raise AssertionError("其他数据密钥读取了树")
+        except AssertionError:
+            raise
+        except Exception:
+            pass
+        print(f"✓ {name}：树随快照保存，变更日志中的条目 id 单独返回")
+
+    # 测试 4: 与文件夹同步（创建副本、一致时不解密、双向交换、删除、副本更改过主密码）
+    print("\n[测试 4] 文件夹同步")
+    print("-" * 60)
+    db_file = os.path.join(temp_dir, "passwords.json.aes")
+    remote = os.path.join(temp_dir, "usb", "passwords.json.aes")
+    os.makedirs(os.path.dirname(remote))
+    local = dict(entries)
+    result = sync_with_copy(cm, session, local, order, remote)
+    assert result["created"] and os.path.exists(remote), "没有创建副本!"
+    base = result["synced_ids"]
+
+    loads = []
+    original_load = CryptoManager.load_encrypted_db_with_session
+    CryptoManager.load_encrypted_db_with_session = lambda self, *args: loads.append(args) or original_load(self, *args)
+    try:
+        result = sync_with_copy(cm, session, local, order, remote, base)
+    finally:
+        CryptoManager.load_encrypted_db_with_session = original_load
+    assert result["buckets"][0] == 0 and not loads, "两边一致时不应解密副本!"
+
+    # 副本在别处更改了主密码，数据密钥不变
+    remote_manager = CryptoManager()
+    remote_session = remote_manager.session_for_copy(remote, session)
+    remote_manager.rewrite_header(remote, remote_manager.rekey_session(remote_session, 'usb_password'))
+    remote_session = remote_manager.session_for_copy(remote, session)
+    remote_manager.append_journal(remote, remote_session, [
+        {"op": "put", "id": "id1", "entry": make_entry(1, note='副本修改', updated_at='2026-03-01T00:00:00')},
+        {"op": "put", "id": "usb1", "entry": make_entry(9999, id='usb1')}])
+    local['id2'] = make_entry(2, note='本地修改', updated_at='2026-02-01T00:00:00')
+    del local['id3']
+    result = sync_with_copy(cm, session, local, [i for i in order if i in local], remote, base)
+    assert sorted(result["pull"]) == ["id1", "usb1"] and result["push"] == ["id2"], result
+    assert result["delete_remote"] == ["id3"] and not result["delete_local"], result
+    assert result["buckets"][0] <= 4, f"比较了 {result['buckets'][0]} 个桶!"
+    local.update(result["pulled"])
+    remote_data, _ = remote_manager.load_encrypted_db_with_session(remote, remote_session)
+    assert remote_data == local, "同步后两边不一致!"
+    assert remote_manager.verify_master_password(remote, 'usb_password'), "同步改变了副本的主密码!"
+    print(f"✓ 拉取 {len(result['pull'])} 个、推送 {len(result['push'])} 个、删除 {len(result['delete_remote'])} 个，"
+          f"比较了 {result['buckets'][0]} / {result['buckets'][1]} 个桶")
+
+    other_remote = os.path.join(temp_dir, "other", "passwords.json.aes")
+    os.makedirs(os.path.dirname(other_remote))
+    cm.save_encrypted_db(other_remote, 'master_password', local, list(local))
+    try:
+        sync_with_copy(cm, session, local, list(local), other_remote)
+        raise AssertionError("与其他数据库同步成功")
+    except AssertionError:
+        raise
+    except Exception as e:
+        assert "副本" in str(e), f"错误信息不明确: {e}"
+    session.wipe()
+    print("✓ 同名但不是副本的数据库（数据密钥不同）拒绝同步")
+
+print("\n✅ Merkle 树与文件夹同步测试通过")
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试写时复制的条目快照（行为与 dict/list 一致、旧版本不受修改影响、结构共享、修改成本）
+"""
+
+import random
+import time
+
+from vault_snapshot import PersistentList, PersistentMap, VaultState, diff_entries
+
+print("=" * 60)
+print("条目快照测试")
+print("=" * 60)
+
+# 测试 1: 可变视图的行为与 dict / list 一致
+print("\n[测试 1] 与 dict / list 行为一致")
+print("-" * 60)
+rng = random.Random(1)
+state = VaultState()
+reference_entries, reference_order = {}, []
+for step in range(5000):
+    op = rng.random()
+    entry_id = f"id{rng.randrange(2000)}"
+    if op < 0.5 or not reference_order:
+        if entry_id not in reference_entries:
+            reference_order.append(entry_id)
+            state.order.append(entry_id)
+        reference_entries[entry_id] = {'id': entry_id, 'step': step}
+        state.entries[entry_id] = {'id': entry_id, 'step': step}
+    elif op < 0.8:
+        row = rng.randrange(len(reference_order))
+        removed = reference_order.pop(row)
+        del reference_entries[removed]
+        del state.order[row]
+        del state.entries[removed]
+    else:
+        batch = {f"id{rng.randrange(2000)}": {'step': step} for _ in range(20)}
+        batch = {k: v for k, v in batch.items() if k in reference_entries}
+        reference_entries.update(batch)
+        state.entries.update(batch)
+assert dict(state.entries) == reference_entries and len(state.entries) == len(reference_entries), "条目字典不一致!"
+assert state.order == reference_order and list(state.order) == reference_order, "条目顺序不一致!"
+assert all(state.order[i] == reference_order[i] for i in range(-len(reference_order), len(reference_order))), "按位置读取不一致!"
+assert 'missing' not in state.entries and state.entries.get('missing') is None, "不存在的条目处理不正确!"
+print(f"✓ 5000 次随机修改后与 dict / list 完全一致（{len(reference_entries)} 个条目）")
+
+# 测试 2: 快照不受之后的修改影响，未修改的部分与新版本共享
+print("\n[测试 2] 快照隔离与结构共享")
+print("-" * 60)
+snapshot = state.snapshot()
+expected = dict(snapshot.entries)
+first_id = reference_order[0]
+state.entries[first_id] = {'id': first_id, 'changed': True}
+del state.entries[reference_order[1]]
+state.order.append('new')
+assert dict(snapshot.entries) == expected and list(snapshot.order) == reference_order, "快照被之后的修改影响!"
+latest = state.snapshot()
+assert latest.version > snapshot.version, "修改后版本号未增加!"
+shared = sum(1 for a, b in zip(snapshot.entries._root, latest.entries._root) if a is b)
+assert shared >= 254, f"修改两个条目后只共享了 {shared} 个分支!"
+shared_chunks = sum(1 for a, b in zip(snapshot.order._chunks, latest.order._chunks) if a is b)
+assert shared_chunks >= len(snapshot.order._chunks) - 1, "追加条目后复制了整个顺序!"
+print(f"✓ 旧快照保持不变，新版本与旧版本共享 {shared}/256 个分支和 {shared_chunks} 个顺序块")
+
+# 测试 3: 批量删除和可迭代内容
+print("\n[测试 3] 批量删除")
+print("-" * 60)
+order = PersistentList.from_iterable(f"id{i}" for i in range(2000))
+remaining = order.remove_items({f"id{i}" for i in range(0, 2000, 3)})
+assert list(remaining) == [f"id{i}" for i in range(2000) if i % 3], "批量删除顺序不正确!"
+entries = PersistentMap.from_dict({f"id{i}": i for i in range(2000)}).remove_many(f"id{i}" for i in range(1000))
+assert len(entries) == 1000 and entries.to_dict() == {f"id{i}": i for i in range(1000, 2000)}, "批量删除条目不正确!"
+print("✓ 批量删除只生成一个新版本，内容正确")
+
+# 测试 4: 修改成本与条目数无关（对比拷贝整个 dict / list）
+print("\n[测试 4] 修改和取快照的成本")
+print("-" * 60)
+big_entries = {f"id{i}": {'id': f"id{i}"} for i in range(100000)}
+big_order = list(big_entries)
+big = VaultState(big_entries, big_order)
+start = time.perf_counter()
+for i in range(1000):
+    big.entries[f"id{i}"] = {'id': f"id{i}", 'edited': True}
+    snapshot = big.snapshot()
+cow_ms = (time.perf_counter() - start) * 1000
+start = time.perf_counter()
+for i in range(100):
+    copied = (dict(big_entries), list(big_order))
+copy_ms = (time.perf_counter() - start) * 1000 * 10
+assert snapshot.entries["id999"]['edited'] and len(snapshot.entries) == 100000, "修改后快照内容不正确!"
+print(f"✓ 10 万条目：1000 次修改并取快照 {cow_ms:.1f} ms，1000 次拷贝 dict + list 约 {copy_ms:.0f} ms")
+
+# 测试 5: 按 id 比较两个版本（外部修改数据库后只应用变化的条目）
+print("\n[测试 5] 版本比较")
+print("-" * 60)
+old = VaultState({f"id{i}": {'id': f"id{i}", 'updated_at': '2026-01-01'} for i in range(100)}, [f"id{i}" for i in range(100)])
+before = old.snapshot()
+new_entries = dict(before.entries)
+new_entries['id1'] = {'id': 'id1', 'updated_at': '2026-02-01'}
+new_entries['id2'] = {'id': 'id2', 'updated_at': '2026-01-01', 'note': '外部工具未更新 updated_at'}
+del new_entries['id3']
+new_entries['new'] = {'id': 'new', 'updated_at': '2026-02-01'}
+new_order = [entry_id for entry_id in before.order if entry_id != 'id3'] + ['new']
+diff = diff_entries(before.entries, before.order, new_entries, new_order)
+assert diff == {"added": ['new'], "changed": ['id1', 'id2'], "removed": ['id3'], "reordered": False}, diff
+assert diff_entries(before.entries, before.order, before.entries, list(reversed(before.order)))["reordered"], "未发现重新排序!"
+old.entries['id5'] = {'id': 'id5', 'updated_at': '2026-03-01'}
+after = old.snapshot()
+start = time.perf_counter()
+diff = diff_entries(before.entries, before.order, after.entries, after.order)
+assert diff["changed"] == ['id5'] and not diff["added"] and not diff["removed"], diff
+print(f"✓ 新增、修改（含未更新 updated_at 的修改）、删除和重新排序都能识别，快照之间比较 {((time.perf_counter() - start) * 1000):.2f} ms")
+
+print("\n✅ 条目快照测试通过")
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试后台数据库写入（合并连续修改、flush 屏障、原子替换）
+"""
+
+import os
+import tempfile
+
+from PyQt6.QtCore import Qt
+
+import crypto
+from crypto import CryptoManager, atomic_write
+from vault_writer import VaultWriter
+
+print("=" * 60)
+print("后台数据库写入测试")
+print("=" * 60)
+
+cm = CryptoManager()
+
+with tempfile.TemporaryDirectory() as temp_dir:
+    db_file = os.path.join(temp_dir, 'passwords.json.aes')
+    session = cm.create_session('test_password')
+    writer = VaultWriter(cm)
+
+    # 测试 1: 连续修改合并为一次写入
+    print("\n[测试 1] 合并连续修改")
+    print("-" * 60)
+    entries = {}
+    entries_order = []
+    for i in range(20):
+        entries[f'id{i}'] = {'id': f'id{i}', 'website_name': f'网站{i}', 'password': f'secret{i}'}
+        entries_order.append(f'id{i}')
+        writer.request_save(db_file, session, entries, entries_order)
+    # 提交后继续修改界面中的数据，不影响已提交的快照
+    entries.clear()
+    assert writer.flush(timeout=30), "flush 超时!"
+    assert writer.idle, "flush 后仍有待写入的保存!"
+    assert writer.saves_requested == 20 and writer.saves_written < 20, "连续修改未合并!"
+    loaded, order = cm.load_encrypted_db_with_session(db_file, session)
+    assert len(loaded) == 20 and order[-1] == 'id19', "写入的不是最新快照!"
+    print(f"✓ 20 次保存请求合并为 {writer.saves_written} 次写入，写入的是最新快照")
+
+    # 测试 2: 保存失败通过信号报告
+    print("\n[测试 2] 保存失败")
+    print("-" * 60)
+    errors = []
+    # 测试中没有事件循环，直接在写入线程中接收信号
+    writer.save_failed.connect(lambda error, unsaved: errors.append((error, unsaved)),
+                               Qt.ConnectionType.DirectConnection)
+    wiped_session = cm.create_session('test_password')
+    wiped_session.wipe()
+    writer.request_save(db_file, wiped_session, {}, [])
+    writer.flush()
+    assert errors and errors[0][1] is None, "完整快照保存失败未发出信号!"
+    assert cm.load_encrypted_db_with_session(db_file, session)[0] == loaded, "保存失败后数据库被修改!"
+    writer.request_records(db_file, wiped_session, [{"op": "put", "id": "id1", "entry": {'id': 'id1'}},
+                                                    {"op": "delete", "id": "id2"}])
+    writer.flush()
+    assert errors[-1][1] == {"id1", "id2"}, f"没有报告未写入的条目: {errors[-1]}"
+    print(f"✓ 保存失败通过信号报告：{errors[0][0]}，并返回没有写入的条目 id，原数据库保持不变")
+
+    # 测试 3: 写入中途出错时原文件保持原样，且不留下临时文件
+    print("\n[测试 3] 原子替换")
+    print("-" * 60)
+    with open(db_file, 'rb') as f:
+        before = f.read()
+    try:
+        with atomic_write(db_file) as f:
+            f.write(b"partial")
+            raise RuntimeError("模拟写入中途崩溃")
+    except RuntimeError:
+        pass
+    with open(db_file, 'rb') as f:
+        assert f.read() == before, "写入失败后数据库被截断!"
+    assert os.listdir(temp_dir) == ['passwords.json.aes'], "写入失败后留下了临时文件!"
+    print("✓ 写入中途出错时数据库保持原样，临时文件已清理")
+
+    # 测试 4: 单个条目的修改只追加到日志，日志过大时在后台合并
+    print("\n[测试 4] 变更日志与后台合并")
+    print("-" * 60)
+    writer.request_save(db_file, session, loaded, order)
+    writer.flush()
+    base_size = os.path.getsize(db_file)
+    writer.request_records(db_file, session, [{"op": "put", "id": "id3", "entry": {'id': 'id3', 'password': 'changed'}}])
+    writer.request_records(db_file, session, [{"op": "delete", "id": "id4"}])
+    writer.flush()
+    assert writer.records_appended == 2 and os.path.exists(cm.journal_path(db_file)), "修改未追加到日志!"
+    assert os.path.getsize(db_file) == base_size and writer.compactions == 0, "日志未超过阈值时不应重写数据库!"
+    loaded, order = cm.load_encrypted_db_with_session(db_file, session)
+    assert loaded['id3']['password'] == 'changed' and 'id4' not in loaded and 'id4' not in order, "日志重放结果不匹配!"
+
+    original_ratio = crypto.JOURNAL_COMPACT_RATIO
+    crypto.JOURNAL_COMPACT_RATIO = 0.0001
+    try:
+        writer.request_records(db_file, session, [{"op": "delete", "id": "id5"}])
+        writer.flush()
+    finally:
+        crypto.JOURNAL_COMPACT_RATIO = original_ratio
+    assert writer.compactions == 1 and not os.path.exists(cm.journal_path(db_file)), "日志超过阈值后未合并!"
+    loaded, order = cm.load_encrypted_db_with_session(db_file, session)
+    assert 'id5' not in loaded and len(loaded) == 18, "合并后的快照不匹配!"
+    print("✓ 修改只追加到日志，日志超过阈值后在写入线程中合并为新快照")
+
+    # 测试 5: 统计自上次写入以来变更的条目数
+    print("\n[测试 5] 变更条目统计")
+    print("-" * 60)
+    changed_before = writer.entries_changed
+    finished = []
+    writer.save_finished.connect(finished.append, Qt.ConnectionType.DirectConnection)
+    for _ in range(3):
+        writer.request_records(db_file, session, [{"op": "put", "id": "id6", "entry": {'id': 'id6', 'password': 'again'}}])
+    writer.request_records(db_file, session, [{"op": "delete", "id": "id7"}])
+    assert writer.changes_pending == 2, "同一条目的多次修改应只计一次!"
+    writer.flush()
+    assert writer.changes_pending == 0 and writer.last_write_changes == 2, "写入后的统计不正确!"
+    assert writer.entries_changed == changed_before + 2, "累计变更条目数不正确!"
+    assert finished == [2], f"写入完成信号的变更条目数不正确: {finished}"
+    print("✓ 写入线程报告自上次写入以来变更的条目数，写入完成时发出信号")
+
+    writer.close()
+    try:
+        writer.request_save(db_file, session, loaded, order)
+        raise AssertionError("关闭后仍可提交保存")
+    except AssertionError:
+        raise
+    except Exception:
+        print("✓ 关闭后的写入线程拒绝新的保存")
+    session.wipe()
+
+print("\n✅ 后台数据库写入测试通过")
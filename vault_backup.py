@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+增量、去重的本地备份
+
+备份的是数据库在磁盘上的加密文件（数据库、变更日志或 WAL、归档段），不解密，也不需要主密码。
+文件按内容定义分块：块边界只取决于附近的字节，文件中间插入或删除内容后，之后的块边界保持不变；
+每个块按 SHA-256 只存放一次，相邻两次备份只新增变化的块。
+两次日志合并之间的保存只追加变更日志，快照文件不变，这期间的连续备份基本只存储新追加的日志。
+
+备份目录结构：
+- chunks/<前两位>/<SHA-256>：数据块
+- snapshots/<时间>.json：一次备份的清单（每个文件的长度和块列表）
+
+保留策略保留最近若干个备份，并按小时、天、周各保留最近若干个时间段中最新的一个备份（最新的备份总是保留），
+删除其余清单后回收不再被任何清单引用的块。恢复时按清单重新拼出各个文件并逐块校验。
+"""
+
+import hashlib
+import json
+import os
+from datetime import datetime
+
+from crypto import atomic_write
+
+# 默认的备份目录（相对于数据库所在目录）
+DEFAULT_BACKUP_DIR = "backups"
+# 内容定义分块：超过最小长度后，在 2 字节窗口等于边界标记的位置切分，不超过最大长度；
+# 加密数据近似随机，平均块长约为最小长度 + 64 KiB。用 bytes.find 在 C 中查找标记，不逐字节计算滚动哈希
+CHUNK_MIN_SIZE = 16 * 1024
+CHUNK_MAX_SIZE = 256 * 1024
+CHUNK_BOUNDARY = b'\xa5\x5a'
+# 默认保留策略：最近 10 个备份，以及最近 24 个小时、7 天、4 周各保留一个备份
+DEFAULT_RETENTION = {"last": 10, "hourly": 24, "daily": 7, "weekly": 4}
+MANIFEST_VERSION = 1
+
+
+def split_chunks(data: bytes) -> list:
+    """按内容定义的边界把数据切成块"""
+    chunks = []
+    start = 0
+    length = len(data)
+    while start < length:
+        end = data.find(CHUNK_BOUNDARY, start + CHUNK_MIN_SIZE, start + CHUNK_MAX_SIZE)
+        end = min(start + CHUNK_MAX_SIZE, length) if end < 0 else end + len(CHUNK_BOUNDARY)
+        chunks.append(data[start:end])
+        start = end
+    return chunks
+
+
+def read_vault_files(file_path: str, paths: list) -> dict:
+    """读取数据库及其附属文件（不存在的跳过），返回 {相对数据库文件名的后缀: 内容}"""
+    files = {}
+    for path in paths:
+        if not path.startswith(file_path):
+            raise Exception(f"备份的文件必须与数据库同名：{path}")
+        try:
+            with open(path, 'rb') as f:
+                files[path[len(file_path):]] = f.read()
+        except FileNotFoundError:
+            pass
+    return files
+
+
+def _bucket_keys(created_at: datetime) -> dict:
+    year, week, _ = created_at.isocalendar()
+    return {"hourly": created_at.strftime("%Y-%m-%d %H"), "daily": created_at.strftime("%Y-%m-%d"),
+            "weekly": f"{year}-W{week:02d}"}
+
+
+def select_retained(backups: list, retention: dict) -> set:
+    """按保留策略选出要保留的备份名（backups 按时间从新到旧排列）"""
+    if not backups:
+        return set()
+    keep = {backup["name"] for backup in backups[:max(1, retention.get("last", 1))]}
+    for policy in ("hourly", "daily", "weekly"):
+        limit = retention.get(policy, 0)
+        seen = set()
+        for backup in backups:
+            if len(seen) >= limit:
+                break
+            key = _bucket_keys(datetime.fromisoformat(backup["created_at"]))[policy]
+            if key not in seen:
+                seen.add(key)
+                keep.add(backup["name"])
+    return keep
+
+
+class BackupStore:
+    """一个备份目录"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.chunks_dir = os.path.join(directory, "chunks")
+        self.snapshots_dir = os.path.join(directory, "snapshots")
+
+    def _chunk_path(self, digest: str) -> str:
+        return os.path.join(self.chunks_dir, digest[:2], digest)
+
+    def _manifest_path(self, name: str) -> str:
+        return os.path.join(self.snapshots_dir, name + ".json")
+
+    def list_backups(self, vault_name: str = None) -> list:
+        """所有备份的清单，按时间从新到旧排列；vault_name 只列出该数据库文件的备份"""
+        try:
+            names = [name[:-5] for name in os.listdir(self.snapshots_dir) if name.endswith(".json")]
+        except FileNotFoundError:
+            return []
+        backups = []
+        for name in names:
+            try:
+                with open(self._manifest_path(name), 'r', encoding='utf-8') as f:
+                    manifest = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if vault_name is None or manifest.get("vault") == vault_name:
+                backups.append(manifest)
+        backups.sort(key=lambda manifest: (manifest["created_at"], manifest["name"]), reverse=True)
+        return backups
+
+    def create(self, vault_name: str, files: dict, created_at: datetime = None) -> dict:
+        """备份一组文件（read_vault_files 的结果），只写入备份目录中还没有的块
+
+        与该数据库最近一次备份的内容完全相同时不创建新的备份，返回 None。
+
+        Returns:
+            dict: 新备份的清单，stats 为本次新增的块数和字节数
+        """
+        created_at = created_at or datetime.now()
+        manifest_files = {}
+        new_chunks = new_bytes = 0
+        for suffix, data in sorted(files.items()):
+            digests = []
+            for chunk in split_chunks(data):
+                digest = hashlib.sha256(chunk).hexdigest()
+                digests.append(digest)
+                path = self._chunk_path(digest)
+                if not os.path.exists(path):
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    with atomic_write(path) as f:
+                        f.write(chunk)
+                    new_chunks += 1
+                    new_bytes += len(chunk)
+            manifest_files[suffix] = {"size": len(data), "chunks": digests}
+
+        latest = self.list_backups(vault_name)
+        if latest and latest[0]["files"] == manifest_files:
+            return None
+
+        name = created_at.strftime("%Y%m%d-%H%M%S")
+        base, n = name, 1
+        while os.path.exists(self._manifest_path(name)):
+            name = f"{base}-{n}"
+            n += 1
+        manifest = {
+            "version": MANIFEST_VERSION, "name": name, "vault": vault_name,
+            "created_at": created_at.isoformat(timespec="seconds"), "files": manifest_files,
+            "stats": {"new_chunks": new_chunks, "new_bytes": new_bytes,
+                      "total_bytes": sum(len(data) for data in files.values())}
+        }
+        os.makedirs(self.snapshots_dir, exist_ok=True)
+        with atomic_write(self._manifest_path(name), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        return manifest
+
+    def restore(self, name: str, file_path: str, suffixes: list) -> None:
+        """把备份恢复为 file_path 及其附属文件
+
+        先读出并校验全部块，再逐个原子替换文件；suffixes 中备份里没有的附属文件
+        （例如备份之后才产生的变更日志或 WAL）会被删除，避免与恢复的数据库混用。
+        """
+        try:
+            with open(self._manifest_path(name), 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            raise Exception(f"备份 {name} 不存在")
+        contents = {}
+        for suffix, info in manifest["files"].items():
+            parts = []
+            for digest in info["chunks"]:
+                try:
+                    with open(self._chunk_path(digest), 'rb') as f:
+                        chunk = f.read()
+                except FileNotFoundError:
+                    raise Exception(f"备份 {name} 缺少数据块，无法恢复")
+                if hashlib.sha256(chunk).hexdigest() != digest:
+                    raise Exception(f"备份 {name} 的数据块已损坏，无法恢复")
+                parts.append(chunk)
+            data = b''.join(parts)
+            if len(data) != info["size"]:
+                raise Exception(f"备份 {name} 的文件长度不正确，无法恢复")
+            contents[suffix] = data
+
+        # 先删除备份中没有的附属文件（主文件最后替换，中途失败时旧数据库仍可用）
+        for suffix in suffixes:
+            if suffix and suffix not in contents and os.path.exists(file_path + suffix):
+                os.remove(file_path + suffix)
+        for suffix in sorted(contents, key=lambda suffix: suffix == ""):
+            with atomic_write(file_path + suffix) as f:
+                f.write(contents[suffix])
+
+    def prune(self, retention: dict = None) -> dict:
+        """按保留策略删除旧备份，并回收不再被引用的块
+
+        Returns:
+            dict: 删除的备份数、回收的块数和字节数
+        """
+        retention = DEFAULT_RETENTION if retention is None else retention
+        backups = self.list_backups()
+        keep = set()
+        by_vault = {}
+        for backup in backups:
+            by_vault.setdefault(backup.get("vault"), []).append(backup)
+        for vault_backups in by_vault.values():
+            keep |= select_retained(vault_backups, retention)
+
+        removed = 0
+        referenced = set()
+        for backup in backups:
+            if backup["name"] in keep:
+                for info in backup["files"].values():
+                    referenced.update(info["chunks"])
+            else:
+                # 先删除清单再回收块：中途中断只会留下未引用的块，下次继续回收
+                os.remove(self._manifest_path(backup["name"]))
+                removed += 1
+
+        reclaimed_chunks = reclaimed_bytes = 0
+        if os.path.isdir(self.chunks_dir):
+            for prefix in os.listdir(self.chunks_dir):
+                prefix_dir = os.path.join(self.chunks_dir, prefix)
+                for digest in os.listdir(prefix_dir):
+                    if digest not in referenced:
+                        path = os.path.join(prefix_dir, digest)
+                        reclaimed_bytes += os.path.getsize(path)
+                        os.remove(path)
+                        reclaimed_chunks += 1
+        return {"removed_backups": removed, "reclaimed_chunks": reclaimed_chunks,
+                "reclaimed_bytes": reclaimed_bytes}
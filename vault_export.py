@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+把选中的条目导出为新的加密数据库（用自己的主密码，例如分享给同事）
+
+新数据库有独立的数据密钥：在后台线程中为新主密码运行一次 Argon2，
+每个条目用当前的数据密钥解密后立即用新的数据密钥重新加密，不生成包含全部明文的中间文件或列表；
+文件扩展名为 .db 时写入 SQLite 存储，否则写入加密文件，写入方式与保存数据库相同（先写临时文件再替换）。
+"""
+
+from crypto import CryptoManager
+from sqlite_store import SQLiteCryptoManager
+
+
+def export_entries(crypto_manager, session, entries, entry_ids, file_path: str, password: str) -> int:
+    """把 entry_ids 中的条目导出到 file_path 处的新数据库（已存在时覆盖）
+
+    Args:
+        crypto_manager: 当前数据库的 CryptoManager（新数据库沿用它的密钥派生参数、压缩和加密算法）
+        session: 当前数据库的会话
+        entries: 条目字典（快照，导出期间界面的修改不影响导出的内容）
+        entry_ids: 要导出的条目 id（按导出后的顺序）
+
+    Returns:
+        int: 导出的条目数
+    """
+    manager_class = SQLiteCryptoManager if file_path.endswith(".db") else CryptoManager
+    manager = manager_class(kdf_params=dict(crypto_manager.kdf_params), compression=crypto_manager.compression,
+                            cipher=crypto_manager.cipher)
+    export_session = manager.create_session(password)
+    try:
+        data = {}
+        for entry_id in entry_ids:
+            data[entry_id] = manager.seal_entry(export_session, crypto_manager.reveal_entry(session, entries[entry_id]))
+        manager.save_encrypted_db_with_session(file_path, export_session, data, list(data))
+        return len(data)
+    finally:
+        export_session.wipe()
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多个进程同时打开同一个数据库时的文件锁（建议锁）
+
+锁保存在数据库旁边的 `<数据库>.lock` 文件中（数据库本身会被原子替换，不能直接加锁），
+使用文件中两段互不重叠的字节区间：
+
+- 写入者区间：可写模式打开时加排他锁，直到退出才释放；同一时间只有一个进程可以写入，
+  其他进程只能以只读模式打开
+- 数据区间：写入者每次写入数据库、日志或归档段时加排他锁，只读进程每次读取时加共享锁；
+  只读进程不会读到写了一半的日志，也不会读到刚合并的快照和旧日志的组合
+
+锁文件的内容记录写入者的进程号，锁被占用时用于提示。
+设置 stamp 后，每次写入前后各记录一次数据库的文件标记，用于区分本进程的写入和外部修改。
+POSIX 使用 fcntl.lockf；Windows 使用 msvcrt.locking，后者没有共享锁，读取时同样加排他锁。
+"""
+
+import json
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+LOCK_SUFFIX = ".lock"
+# 两个锁区间位于文件内容之后（允许对文件末尾之后的区间加锁），
+# Windows 上被锁住的区间不能读取，内容放在区间之外，其他进程仍可读取写入者信息
+OWNER_OFFSET = 1 << 20
+DATA_OFFSET = OWNER_OFFSET + 1
+# 等待数据区间的最长时间（秒）和轮询间隔
+DEFAULT_TIMEOUT = 5.0
+POLL_INTERVAL = 0.02
+
+
+def lock_path(file_path: str) -> str:
+    """数据库对应的锁文件路径"""
+    return file_path + LOCK_SUFFIX
+
+
+def _try_lock(fd: int, offset: int, shared: bool) -> bool:
+    """尝试对一个字节加锁（不等待），返回是否成功"""
+    try:
+        if fcntl is not None:
+            fcntl.lockf(fd, (fcntl.LOCK_SH if shared else fcntl.LOCK_EX) | fcntl.LOCK_NB, 1, offset)
+        else:
+            os.lseek(fd, offset, os.SEEK_SET)
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
+
+
+def _unlock(fd: int, offset: int) -> None:
+    if fcntl is not None:
+        fcntl.lockf(fd, fcntl.LOCK_UN, 1, offset)
+    else:
+        os.lseek(fd, offset, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+class VaultLock:
+    """一个数据库的锁
+
+    同一个进程只应为一个数据库创建一个 VaultLock：POSIX 的记录锁属于进程，
+    关闭同一文件的任何一个描述符都会释放该进程在这个文件上的全部锁。
+    """
+
+    def __init__(self, file_path: str, timeout: float = DEFAULT_TIMEOUT):
+        self.file_path = file_path
+        self.path = lock_path(file_path)
+        self.timeout = timeout
+        self._fd = None
+        self._owner = False
+        # 同一进程内的线程之间互斥使用数据区间（进程内的记录锁不会互相阻塞）
+        self._data_lock = threading.Lock()
+        # 可选：返回数据库当前文件标记的函数；本进程每次写入前后的标记记入 _own_writes
+        self.stamp = None
+        self._own_writes = []
+        self._own_writes_lock = threading.Lock()
+
+    @property
+    def owner(self) -> bool:
+        """本进程持有写入者锁"""
+        return self._owner
+
+    def _open(self) -> int:
+        if self._fd is None:
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        return self._fd
+
+    def acquire_owner(self) -> bool:
+        """以可写模式打开数据库：尝试取得写入者锁（不等待），返回是否成功"""
+        if self._owner:
+            return True
+        fd = self._open()
+        if not _try_lock(fd, OWNER_OFFSET, shared=False):
+            return False
+        self._owner = True
+        info = json.dumps({"pid": os.getpid(), "host": socket.gethostname(),
+                           "since": time.strftime("%Y-%m-%d %H:%M:%S")}).encode('utf-8')
+        os.ftruncate(fd, 0)
+        os.lseek(fd, 0, os.SEEK_SET)
+        os.write(fd, info)
+        return True
+
+    def owner_info(self) -> dict:
+        """当前写入者的信息（进程号、主机名、打开时间），读取失败时返回空字典"""
+        try:
+            with open(self.path, 'rb') as f:
+                return json.loads(f.read(4096) or b'{}')
+        except (OSError, ValueError):
+            return {}
+
+    def describe_owner(self) -> str:
+        """锁被占用时提示用的写入者描述"""
+        info = self.owner_info()
+        if not info.get("pid"):
+            return "另一个进程"
+        text = f"另一个进程（PID {info['pid']}"
+        if info.get("host") and info["host"] != socket.gethostname():
+            text += f"，主机 {info['host']}"
+        return text + "）"
+
+    def release(self) -> None:
+        """释放全部锁并关闭锁文件（锁文件保留，删除会与其他进程加锁竞争）"""
+        if self._fd is None:
+            return
+        if self._owner:
+            os.ftruncate(self._fd, 0)
+        os.close(self._fd)
+        self._fd = None
+        self._owner = False
+
+    def _acquire_data(self, shared: bool) -> None:
+        fd = self._open()
+        deadline = time.monotonic() + self.timeout
+        while not _try_lock(fd, DATA_OFFSET, shared):
+            if time.monotonic() >= deadline:
+                if shared:
+                    raise Exception("数据库正在被其他进程写入，请稍后重试")
+                raise Exception("数据库正在被其他进程读取，请稍后重试")
+            time.sleep(POLL_INTERVAL)
+
+    @contextmanager
+    def writing(self, record: bool = True):
+        """写入数据库、日志或归档段期间持有数据区间的排他锁（只有写入者可以使用）
+
+        备份等只需要读到一致文件、不写入的操作传 record=False，不记录写入前后的文件标记。
+        """
+        if not self._owner:
+            raise Exception("数据库以只读模式打开，无法写入")
+        with self._data_lock:
+            self._acquire_data(shared=False)
+            record = record and self.stamp is not None
+            before = self.stamp() if record else None
+            try:
+                yield
+            finally:
+                if record:
+                    with self._own_writes_lock:
+                        self._own_writes.append((before, self.stamp()))
+                _unlock(self._fd, DATA_OFFSET)
+
+    def take_own_writes(self) -> list:
+        """取出并清空本进程写入前后的文件标记 [(写入前, 写入后), ...]（按写入顺序）"""
+        with self._own_writes_lock:
+            writes, self._own_writes = self._own_writes, []
+        return writes
+
+    @contextmanager
+    def reading(self):
+        """读取数据库期间持有数据区间的共享锁
+
+        写入者读取自己写入的文件不需要加锁（同一进程内加共享锁还会把正在写入的排他锁降级）。
+        """
+        if self._owner:
+            yield
+            return
+        with self._data_lock:
+            self._acquire_data(shared=True)
+            try:
+                yield
+            finally:
+                _unlock(self._fd, DATA_OFFSET)
+
+
+def open_read_only(file_path: str, password: str, crypto_manager=None):
+    """以只读模式打开数据库（供脚本查询使用）：只加共享锁读取，不取得写入者锁，不启动写入线程
+
+    Returns:
+        (条目字典, 条目顺序, 会话密钥)；条目的密码需要用 crypto_manager.reveal_entry 解密
+    """
+    if crypto_manager is None:
+        from crypto import CryptoManager
+        from sqlite_store import SQLiteCryptoManager, is_sqlite_vault
+        crypto_manager = SQLiteCryptoManager() if is_sqlite_vault(file_path) else CryptoManager()
+    lock = VaultLock(file_path)
+    try:
+        with lock.reading():
+            return crypto_manager.unlock_db(file_path, password)
+    finally:
+        lock.release()
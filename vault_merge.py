@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+把另一个数据库的条目合并到当前数据库（合并导入）
+
+三方分别是当前数据库的条目、导入文件的条目和合并结果：
+- 条目先按 id 配对；id 没有配对的再按「规范化网址 + 用户名」配对（同一个账号在两个数据库中分别创建的情况），
+  配对后沿用当前数据库的条目 id
+- 只在导入文件中的条目加入当前数据库（当前数据库已移入归档的条目除外）；只在当前数据库中的条目保持不变
+- 配对的条目内容相同时跳过；不同时为冲突，按策略决定保留哪一边：
+  newer 保留 updated_at 较新的一边（相同时保留当前的），local 保留当前的，incoming 使用导入的
+
+配对用两个字典完成，比较条目内容时只解密索引字段相同的配对，整体代价与两边的条目数成线性关系。
+"""
+
+from urllib.parse import urlsplit
+
+from crypto import SECRET_FIELD
+
+POLICIES = ("newer", "local", "incoming")
+
+
+def normalize_url(url: str) -> str:
+    """规范化网址：忽略协议、登录信息、域名的大小写、www. 前缀、查询参数和末尾的斜杠"""
+    url = (url or "").strip()
+    if not url:
+        return ""
+    parts = urlsplit(url if "://" in url else "//" + url)
+    host = (parts.netloc.rsplit("@", 1)[-1]).lower()
+    if host.startswith("www."):
+        host = host[4:]
+    return host + parts.path.rstrip("/")
+
+
+def match_key(entry: dict):
+    """条目的辅助配对键（网址和用户名都为空时返回 None，不参与配对）"""
+    url = normalize_url(entry.get("url", ""))
+    username = (entry.get("username") or "").strip().lower()
+    if not url and not username:
+        return None
+    return url, username
+
+
+def _index_fields(entry: dict) -> dict:
+    """比较用的索引字段（不含密文和条目 id）"""
+    return {key: value for key, value in entry.items() if key not in (SECRET_FIELD, "id")}
+
+
+def plan_merge(local_entries, incoming_entries, incoming_order, reveal_local, reveal_incoming,
+               exclude=()) -> dict:
+    """比较两个数据库的条目，找出新增的条目和冲突
+
+    Args:
+        reveal_local / reveal_incoming: 解密两边条目的函数（返回包含密码和完整备注的副本）
+        exclude: 不从导入文件加入的条目 id（例如当前数据库已移入归档的条目）
+
+    Returns:
+        dict: add 为加入当前数据库的导入条目 id（按导入文件中的顺序），conflicts 为内容不同的配对
+        [(当前条目 id, 导入条目 id)]，unchanged 为内容相同的配对数，skipped 为因 exclude 跳过的条目数
+    """
+    pairs = []
+    paired_local = set()
+    unmatched = []
+    for entry_id in incoming_order:
+        if entry_id in local_entries:
+            pairs.append((entry_id, entry_id))
+            paired_local.add(entry_id)
+        else:
+            unmatched.append(entry_id)
+
+    # 只为没有按 id 配对的当前条目建立辅助键索引（同一个键出现多次时取第一个）
+    by_key = {}
+    for entry_id, entry in local_entries.items():
+        if entry_id not in paired_local:
+            key = match_key(entry)
+            if key is not None:
+                by_key.setdefault(key, entry_id)
+
+    plan = {"add": [], "conflicts": [], "unchanged": 0, "skipped": 0}
+    for entry_id in unmatched:
+        local_id = by_key.pop(match_key(incoming_entries[entry_id]), None)
+        if local_id is not None:
+            pairs.append((local_id, entry_id))
+        elif entry_id in exclude:
+            plan["skipped"] += 1
+        else:
+            plan["add"].append(entry_id)
+
+    for local_id, entry_id in pairs:
+        local = local_entries[local_id]
+        incoming = incoming_entries[entry_id]
+        if _index_fields(local) == _index_fields(incoming) and \
+                _index_fields(reveal_local(local)) == _index_fields(reveal_incoming(incoming)):
+            plan["unchanged"] += 1
+        else:
+            plan["conflicts"].append((local_id, entry_id))
+    return plan
+
+
+def resolve_conflicts(conflicts, local_entries, incoming_entries, policy: str = "newer") -> list:
+    """按策略处理冲突，返回使用导入条目的配对 [(当前条目 id, 导入条目 id)]"""
+    if policy not in POLICIES:
+        raise Exception(f"未知的冲突处理策略: {policy}")
+    if policy == "local":
+        return []
+    if policy == "incoming":
+        return list(conflicts)
+    return [(local_id, entry_id) for local_id, entry_id in conflicts
+            if (incoming_entries[entry_id].get("updated_at") or "") >
+            (local_entries[local_id].get("updated_at") or "")]
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+条目摘要的 Merkle 树：比较数据库的两个副本时只比较不同的分支
+
+叶子是每个条目的摘要（BLAKE2b，条目内容按键排序后序列化），按条目 id 的哈希分桶：
+树的扇出为 16、深度为 depth，id 哈希的前 depth 个十六进制位决定条目所在的桶；
+桶的摘要由桶内按 id 排序的 (id, 叶子摘要) 计算，上层节点是 16 个子节点摘要的摘要。
+两棵树从根开始只展开摘要不同的子树，找出内容不同的桶，代价为 O(变化数 · log n)。
+
+保存完整快照时，树的最底层（桶摘要）用数据密钥加密后写入文件头，上层节点在读取时重新计算；
+之后追加的变更日志（SQLite 为变更的行）只记录变更的条目 id，比较时这些 id 所在的桶按不同处理。
+"""
+
+import hashlib
+import json
+import struct
+import threading
+
+FANOUT = 16
+# 最大深度（16^3 = 4096 个桶，文件头中的树约 64 KiB）
+MAX_DEPTH = 3
+# 选择深度时每个桶的平均条目数上限
+BUCKET_TARGET = 8
+DIGEST_SIZE = 16
+TREE_FORMAT = 1
+TREE_PREFIX = struct.Struct(">BB")
+EMPTY_BUCKET = hashlib.blake2b(b"", digest_size=DIGEST_SIZE).digest()
+
+
+def leaf_digest(entry: dict) -> bytes:
+    """条目内容的摘要（与键的顺序无关）"""
+    content = json.dumps(entry, ensure_ascii=False, sort_keys=True).encode('utf-8')
+    return hashlib.blake2b(content, digest_size=DIGEST_SIZE).digest()
+
+
+def id_hash(entry_id: str) -> int:
+    """条目 id 的 64 位哈希（决定条目所在的桶）"""
+    return int.from_bytes(hashlib.blake2b(entry_id.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+def depth_for(count: int) -> int:
+    """按条目数选择树的深度"""
+    depth = 1
+    while depth < MAX_DEPTH and FANOUT ** depth * BUCKET_TARGET < count:
+        depth += 1
+    return depth
+
+
+def _bucket_digest(items: list) -> bytes:
+    if not items:
+        return EMPTY_BUCKET
+    h = hashlib.blake2b(digest_size=DIGEST_SIZE)
+    for entry_id, leaf in sorted(items):
+        h.update(entry_id.encode('utf-8') + b'\x00' + leaf)
+    return h.digest()
+
+
+class DigestCache:
+    """按条目对象缓存叶子摘要和上一次的树
+
+    快照之间共享未修改的条目对象（vault_snapshot），重复保存或比较时只为替换过的条目重新计算摘要，
+    只重新计算这些条目所在的桶。写入线程和界面线程共用一个缓存，计算时加锁。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # {条目 id: (条目对象, 叶子摘要, id 哈希)}
+        self._cache = {}
+        self._tree = None
+
+    def tree(self, entries, depth: int = None) -> "MerkleTree":
+        """条目的 Merkle 树（depth 默认按条目数选择）"""
+        depth = depth or depth_for(len(entries))
+        shift = 64 - 4 * depth
+        with self._lock:
+            cache = self._cache
+            previous = self._tree if self._tree is not None and self._tree.depth == depth else None
+            fresh = {}
+            groups = [[] for _ in range(FANOUT ** depth)]
+            dirty = set()
+            for entry_id, entry in entries.items():
+                cached = cache.get(entry_id)
+                if cached is None or cached[0] is not entry:
+                    cached = (entry, leaf_digest(entry), id_hash(entry_id))
+                    dirty.add(cached[2] >> shift)
+                fresh[entry_id] = cached
+                groups[cached[2] >> shift].append(entry_id)
+            if previous is None:
+                buckets = [_bucket_digest([(entry_id, fresh[entry_id][1]) for entry_id in group]) for group in groups]
+            else:
+                dirty.update(cache[entry_id][2] >> shift for entry_id in cache.keys() - fresh.keys())
+                buckets = list(previous.levels[-1])
+                for bucket in dirty:
+                    buckets[bucket] = _bucket_digest([(entry_id, fresh[entry_id][1]) for entry_id in groups[bucket]])
+            self._cache = fresh
+            self._tree = MerkleTree(depth, buckets, groups)
+            return self._tree
+
+
+class MerkleTree:
+    """按桶组织的 Merkle 树
+
+    从条目构建的树记录每个桶中的条目 id（groups）；从文件头读出的树只有各层摘要。
+    """
+
+    def __init__(self, depth: int, buckets: list, groups: list = None):
+        if not 1 <= depth <= MAX_DEPTH or len(buckets) != FANOUT ** depth:
+            raise Exception("Merkle 树结构无效")
+        self.depth = depth
+        self.groups = groups
+        # levels[0] 为根，levels[depth] 为桶
+        self.levels = [buckets]
+        level = buckets
+        while len(level) > 1:
+            level = [hashlib.blake2b(b''.join(level[i:i + FANOUT]), digest_size=DIGEST_SIZE).digest()
+                     for i in range(0, len(level), FANOUT)]
+            self.levels.insert(0, level)
+
+    @property
+    def root(self) -> bytes:
+        return self.levels[0][0]
+
+    def bucket_of(self, entry_id: str) -> int:
+        """条目 id 所在的桶"""
+        return id_hash(entry_id) >> (64 - 4 * self.depth)
+
+    def diff(self, other: "MerkleTree") -> list:
+        """从根开始只展开摘要不同的子树，返回内容不同的桶（两棵树的深度必须相同）"""
+        if other.depth != self.depth:
+            raise Exception("Merkle 树深度不同，无法比较")
+        buckets = []
+        stack = [(0, 0)]
+        while stack:
+            level, index = stack.pop()
+            if self.levels[level][index] == other.levels[level][index]:
+                continue
+            if level == self.depth:
+                buckets.append(index)
+            else:
+                stack.extend((level + 1, index * FANOUT + i) for i in range(FANOUT))
+        return sorted(buckets)
+
+    def to_bytes(self) -> bytes:
+        """序列化（只保存桶摘要）"""
+        return TREE_PREFIX.pack(TREE_FORMAT, self.depth) + b''.join(self.levels[-1])
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "MerkleTree":
+        version, depth = TREE_PREFIX.unpack_from(data)
+        if version != TREE_FORMAT:
+            raise Exception(f"不支持的 Merkle 树格式 {version}")
+        body = data[TREE_PREFIX.size:]
+        return cls(depth, [body[i:i + DIGEST_SIZE] for i in range(0, len(body), DIGEST_SIZE)])
@@ -0,0 +1,403 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+持久化（写时复制）的条目快照
+
+条目字典和条目顺序保存为不可变的结构：每次修改生成一个新版本，
+只复制被修改的一小段路径，其余部分与旧版本共享。取得快照只是拿到当前版本的引用，
+后台写入、搜索和导出可以直接使用快照，不需要拷贝整个字典，也不需要加锁。
+
+- PersistentMap：两层、每层 256 路的哈希前缀树，叶子是小字典；
+  修改一个条目只复制一个叶子和两个 256 项的元组
+- PersistentList：分块的元组，追加只复制最后一块和块索引
+- VaultState：界面线程持有的当前版本，entries / order 是行为与 dict / list 相同的可变视图，
+  snapshot() 返回当前版本
+
+条目本身（每个条目的字典）视为不可变的值：修改条目时整体替换，不在原字典上修改。
+"""
+
+from bisect import bisect_right
+from itertools import accumulate
+from collections.abc import Mapping, MutableMapping, MutableSequence, Sequence
+
+# 哈希前缀树每层的分支数（2 的幂）和层数
+MAP_FANOUT = 256
+MAP_BITS = 8
+# 条目顺序每块的长度
+LIST_CHUNK_SIZE = 512
+
+_EMPTY_NODE = (None,) * MAP_FANOUT
+
+
+class PersistentMap(Mapping):
+    """不可变的哈希映射，set/remove/update 返回新版本，未修改的叶子与旧版本共享"""
+
+    __slots__ = ("_root", "_size")
+
+    def __init__(self, root: tuple = _EMPTY_NODE, size: int = 0):
+        self._root = root
+        self._size = size
+
+    @classmethod
+    def from_dict(cls, data: Mapping) -> "PersistentMap":
+        return cls().update(data)
+
+    @staticmethod
+    def _slots(key) -> tuple[int, int]:
+        h = hash(key)
+        return h & (MAP_FANOUT - 1), (h >> MAP_BITS) & (MAP_FANOUT - 1)
+
+    def _leaf(self, key):
+        i, j = self._slots(key)
+        node = self._root[i]
+        return None if node is None else node[j]
+
+    def __getitem__(self, key):
+        leaf = self._leaf(key)
+        if leaf is None:
+            raise KeyError(key)
+        return leaf[key]
+
+    def __contains__(self, key) -> bool:
+        leaf = self._leaf(key)
+        return leaf is not None and key in leaf
+
+    def get(self, key, default=None):
+        leaf = self._leaf(key)
+        return default if leaf is None else leaf.get(key, default)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __iter__(self):
+        for node in self._root:
+            if node is not None:
+                for leaf in node:
+                    if leaf:
+                        yield from leaf
+
+    def items(self):
+        for node in self._root:
+            if node is not None:
+                for leaf in node:
+                    if leaf:
+                        yield from leaf.items()
+
+    def _apply(self, changes: dict, removals) -> "PersistentMap":
+        """按叶子分组批量修改：每个被修改的叶子和路径只复制一次"""
+        grouped = {}
+        for key, value in changes.items():
+            grouped.setdefault(self._slots(key), ({}, []))[0][key] = value
+        for key in removals:
+            grouped.setdefault(self._slots(key), ({}, []))[1].append(key)
+        if not grouped:
+            return self
+
+        root = list(self._root)
+        nodes = {}
+        size = self._size
+        for (i, j), (updates, deletes) in grouped.items():
+            if i not in nodes:
+                nodes[i] = list(root[i] or _EMPTY_NODE)
+            leaf = dict(nodes[i][j] or {})
+            before = len(leaf)
+            leaf.update(updates)
+            for key in deletes:
+                leaf.pop(key, None)
+            size += len(leaf) - before
+            nodes[i][j] = leaf or None
+        for i, node in nodes.items():
+            root[i] = tuple(node) if any(node) else None
+        return PersistentMap(tuple(root), size)
+
+    def set(self, key, value) -> "PersistentMap":
+        return self._apply({key: value}, ())
+
+    def remove(self, key) -> "PersistentMap":
+        return self._apply({}, (key,))
+
+    def update(self, data: Mapping) -> "PersistentMap":
+        return self._apply(dict(data), ())
+
+    def remove_many(self, keys) -> "PersistentMap":
+        return self._apply({}, keys)
+
+    def to_dict(self) -> dict:
+        return dict(self.items())
+
+
+class PersistentList(Sequence):
+    """不可变的分块序列，修改返回新版本，未修改的块与旧版本共享"""
+
+    __slots__ = ("_chunks", "_offsets")
+
+    def __init__(self, chunks: tuple = ()):
+        self._chunks = chunks
+        # 每块的起始位置（最后一项为总长度），按位置查找时二分
+        self._offsets = tuple(accumulate(map(len, chunks), initial=0))
+
+    @classmethod
+    def from_iterable(cls, items) -> "PersistentList":
+        items = tuple(items)
+        return cls(tuple(items[i:i + LIST_CHUNK_SIZE] for i in range(0, len(items), LIST_CHUNK_SIZE)))
+
+    def __len__(self) -> int:
+        return self._offsets[-1]
+
+    def __iter__(self):
+        for chunk in self._chunks:
+            yield from chunk
+
+    def _locate(self, index: int) -> tuple[int, int]:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("索引超出范围")
+        c = bisect_right(self._offsets, index) - 1
+        return c, index - self._offsets[c]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(self)[index]
+        c, i = self._locate(index)
+        return self._chunks[c][i]
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (PersistentList, list, tuple)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"PersistentList({list(self)!r})"
+
+    def extend(self, items) -> "PersistentList":
+        """在末尾追加：只复制最后一块（未满时）和块索引"""
+        items = tuple(items)
+        if not items:
+            return self
+        chunks = list(self._chunks)
+        if chunks and len(chunks[-1]) < LIST_CHUNK_SIZE:
+            items = chunks.pop() + items
+        chunks.extend(items[i:i + LIST_CHUNK_SIZE] for i in range(0, len(items), LIST_CHUNK_SIZE))
+        return PersistentList(tuple(chunks))
+
+    def append(self, item) -> "PersistentList":
+        return self.extend((item,))
+
+    def delete(self, index: int) -> "PersistentList":
+        """删除一个位置：只复制所在的块"""
+        c, i = self._locate(index)
+        chunk = self._chunks[c][:i] + self._chunks[c][i + 1:]
+        return PersistentList(self._chunks[:c] + ((chunk,) if chunk else ()) + self._chunks[c + 1:])
+
+    def replace(self, index: int, item) -> "PersistentList":
+        c, i = self._locate(index)
+        chunk = self._chunks[c][:i] + (item,) + self._chunks[c][i + 1:]
+        return PersistentList(self._chunks[:c] + (chunk,) + self._chunks[c + 1:])
+
+    def insert(self, index: int, item) -> "PersistentList":
+        if index >= len(self):
+            return self.append(item)
+        c, i = self._locate(max(index, -len(self)))
+        chunk = self._chunks[c][:i] + (item,) + self._chunks[c][i:]
+        return PersistentList(self._chunks[:c] + (chunk,) + self._chunks[c + 1:])
+
+    def remove_items(self, items) -> "PersistentList":
+        """删除给定的元素：只重建包含这些元素的块"""
+        items = set(items)
+        if not items:
+            return self
+        chunks = []
+        for chunk in self._chunks:
+            if items.isdisjoint(chunk):
+                chunks.append(chunk)
+            else:
+                kept = tuple(item for item in chunk if item not in items)
+                if kept:
+                    chunks.append(kept)
+        return PersistentList(tuple(chunks))
+
+
+class VaultSnapshot:
+    """某一时刻的条目和条目顺序（不可变，可以在任意线程中读取）"""
+
+    __slots__ = ("entries", "order", "version")
+
+    def __init__(self, entries: PersistentMap, order: PersistentList, version: int):
+        self.entries = entries
+        self.order = order
+        self.version = version
+
+    def ordered_entries(self):
+        """按顺序遍历条目"""
+        entries = self.entries
+        for entry_id in self.order:
+            entry = entries.get(entry_id)
+            if entry is not None:
+                yield entry
+
+
+class VaultState:
+    """界面线程持有的当前版本
+
+    entries / order 是可变视图，用法与 dict / list 相同，每次修改都替换为新版本；
+    snapshot() 只返回当前版本的引用，之后的修改不会影响已取得的快照。
+    """
+
+    def __init__(self, entries: Mapping = None, order=None):
+        self._entries = PersistentMap()
+        self._order = PersistentList()
+        self.version = 0
+        self.entries = _EntriesView(self)
+        self.order = _OrderView(self)
+        self.replace(entries or {}, order or ())
+
+    def snapshot(self) -> VaultSnapshot:
+        return VaultSnapshot(self._entries, self._order, self.version)
+
+    def replace(self, entries: Mapping = None, order=None) -> None:
+        """整体替换条目或条目顺序（解锁、加载、锁定时调用）"""
+        if entries is not None:
+            self._set_entries(entries if isinstance(entries, PersistentMap) else PersistentMap.from_dict(entries))
+        if order is not None:
+            self._set_order(order if isinstance(order, PersistentList) else PersistentList.from_iterable(order))
+
+    def _set_entries(self, entries: PersistentMap) -> None:
+        self._entries = entries
+        self.version += 1
+
+    def _set_order(self, order: PersistentList) -> None:
+        self._order = order
+        self.version += 1
+
+
+class _EntriesView(MutableMapping):
+    """当前版本条目字典的可变视图"""
+
+    __slots__ = ("_state",)
+
+    def __init__(self, state: VaultState):
+        self._state = state
+
+    def __getitem__(self, key):
+        return self._state._entries[key]
+
+    def __contains__(self, key) -> bool:
+        return key in self._state._entries
+
+    def get(self, key, default=None):
+        return self._state._entries.get(key, default)
+
+    def __setitem__(self, key, value) -> None:
+        self._state._set_entries(self._state._entries.set(key, value))
+
+    def __delitem__(self, key) -> None:
+        if key not in self._state._entries:
+            raise KeyError(key)
+        self._state._set_entries(self._state._entries.remove(key))
+
+    def __iter__(self):
+        return iter(self._state._entries)
+
+    def __len__(self) -> int:
+        return len(self._state._entries)
+
+    def items(self):
+        return list(self._state._entries.items())
+
+    def update(self, data=(), **kwargs) -> None:
+        """批量修改只生成一个新版本"""
+        changes = dict(data, **kwargs)
+        if changes:
+            self._state._set_entries(self._state._entries.update(changes))
+
+    def remove_many(self, keys) -> None:
+        """批量删除（不存在的键忽略）只生成一个新版本"""
+        keys = list(keys)
+        if keys:
+            self._state._set_entries(self._state._entries.remove_many(keys))
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self._state._entries.to_dict()!r})"
+
+
+class _OrderView(MutableSequence):
+    """当前版本条目顺序的可变视图"""
+
+    __slots__ = ("_state",)
+
+    def __init__(self, state: VaultState):
+        self._state = state
+
+    def __getitem__(self, index):
+        return self._state._order[index]
+
+    def __setitem__(self, index, value) -> None:
+        if isinstance(index, slice):
+            items = list(self._state._order)
+            items[index] = value
+            self._state._set_order(PersistentList.from_iterable(items))
+        else:
+            self._state._set_order(self._state._order.replace(index, value))
+
+    def __delitem__(self, index) -> None:
+        if isinstance(index, slice):
+            items = list(self._state._order)
+            del items[index]
+            self._state._set_order(PersistentList.from_iterable(items))
+        else:
+            self._state._set_order(self._state._order.delete(index))
+
+    def __len__(self) -> int:
+        return len(self._state._order)
+
+    def __iter__(self):
+        return iter(self._state._order)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, _OrderView):
+            other = other._state._order
+        return self._state._order == other
+
+    def insert(self, index: int, value) -> None:
+        self._state._set_order(self._state._order.insert(index, value))
+
+    def append(self, value) -> None:
+        self._state._set_order(self._state._order.append(value))
+
+    def extend(self, values) -> None:
+        """批量追加只生成一个新版本"""
+        self._state._set_order(self._state._order.extend(values))
+
+    def remove_items(self, values) -> None:
+        """批量删除元素只生成一个新版本"""
+        self._state._set_order(self._state._order.remove_items(values))
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({list(self._state._order)!r})"
+
+
+def diff_entries(old_entries: Mapping, old_order, new_entries: Mapping, new_order) -> dict:
+    """按条目 id 比较两个版本
+
+    同一个条目对象（快照之间共享）直接跳过；updated_at 不同即视为修改，
+    相同时再比较内容（外部工具修改条目时不一定更新 updated_at）。
+
+    Returns:
+        dict: added / changed 为新增和修改的条目 id（按新顺序），removed 为删除的条目 id（按旧顺序），
+        reordered 表示两个版本都有的条目相对顺序是否变化
+    """
+    added, changed = [], []
+    for entry_id in new_order:
+        new = new_entries.get(entry_id)
+        if new is None:
+            continue
+        old = old_entries.get(entry_id)
+        if old is None:
+            added.append(entry_id)
+        elif old is not new and (old.get('updated_at') != new.get('updated_at') or old != new):
+            changed.append(entry_id)
+    removed = [entry_id for entry_id in old_order if entry_id not in new_entries]
+    kept_old = [entry_id for entry_id in old_order if entry_id in new_entries]
+    kept_new = [entry_id for entry_id in new_order if entry_id in old_entries]
+    return {"added": added, "changed": changed, "removed": removed, "reordered": kept_old != kept_new}
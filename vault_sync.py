@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+与文件夹中的数据库副本同步（U 盘、同步盘等）
+
+文件夹中的数据库与本地数据库同名，是本地数据库的副本（同一个数据密钥，主密码可以在别处修改过）。
+文件夹中还没有数据库时写入一份副本；已有时先比较两边的 Merkle 树（vault_merkle），
+树相同说明两边一致，不解密副本的条目；不同时只比较摘要不同的桶中的条目，
+两边只交换内容不同的条目：推送到副本的条目追加到副本的变更日志（之后合并，更新副本的树），
+拉取的条目交给调用方保存。
+
+- 只在一边存在的条目：上次同步后两边都有（记录在同步记录中）说明在另一边被删除，同样删除；否则复制到另一边
+- 两边都有但内容不同：保留 updated_at 较新的一边（相同时以本地为准）
+- 条目的 secret 字段由同一个数据密钥加密，在两边之间原样复制
+"""
+
+import os
+
+from crypto import CryptoManager
+from sqlite_store import SQLiteCryptoManager, is_sqlite_vault
+from vault_lock import VaultLock
+
+
+def plan_sync(local_entries, remote_entries, entry_ids, base_ids=(), exclude=()) -> dict:
+    """比较候选条目，决定每个条目的同步方向
+
+    Args:
+        entry_ids: 需要比较的条目 id（摘要不同的桶中的条目）
+        base_ids: 上次同步后两边共有的条目 id
+        exclude: 本地不拉取也不删除的条目 id（例如本地已移入归档的条目）
+
+    Returns:
+        dict: push / pull 为复制到副本和本地的条目 id，delete_remote / delete_local 为两边要删除的条目 id
+    """
+    plan = {"push": [], "pull": [], "delete_remote": [], "delete_local": []}
+    for entry_id in sorted(entry_ids):
+        local = local_entries.get(entry_id)
+        remote = remote_entries.get(entry_id)
+        if local is not None and remote is not None:
+            if local != remote:
+                newer_remote = (remote.get('updated_at') or '') > (local.get('updated_at') or '')
+                plan["pull" if newer_remote else "push"].append(entry_id)
+        elif local is not None:
+            plan["delete_local" if entry_id in base_ids else "push"].append(entry_id)
+        elif remote is not None and entry_id not in exclude:
+            plan["delete_remote" if entry_id in base_ids else "pull"].append(entry_id)
+    return plan
+
+
+def sync_with_copy(crypto_manager, session, entries, entries_order, remote_path: str,
+                   base_ids=(), exclude=()) -> dict:
+    """与 remote_path 处的数据库副本同步（副本不存在时创建）
+
+    调用方需要先等待本地的保存写完；本地的变化（pull / delete_local）由调用方应用并保存。
+    同步期间持有副本的写入者锁，副本正在被其他窗口以可写模式使用时报错。
+
+    Returns:
+        dict: plan_sync 的结果，另有 pulled（拉取的条目）、synced_ids（同步后两边共有的条目 id）、
+        created（是否新建了副本）、buckets（比较的桶数和总桶数，没有比较 Merkle 树时为 None）
+    """
+    lock = VaultLock(remote_path)
+    if not lock.acquire_owner():
+        raise Exception(f"文件夹中的数据库正在被{lock.describe_owner()}以可写模式使用，请关闭后再同步")
+    try:
+        with lock.writing():
+            if not os.path.exists(remote_path):
+                crypto_manager.save_encrypted_db_with_session(remote_path, session, entries, entries_order)
+                return {"push": list(entries_order), "pull": [], "delete_remote": [], "delete_local": [],
+                        "pulled": {}, "synced_ids": set(entries), "created": True, "buckets": None}
+
+            manager_class = SQLiteCryptoManager if is_sqlite_vault(remote_path) else CryptoManager
+            remote_manager = manager_class(compression=crypto_manager.compression, cipher=crypto_manager.cipher)
+            remote_session = remote_manager.session_for_copy(remote_path, session)
+            try:
+                return _sync_existing(crypto_manager, entries, remote_manager, remote_session, remote_path,
+                                      base_ids, exclude)
+            finally:
+                remote_session.wipe()
+    finally:
+        lock.release()
+
+
+def _sync_existing(crypto_manager, entries, remote_manager, remote_session, remote_path, base_ids, exclude):
+    remote_tree, remote_changed = remote_manager.read_merkle(remote_path, remote_session)
+    buckets = None
+    if remote_tree is not None:
+        local_tree = crypto_manager.merkle_tree(entries, remote_tree.depth)
+        differing = set(local_tree.diff(remote_tree))
+        differing.update(remote_tree.bucket_of(entry_id) for entry_id in remote_changed)
+        buckets = (len(differing), len(remote_tree.levels[-1]))
+        if not differing:
+            return {"push": [], "pull": [], "delete_remote": [], "delete_local": [], "pulled": {},
+                    "synced_ids": set(entries), "created": False, "buckets": buckets}
+
+    try:
+        remote_entries, _ = remote_manager.load_encrypted_db_with_session(remote_path, remote_session)
+    except Exception:
+        raise Exception("文件夹中的数据库不是当前数据库的副本（数据密钥不同），无法同步")
+    if remote_tree is None:
+        candidates = set(entries) | set(remote_entries)
+    else:
+        candidates = {entry_id for bucket in differing for entry_id in local_tree.groups[bucket]}
+        candidates.update(entry_id for entry_id in remote_entries if remote_tree.bucket_of(entry_id) in differing)
+    plan = plan_sync(entries, remote_entries, candidates, base_ids, exclude)
+
+    records = [{"op": "put", "id": entry_id, "entry": entries[entry_id]} for entry_id in plan["push"]]
+    records += [{"op": "delete", "id": entry_id} for entry_id in plan["delete_remote"]]
+    if records:
+        remote_manager.append_journal(remote_path, remote_session, records)
+    if records or remote_changed:
+        # 合并副本的变更日志并更新树，下次同步时两边一致即可直接判断，不必再解密副本
+        remote_manager.compact_journal(remote_path, remote_session)
+
+    local_ids = (set(entries) - set(plan["delete_local"])) | set(plan["pull"])
+    remote_ids = (set(remote_entries) - set(plan["delete_remote"])) | set(plan["push"])
+    return {**plan, "pulled": {entry_id: remote_entries[entry_id] for entry_id in plan["pull"]},
+            "synced_ids": local_ids & remote_ids, "created": False, "buckets": buckets}
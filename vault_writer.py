@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+后台数据库写入线程
+
+界面线程只提交条目快照，写入线程把短时间内的连续修改合并为一次
+序列化-加密-写入；数据库先写入临时文件并 fsync，再原子替换，
+写入中途崩溃不会留下被截断的数据库。
+
+单个条目的修改以日志记录的形式提交，只追加到变更日志；
+日志超过阈值后由写入线程在后台合并为新的快照。
+
+写入线程在第一次提交保存时才启动，只读模式下不会启动。
+"""
+
+import threading
+import time
+from contextlib import nullcontext
+
+from PyQt6.QtCore import QObject, pyqtSignal
+
+from vault_snapshot import PersistentList, PersistentMap
+
+# 合并连续修改的等待时间（秒）
+COALESCE_DELAY = 0.2
+
+
+class VaultWriter(QObject):
+    """后台数据库写入线程
+
+    锁定、退出以及直接读写数据库文件（更改主密码、导入/导出）之前调用 flush()，
+    等待已提交的保存全部落盘。
+    """
+
+    # 保存失败时发出，参数为错误信息和没有写入的条目 id（完整快照没有写入时为 None），在界面线程中处理
+    save_failed = pyqtSignal(str, object)
+    # 写入完成时发出，参数为本次写入的变更条目数，在界面线程中处理
+    save_finished = pyqtSignal(int)
+
+    def __init__(self, crypto_manager, parent=None, vault_lock=None):
+        super().__init__(parent)
+        self.crypto_manager = crypto_manager
+        # 多进程文件锁（vault_lock.VaultLock），每次写入期间持有数据区间的排他锁
+        self.vault_lock = vault_lock
+        self.saves_requested = 0
+        self.saves_written = 0
+        self.records_appended = 0
+        self.compactions = 0
+        # 统计：累计写入的变更条目数、最近一次写入包含的变更条目数
+        self.entries_changed = 0
+        self.last_write_changes = 0
+        self._condition = threading.Condition()
+        self._pending = None
+        self._records = []
+        self._records_target = None
+        self._snapshot_changes = 0
+        self._changed_ids = set()
+        self._writing = False
+        self._flushing = 0
+        self._closed = False
+        self._thread = None
+        # 本次写入中尚未落盘的条目 id（只在写入线程中使用）
+        self._unsaved = None
+
+    @property
+    def idle(self) -> bool:
+        """没有待写入或正在写入的保存"""
+        with self._condition:
+            return self._is_idle()
+
+    def _start(self) -> None:
+        """第一次提交保存时启动写入线程（在持有 _condition 时调用）"""
+        if self._closed:
+            raise Exception("写入线程已停止，无法保存")
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="VaultWriter", daemon=True)
+            self._thread.start()
+
+    def _is_idle(self) -> bool:
+        return self._pending is None and not self._records and not self._writing
+
+    @property
+    def changes_pending(self) -> int:
+        """自上次写入以来变更、尚未写入的条目数"""
+        with self._condition:
+            return self._snapshot_changes + len(self._changed_ids)
+
+    def request_save(self, file_path: str, session, entries: dict, entries_order: list, changes: int = None) -> None:
+        """提交一次保存
+
+        传入不可变的快照（vault_snapshot）时直接引用，不再拷贝；其他容器立即拷贝，
+        之后界面线程可以继续修改。写入前再次提交时，只保留最新的快照。
+        changes 为变更的条目数（默认按全部条目计）。
+        """
+        if not isinstance(entries, PersistentMap):
+            entries = dict(entries)
+        if not isinstance(entries_order, PersistentList):
+            entries_order = list(entries_order)
+        snapshot = (file_path, session, entries, entries_order)
+        with self._condition:
+            self._start()
+            # 完整快照已包含之前提交的所有日志记录
+            self._pending = snapshot
+            self._records = []
+            self._snapshot_changes = len(entries) if changes is None else changes
+            self._changed_ids = set()
+            self.saves_requested += 1
+            self._condition.notify_all()
+
+    def request_records(self, file_path: str, session, records: list) -> None:
+        """提交变更日志记录（put/delete/order），写入时追加到日志，不重写整个数据库
+
+        记录中的条目需要由调用方拷贝，提交后界面线程可以继续修改。
+        """
+        with self._condition:
+            self._start()
+            self._records.extend(records)
+            self._changed_ids.update(record["id"] for record in records if "id" in record)
+            self._records_target = (file_path, session)
+            self.saves_requested += 1
+            self._condition.notify_all()
+
+    def flush(self, timeout: float = None) -> bool:
+        """等待已提交的保存全部写入磁盘，返回是否在超时前完成"""
+        with self._condition:
+            self._flushing += 1
+            self._condition.notify_all()
+            try:
+                return self._condition.wait_for(self._is_idle, timeout)
+            finally:
+                self._flushing -= 1
+
+    def close(self) -> None:
+        """写完剩余的保存后停止写入线程"""
+        self.flush()
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._pending is not None or self._records or self._closed)
+                if self._pending is None and not self._records:
+                    return
+                # 等待一小段时间，合并连续的修改；flush 或关闭时立即写入
+                deadline = time.monotonic() + COALESCE_DELAY
+                while not self._flushing and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                snapshot, records, target = self._pending, self._records, self._records_target
+                changes = self._snapshot_changes + len(self._changed_ids)
+                self._pending = None
+                self._records = []
+                self._snapshot_changes = 0
+                self._changed_ids = set()
+                self._writing = True
+
+            self._unsaved = None if snapshot is not None else _record_ids(records)
+            try:
+                with self.vault_lock.writing() if self.vault_lock is not None else nullcontext():
+                    self._write(snapshot, records, target)
+                self.entries_changed += changes
+                self.last_write_changes = changes
+                self.save_finished.emit(changes)
+            except Exception as e:
+                # 没有写入的修改交还给界面线程，下次保存时重新提交
+                self.save_failed.emit(str(e), self._unsaved)
+            finally:
+                with self._condition:
+                    self._writing = False
+                    self._condition.notify_all()
+
+    def _write(self, snapshot, records, target):
+        if snapshot is not None:
+            file_path, session, entries, entries_order = snapshot
+            self.crypto_manager.save_encrypted_db_with_session(file_path, session, entries, entries_order)
+            self.saves_written += 1
+            self._unsaved = _record_ids(records)
+        if records:
+            file_path, session = target
+            self.crypto_manager.append_journal(file_path, session, records)
+            self.saves_written += 1
+            self.records_appended += len(records)
+        # 之后的合并失败不会丢失修改（变更日志仍在磁盘上）
+        self._unsaved = set()
+        # 日志过大时合并为新的快照
+        if self.crypto_manager.journal_needs_compaction(file_path):
+            self.crypto_manager.compact_journal(file_path, session)
+            self.compactions += 1
+
+
+def _record_ids(records):
+    """日志记录涉及的条目 id；有不针对单个条目的记录（例如排序）时返回 None，需要重新写入完整快照"""
+    if any("id" not in record for record in records):
+        return None
+    return {record["id"] for record in records}